@@ -0,0 +1,315 @@
+"""
+Benchmarks for the recommendation and ingest paths.
+
+Usage:
+    python benchmarks.py vector-binding [--db] [--queries N] [--rows N]
+    python benchmarks.py vector-index [--queries N] [--top-k K] [--accuracy A ...]
+    python benchmarks.py quantization [--store PATH | --synthetic N] [--queries N] [--top-k K]
+    python benchmarks.py rerank [--stages mmr] [--top-k K] [PROMPT ...]
+
+vector-binding: Compares binding embeddings as '[0.0123, ...]' strings for
+TO_VECTOR() with binding float32 array.array values. Reports bytes per
+vector and client-side encoding time; with --db it also times queries and a
+batch insert against the database (uses a scratch table that is dropped
+afterwards).
+
+vector-index: Recall@k and latency of approximate (FETCH APPROX) queries at
+several target accuracies, measured against the exact query. Needs a vector
+index on movie_search (python process_kaggle.py vector-index create). Query
+vectors are catalog embeddings with a little noise added.
+
+quantization: Memory, recall@k and query time of int8 and product-quantized
+embeddings (see quantization.py) against the float32 baseline. Uses the
+process_kaggle embedding store, or synthetic clustered vectors.
+
+rerank: Runs recommendations through the configured search backend with the
+given rerank stages (see reranking.py) and reports first-stage and rerank
+latency. Exits with status 1 if any rerank failed and fell back to the
+first-stage order, so it also serves as a check of the rerank path (e.g. MMR
+reading stored embeddings from Oracle).
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+from process_kaggle import get_oracle_connection, to_vector_bind
+
+EMBEDDING_DIM = 384
+
+def _random_embeddings(count: int, seed: int = 0) -> np.ndarray:
+    """Random unit vectors shaped like all-MiniLM-L6-v2 output."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(count, EMBEDDING_DIM)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def _to_vector_string(embedding: np.ndarray) -> str:
+    """The previous text format for TO_VECTOR()."""
+    return str(embedding.tolist())
+
+def _time_per_call(func, iterations: int) -> float:
+    """Average milliseconds per call."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+def benchmark_vector_binding(use_db: bool = False, queries: int = 50, rows: int = 1000):
+    """Compare text and binary vector binding."""
+    embeddings = _random_embeddings(rows)
+
+    text_bytes = np.mean([len(_to_vector_string(e).encode()) for e in embeddings[:100]])
+    binary_bytes = len(to_vector_bind(embeddings[0]).tobytes())
+
+    print("=" * 60)
+    print("Vector binding: TO_VECTOR(string) vs float32 array.array")
+    print("=" * 60)
+    print(f"Bytes per vector:    text {text_bytes:,.0f}   binary {binary_bytes:,}   "
+          f"({text_bytes / binary_bytes:.1f}x smaller)")
+    print(f"Bytes per {rows} rows: text {text_bytes * rows / 1e6:,.2f} MB   "
+          f"binary {binary_bytes * rows / 1e6:,.2f} MB")
+
+    text_encode_ms = _time_per_call(lambda: [_to_vector_string(e) for e in embeddings], 3)
+    binary_encode_ms = _time_per_call(lambda: [to_vector_bind(e) for e in embeddings], 3)
+    print(f"Client encode time per {rows} rows: text {text_encode_ms:.1f} ms   binary {binary_encode_ms:.1f} ms")
+    print(f"Client encode time per query:     text {text_encode_ms / rows * 1000:.1f} us   "
+          f"binary {binary_encode_ms / rows * 1000:.1f} us")
+
+    if not use_db:
+        print("\nRun with --db to also time queries and inserts against the database.")
+        return
+
+    connection = get_oracle_connection()
+    cursor = connection.cursor()
+    try:
+        query_sql = """
+            SELECT id, VECTOR_DISTANCE(embedding, {vector}) AS similarity_score
+            FROM movie_search
+            ORDER BY similarity_score ASC
+            FETCH FIRST 10 ROWS ONLY
+        """
+        text_query = query_sql.format(vector="TO_VECTOR(:1)")
+        binary_query = query_sql.format(vector=":1")
+
+        # Warm up the statement cache for both statements
+        cursor.execute(text_query, [_to_vector_string(embeddings[0])]).fetchall()
+        cursor.execute(binary_query, [to_vector_bind(embeddings[0])]).fetchall()
+
+        query_vectors = embeddings[:queries]
+        text_query_ms = _time_per_call(
+            lambda: [cursor.execute(text_query, [_to_vector_string(e)]).fetchall() for e in query_vectors], 1
+        ) / len(query_vectors)
+        binary_query_ms = _time_per_call(
+            lambda: [cursor.execute(binary_query, [to_vector_bind(e)]).fetchall() for e in query_vectors], 1
+        ) / len(query_vectors)
+        print(f"\nQuery round trip (avg of {len(query_vectors)}): text {text_query_ms:.2f} ms   "
+              f"binary {binary_query_ms:.2f} ms   (saved {text_query_ms - binary_query_ms:.2f} ms/query)")
+
+        cursor.execute("""
+            CREATE TABLE vector_bind_benchmark (
+                id NUMBER PRIMARY KEY,
+                embedding VECTOR(384)
+            )
+        """)
+        try:
+            text_rows = [(i, _to_vector_string(e)) for i, e in enumerate(embeddings)]
+            start = time.perf_counter()
+            cursor.executemany("INSERT INTO vector_bind_benchmark (id, embedding) VALUES (:1, TO_VECTOR(:2))", text_rows)
+            connection.commit()
+            text_insert_ms = (time.perf_counter() - start) * 1000
+
+            cursor.execute("TRUNCATE TABLE vector_bind_benchmark")
+            binary_rows = [(i, to_vector_bind(e)) for i, e in enumerate(embeddings)]
+            start = time.perf_counter()
+            cursor.executemany("INSERT INTO vector_bind_benchmark (id, embedding) VALUES (:1, :2)", binary_rows)
+            connection.commit()
+            binary_insert_ms = (time.perf_counter() - start) * 1000
+
+            print(f"Insert {rows} rows (executemany):  text {text_insert_ms:.0f} ms   "
+                  f"binary {binary_insert_ms:.0f} ms   (saved {text_insert_ms - binary_insert_ms:.0f} ms)")
+        finally:
+            cursor.execute("DROP TABLE vector_bind_benchmark PURGE")
+    finally:
+        cursor.close()
+        connection.close()
+
+def _percentile(values, q: float) -> float:
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+def benchmark_vector_index(queries: int = 100, top_k: int = 10, accuracies=(50, 70, 80, 90, 95, 99)):
+    """Compare approximate and exact vector search: recall@k vs latency."""
+    from process_kaggle import get_vector_index_info
+    from recommend_movies import _build_search_query
+    
+    connection = get_oracle_connection()
+    cursor = connection.cursor()
+    try:
+        info = get_vector_index_info(connection)
+        if info is None:
+            print("movie_search has no vector index. Create one with: python process_kaggle.py vector-index create")
+            return
+        
+        cursor.execute("""
+            SELECT embedding FROM movie_search
+            ORDER BY DBMS_RANDOM.VALUE
+            FETCH FIRST :1 ROWS ONLY
+        """, [queries])
+        base = np.array([np.asarray(row[0], dtype=np.float32) for row in cursor.fetchall()])
+        rng = np.random.default_rng(0)
+        query_vectors = base + rng.normal(scale=0.02, size=base.shape).astype(np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        
+        def run(approximate: bool, target_accuracy=None):
+            ids, latencies = [], []
+            for vector in query_vectors:
+                sql, params = _build_search_query(vector, top_k, None, approximate=approximate,
+                                                  target_accuracy=target_accuracy)
+                start = time.perf_counter()
+                rows = cursor.execute(sql, params).fetchall()
+                latencies.append((time.perf_counter() - start) * 1000)
+                ids.append({row[0] for row in rows})
+            return ids, latencies
+        
+        # Warm up both plans
+        run(False)
+        exact_ids, exact_latencies = run(False)
+        
+        print("=" * 60)
+        print(f"Vector index: {info['name']} ({info['subtype'] or info['type']}, {info['status']})")
+        print(f"{len(query_vectors)} queries, top {top_k}")
+        print("=" * 60)
+        print(f"{'mode':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        print(f"{'exact':<16}{1.0:>10.3f}{_percentile(exact_latencies, 50):>10.2f}"
+              f"{_percentile(exact_latencies, 95):>10.2f}{_percentile(exact_latencies, 99):>10.2f}")
+        for accuracy in (None,) + tuple(accuracies):
+            approx_ids, latencies = run(True, accuracy or 0)
+            recall = np.mean([len(a & e) / len(e) if e else 1.0 for a, e in zip(approx_ids, exact_ids)])
+            label = f"approx {accuracy}" if accuracy else "approx default"
+            print(f"{label:<16}{recall:>10.3f}{_percentile(latencies, 50):>10.2f}"
+                  f"{_percentile(latencies, 95):>10.2f}{_percentile(latencies, 99):>10.2f}")
+    finally:
+        cursor.close()
+        connection.close()
+
+def _clustered_embeddings(count: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Random unit vectors grouped around cluster centers (closer to real text embeddings than uniform noise)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, EMBEDDING_DIM)).astype(np.float32)
+    embeddings = centers[rng.integers(0, clusters, count)] + rng.normal(scale=0.5, size=(count, EMBEDDING_DIM)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def benchmark_quantization(store: str = 'embedding_store', synthetic: int = 0, queries: int = 200, top_k: int = 10,
+                           pq_subvectors=(48, 96), rerank: int = 10):
+    """Compare int8 and product quantization with the float32 baseline."""
+    from quantization import evaluate_quantization
+
+    if synthetic:
+        vectors = _clustered_embeddings(synthetic)
+        source = f"{synthetic} synthetic clustered vectors"
+    else:
+        from embedding_store import EmbeddingStore
+        from process_kaggle import EMBEDDING_MODEL_NAME
+        vectors = np.asarray(EmbeddingStore(store, model_name=EMBEDDING_MODEL_NAME).load())
+        if len(vectors) == 0:
+            print(f"Embedding store {store} is empty. Run process_kaggle.py first or use --synthetic N.")
+            return
+        source = f"{len(vectors)} vectors from {store}"
+
+    rng = np.random.default_rng(1)
+    query_vectors = vectors[rng.integers(0, len(vectors), queries)]
+    query_vectors = query_vectors + rng.normal(scale=0.05, size=query_vectors.shape).astype(np.float32)
+
+    methods = [('int8', {})] + [('pq', {'subvectors': m}) for m in pq_subvectors]
+    report = evaluate_quantization(vectors, query_vectors, k=top_k, methods=methods, rerank=rerank)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact_ms = _time_per_call(lambda: [np.argpartition(1.0 - normalized @ q, top_k - 1)[:top_k]
+                                       for q in query_vectors], 1) / len(query_vectors)
+
+    print("=" * 78)
+    print(f"Quantization: {source}, {len(query_vectors)} queries, recall@{top_k}, rerank {rerank}x")
+    print("=" * 78)
+    print(f"{'method':<12}{'B/vector':>10}{'memory':>12}{'saved':>8}{'recall':>9}{'+rerank':>9}{'ms/query':>10}")
+    print(f"{'float32':<12}{EMBEDDING_DIM * 4:>10}{vectors.nbytes / 1e6:>10.2f}MB{0:>7.0f}%{1.0:>9.3f}{1.0:>9.3f}"
+          f"{exact_ms:>10.3f}")
+    for row in report:
+        label = row['method'] + (f" M={row['params']['subvectors']}" if row['params'] else "")
+        print(f"{label:<12}{row['bytes_per_vector']:>10}{row['memory_bytes'] / 1e6:>10.2f}MB"
+              f"{row['memory_saved_pct']:>7.0f}%{row['recall']:>9.3f}{row['recall_reranked']:>9.3f}{row['ms_per_query']:>10.3f}")
+
+DEFAULT_RERANK_PROMPTS = (
+    "feel-good comedy for a rainy day",
+    "dark psychological thriller",
+    "space adventure with friends",
+    "Tom Hanks war movie",
+    "animated family movie",
+)
+
+def benchmark_rerank(prompts=DEFAULT_RERANK_PROMPTS, stages: str = 'mmr', top_k: int = 10) -> bool:
+    """Time reranked recommendations; returns False if any rerank fell back because of an error."""
+    from recommend_movies import SEARCH_BACKEND, search_similar_movies
+
+    print("=" * 78)
+    print(f"Rerank: stages={stages}, backend={SEARCH_BACKEND}, top {top_k}")
+    print("=" * 78)
+    print(f"{'prompt':<40}{'search ms':>11}{'rerank ms':>11}{'fallback':>10}")
+    failures = 0
+    for prompt in prompts:
+        timings = {}
+        search_similar_movies(prompt, top_k, rerank=stages, timings=timings)
+        if 'rerank_error' in timings:
+            failures += 1
+        print(f"{prompt[:38]:<40}{timings.get('search_ms', 0.0):>11.2f}{timings.get('rerank_ms', 0.0):>11.2f}"
+              f"{str(timings.get('rerank_fallback', False)):>10}")
+        if 'rerank_error' in timings:
+            print(f"  error: {timings['rerank_error']}")
+    if failures:
+        print(f"\n{failures}/{len(prompts)} reranks failed")
+    return failures == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Moodflix recommendation benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    binding = subparsers.add_parser("vector-binding", help="Text vs binary vector binding")
+    binding.add_argument("--db", action="store_true", help="Also time queries and inserts against the database")
+    binding.add_argument("--queries", type=int, default=50, help="Queries to time with --db")
+    binding.add_argument("--rows", type=int, default=1000, help="Rows per insert batch")
+
+    index = subparsers.add_parser("vector-index", help="Approximate vs exact vector search (recall vs latency)")
+    index.add_argument("--queries", type=int, default=100, help="Number of query vectors")
+    index.add_argument("--top-k", type=int, default=10, help="Results per query")
+    index.add_argument("--accuracy", type=int, nargs="+", default=[50, 70, 80, 90, 95, 99],
+                       help="Target accuracies to test")
+
+    quantization = subparsers.add_parser("quantization", help="int8 / product quantization vs float32")
+    quantization.add_argument("--store", default="embedding_store", help="Embedding store path prefix")
+    quantization.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of the store")
+    quantization.add_argument("--queries", type=int, default=200, help="Number of query vectors")
+    quantization.add_argument("--top-k", type=int, default=10, help="Results per query")
+    quantization.add_argument("--pq-subvectors", type=int, nargs="+", default=[48, 96],
+                              help="Product quantization sub-vector counts to test")
+    quantization.add_argument("--rerank", type=int, default=10, help="Full-precision rerank depth (multiple of k)")
+
+    rerank = subparsers.add_parser("rerank", help="Run the rerank stages end to end (fails on rerank errors)")
+    rerank.add_argument("prompts", nargs="*", default=list(DEFAULT_RERANK_PROMPTS), help="Prompts to search")
+    rerank.add_argument("--stages", default="mmr", help="Rerank stages, e.g. mmr or mmr,cross_encoder")
+    rerank.add_argument("--top-k", type=int, default=10, help="Results per query")
+
+    args = parser.parse_args()
+    if args.benchmark == "vector-binding":
+        benchmark_vector_binding(use_db=args.db, queries=args.queries, rows=args.rows)
+    elif args.benchmark == "vector-index":
+        benchmark_vector_index(queries=args.queries, top_k=args.top_k, accuracies=tuple(args.accuracy))
+    elif args.benchmark == "quantization":
+        benchmark_quantization(store=args.store, synthetic=args.synthetic, queries=args.queries, top_k=args.top_k,
+                               pq_subvectors=tuple(args.pq_subvectors), rerank=args.rerank)
+    elif args.benchmark == "rerank":
+        if not benchmark_rerank(args.prompts, stages=args.stages, top_k=args.top_k):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Memory-mapped catalog snapshot for the in-process search backends.
+
+process_kaggle writes the searchable catalog (ids, titles, descriptions, urls,
+content types and normalized embeddings) to one binary file after ingest. The
+API opens it with mmap: nothing is parsed or copied at startup, every worker
+process shares the same page-cache copy, and no database round trip is needed.
+
+File layout (little-endian):
+- magic b'MFXSNAP1' and the uint64 length of a JSON header
+- JSON header: count, dim, content type table, metadata and section offsets
+- ids: int64[count]
+- content_types: uint8[count] (index into the header's content type table)
+- title/description/url offsets: uint64[count + 1] each, into the string heap
+- string heap: UTF-8 bytes
+- vectors: float32[count, dim], L2-normalized, 64-byte aligned
+- filter columns (optional): one array[count] per metadata filter column
+  (see search_filters.METADATA_COLUMNS), dtypes recorded in the header
+
+Snapshots are written to a temporary file and renamed into place, so readers
+that still map the old file keep a consistent view.
+
+write_directory() does the same for indexes saved as a directory of .npy files
+(neighbor table, lexical index, HNSW graph): each save goes to a new version
+directory, and the index path is a symlink switched to it with os.replace().
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import time
+import numpy as np
+from collections.abc import Sequence
+from typing import Callable, Dict, Iterable, Optional
+
+MAGIC = b'MFXSNAP1'
+FORMAT_VERSION = 1
+_ALIGN = 64
+
+def _aligned(offset: int, alignment: int = _ALIGN) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+class StringColumn(Sequence):
+    """Read-only string column decoded on access from the snapshot's string heap."""
+
+    def __init__(self, heap: memoryview, offsets: np.ndarray, empty_as_none: bool = False):
+        self._heap = heap
+        self._offsets = offsets
+        self._empty_as_none = empty_as_none
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        if start == end and self._empty_as_none:
+            return None
+        return bytes(self._heap[start:end]).decode('utf-8')
+
+def write_snapshot(path: str, ids: Iterable[int], titles: Iterable[str], descriptions: Iterable[str],
+                   urls: Iterable[Optional[str]], content_types: Iterable[str], embeddings: np.ndarray,
+                   metadata: Optional[Dict] = None, normalized: bool = False,
+                   filter_columns: Optional[Dict[str, np.ndarray]] = None) -> int:
+    """
+    Write a catalog snapshot.
+
+    Args:
+        path: Output file
+        ids, titles, descriptions, urls, content_types: One value per catalog row
+        embeddings: Array of shape (n, dim); stored L2-normalized as float32
+        metadata: Extra JSON-serializable header fields (e.g. catalog_version)
+        normalized: Rows of embeddings are already L2-normalized
+        filter_columns: Metadata filter arrays by column name, one value per row
+
+    Returns:
+        Number of rows written
+    """
+    ids = np.asarray(list(ids), dtype=np.int64)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    count = len(ids)
+    if embeddings.shape[0] != count:
+        raise ValueError(f"Got {count} ids for {embeddings.shape[0]} embeddings")
+    if not normalized:
+        embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+    content_types = list(content_types)
+    type_table = sorted(set(content_types))
+    if len(type_table) > 255:
+        raise ValueError("At most 255 distinct content types are supported")
+    type_codes = np.array([type_table.index(value) for value in content_types], dtype=np.uint8)
+
+    heap = bytearray()
+    string_offsets = {}
+    for name, values in (('title', titles), ('description', descriptions), ('url', urls)):
+        offsets = np.empty(count + 1, dtype=np.uint64)
+        offsets[0] = len(heap)
+        for row, value in enumerate(values):
+            heap += (value or '').encode('utf-8')
+            offsets[row + 1] = len(heap)
+        string_offsets[name] = offsets
+
+    filter_columns = {name: np.ascontiguousarray(values) for name, values in (filter_columns or {}).items()}
+    for name, values in filter_columns.items():
+        if len(values) != count:
+            raise ValueError(f"Filter column {name} has {len(values)} values for {count} rows")
+
+    data = [('ids', ids.tobytes()), ('content_types', type_codes.tobytes()),
+            ('title_offsets', string_offsets['title'].tobytes()),
+            ('description_offsets', string_offsets['description'].tobytes()),
+            ('url_offsets', string_offsets['url'].tobytes()),
+            ('heap', bytes(heap)), ('vectors', embeddings.tobytes())]
+    data += [(f'column:{name}', values.tobytes()) for name, values in filter_columns.items()]
+
+    # Section offsets are relative to the start of the data area
+    sections = {}
+    position = 0
+    for name, section in data:
+        position = _aligned(position)
+        sections[name] = position
+        position += len(section)
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'count': count,
+        'dim': int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        'content_types': type_table,
+        'heap_bytes': len(heap),
+        'sections': sections,
+        'filter_columns': {name: values.dtype.str for name, values in filter_columns.items()},
+        'created_at': time.time(),
+        'metadata': metadata or {},
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name, section in data:
+            f.seek(data_start + sections[name])
+            f.write(section)
+        f.truncate(data_start + position)
+    os.replace(tmp_path, path)
+    return count
+
+def write_directory(path: str, write: Callable[[str], None]):
+    """
+    Write a directory of files so that readers never see it half-written.
+
+    write(directory) fills a new version directory next to path, and path (a
+    symlink) is then switched to it with os.replace(). Files are never rewritten
+    in place, so processes that memory-mapped the previous version keep a
+    consistent view. The previous version is kept for readers that are still
+    opening it; older ones are removed.
+
+    Args:
+        path: Directory path readers open (see resolve_directory)
+        write: Callable writing the files into the directory it is given
+    """
+    path = os.path.abspath(path.rstrip(os.sep))
+    parent, name = os.path.split(path)
+    prefix = f".{name}."
+    version = os.path.join(parent, f"{prefix}{time.time_ns()}-{os.getpid()}")
+    os.makedirs(version + '.tmp')
+    try:
+        write(version + '.tmp')
+        os.rename(version + '.tmp', version)
+    except BaseException:
+        shutil.rmtree(version + '.tmp', ignore_errors=True)
+        raise
+
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    link = f"{version}.link"
+    os.symlink(os.path.basename(version), link)
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Plain directory from before versioned saves: move it aside once (not atomic)
+        previous = f"{version}.legacy"
+        os.rename(path, previous)
+    os.replace(link, path)
+
+    # Keep the current and previous versions; drop older ones and stale temporary directories
+    current = os.path.realpath(path)
+    for entry in os.listdir(parent):
+        entry_path = os.path.join(parent, entry)
+        if not entry.startswith(prefix) or entry_path in (current, previous) or not os.path.isdir(entry_path):
+            continue
+        if entry.endswith('.tmp') and time.time() - os.path.getmtime(entry_path) < 3600:
+            continue  # another process may still be writing it
+        shutil.rmtree(entry_path, ignore_errors=True)
+
+def resolve_directory(path: str) -> str:
+    """
+    The version directory path currently points to (see write_directory).
+
+    Resolve once per load and read every file from the result, so a concurrent
+    save cannot mix files of two versions.
+    """
+    return os.path.realpath(path)
+
+class CatalogSnapshot:
+    """
+    Read-only view of a snapshot file. Columns are NumPy arrays and string
+    sequences backed directly by the memory map.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        header_length = struct.unpack_from('<Q', buffer, len(MAGIC))[0]
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(bytes(buffer[header_start:header_start + header_length]))
+        if self.header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.header['format_version']}")
+        data_start = _aligned(header_start + header_length)
+
+        count, dim = self.header['count'], self.header['dim']
+        sections = {name: data_start + offset for name, offset in self.header['sections'].items()}
+
+        def array(name, dtype, length):
+            return np.frombuffer(buffer, dtype=dtype, count=length, offset=sections[name])
+
+        self.ids = array('ids', np.int64, count)
+        self.content_type_codes = array('content_types', np.uint8, count)
+        self.content_type_table = self.header['content_types']
+        heap = buffer[sections['heap']:sections['heap'] + self.header['heap_bytes']]
+        self.titles = StringColumn(heap, array('title_offsets', np.uint64, count + 1))
+        self.descriptions = StringColumn(heap, array('description_offsets', np.uint64, count + 1))
+        self.urls = StringColumn(heap, array('url_offsets', np.uint64, count + 1), empty_as_none=True)
+        self.embeddings = array('vectors', np.float32, count * dim).reshape(count, dim)
+        # Snapshots written before metadata filters have no filter columns
+        self.filter_columns = {
+            name: array(f'column:{name}', np.dtype(dtype), count)
+            for name, dtype in self.header.get('filter_columns', {}).items()
+        }
+
+    def __len__(self) -> int:
+        return self.header['count']
+
+    @property
+    def metadata(self) -> Dict:
+        return self.header.get('metadata', {})
+
+    @property
+    def content_types(self) -> np.ndarray:
+        """Content type of each row as an object array (built from the uint8 codes)."""
+        return np.asarray(self.content_type_table, dtype=object)[self.content_type_codes]
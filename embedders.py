@@ -0,0 +1,366 @@
+"""
+Pluggable text embedders for the recommendation service.
+
+All backends produce the same 384-dimensional, L2-normalized vectors as
+sentence-transformers all-MiniLM-L6-v2 (the model process_kaggle.create_embeddings
+uses for the catalog), so prompt vectors are comparable with stored vectors.
+
+Backends (selected with the EMBEDDING_BACKEND environment variable):
+- api: Hugging Face Inference API over HTTP (default, no local model needed)
+- onnx: in-process ONNX Runtime on CPU (needs onnxruntime and tokenizers)
+- sentence-transformers: in-process PyTorch model (needs sentence-transformers)
+
+Local backends load lazily on first use and can be warmed up at API startup.
+With multiple pre-forked API workers, preload() runs once in the parent process
+and configure_threads() in each worker (see serving.py).
+"""
+
+import asyncio
+import os
+import threading
+import time
+import numpy as np
+import requests
+from typing import List, Optional
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'api').lower()
+
+# Hugging Face API configuration
+HF_API_URL = "https://api-inference.huggingface.co/pipeline/feature-extraction/sentence-transformers/all-MiniLM-L6-v2"
+HF_API_TOKEN = os.getenv('HUGGINGFACE_API_KEY', '')  # Optional, but recommended for higher rate limits
+
+# ONNX configuration
+# EMBEDDING_ONNX_MODEL / EMBEDDING_TOKENIZER can point to local files; otherwise the
+# files are downloaded once from the Hugging Face Hub (EMBEDDING_ONNX_FILE picks the
+# export, e.g. onnx/model_qint8_avx512_vnni.onnx for the int8 quantized model).
+EMBEDDING_ONNX_MODEL = os.getenv('EMBEDDING_ONNX_MODEL', '')
+EMBEDDING_ONNX_FILE = os.getenv('EMBEDDING_ONNX_FILE', 'onnx/model.onnx')
+EMBEDDING_TOKENIZER = os.getenv('EMBEDDING_TOKENIZER', '')
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))  # 0 lets ONNX Runtime decide
+EMBEDDING_MAX_LENGTH = 256  # all-MiniLM-L6-v2 max_seq_length
+
+class Embedder:
+    """Base class for text embedders."""
+
+    name = "base"
+    dimension = EMBEDDING_DIM
+
+    @property
+    def identity(self) -> str:
+        """Backend and model that produce the vectors (scopes cached embeddings)."""
+        return f"{self.name}:{MODEL_NAME}"
+
+    def load(self):
+        """Load model resources. Called lazily before the first embed."""
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: List of strings to embed
+
+        Returns:
+            float32 array of shape (len(texts), 384)
+        """
+        raise NotImplementedError
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """Embed a single text and return a 1D float32 vector of 384 dimensions."""
+        return self.embed([text])[0]
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """Async embed. Runs embed() in a worker thread unless the backend has async I/O."""
+        return await asyncio.to_thread(self.embed, texts)
+
+    async def aembed_one(self, text: str) -> np.ndarray:
+        """Async version of embed_one()."""
+        return (await self.aembed([text]))[0]
+
+    async def aclose(self):
+        """Release async resources (e.g. HTTP clients)."""
+
+    def warmup(self):
+        """Load the model and run one inference so the first request is fast."""
+        self.load()
+        self.embed(["warmup"])
+
+    def preload(self):
+        """
+        Prepare resources that forked worker processes can share.
+
+        Runs in the parent before workers are forked, so it must not start
+        inference thread pools (they do not survive a fork).
+        """
+
+    def configure_threads(self, threads: int):
+        """Limit inference threads of this process (e.g. to cores per worker)."""
+
+def _check_embeddings(embeddings: np.ndarray, expected_rows: int) -> np.ndarray:
+    """Validate embedding shape and convert to float32."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings.reshape(1, -1)
+    if embeddings.shape != (expected_rows, EMBEDDING_DIM):
+        raise ValueError(f"Expected embeddings of shape ({expected_rows}, {EMBEDDING_DIM}), got {embeddings.shape}")
+    return embeddings
+
+class HuggingFaceAPIEmbedder(Embedder):
+    """Embeds text with the Hugging Face Inference API."""
+
+    name = "api"
+
+    def __init__(self, timeout: float = 30):
+        self.timeout = timeout
+        self._async_client = None
+        self._async_client_loop = None
+
+    def _post(self, inputs):
+        headers = {
+            "Content-Type": "application/json",
+        }
+        if HF_API_TOKEN:
+            headers["Authorization"] = f"Bearer {HF_API_TOKEN}"
+
+        try:
+            response = requests.post(
+                HF_API_URL,
+                headers=headers,
+                json={"inputs": inputs},
+                timeout=self.timeout
+            )
+
+            if response.status_code == 503:
+                # Model is loading, wait and retry once
+                time.sleep(5)
+                response = requests.post(
+                    HF_API_URL,
+                    headers=headers,
+                    json={"inputs": inputs},
+                    timeout=self.timeout
+                )
+
+            response.raise_for_status()
+            return response.json()
+
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Hugging Face API error: {e}")
+
+    async def _apost(self, inputs):
+        try:
+            import httpx
+        except ImportError:
+            # No async HTTP client installed; fall back to a worker thread
+            return await asyncio.to_thread(self._post, inputs)
+
+        headers = {
+            "Content-Type": "application/json",
+        }
+        if HF_API_TOKEN:
+            headers["Authorization"] = f"Bearer {HF_API_TOKEN}"
+
+        # httpx clients are bound to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = httpx.AsyncClient(timeout=self.timeout)
+            self._async_client_loop = loop
+
+        try:
+            response = await self._async_client.post(HF_API_URL, headers=headers, json={"inputs": inputs})
+
+            if response.status_code == 503:
+                # Model is loading, wait and retry once
+                await asyncio.sleep(5)
+                response = await self._async_client.post(HF_API_URL, headers=headers, json={"inputs": inputs})
+
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPError as e:
+            raise Exception(f"Hugging Face API error: {e}")
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return _check_embeddings(self._post(list(texts)), len(texts))
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self._to_vector(self._post(text))
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return _check_embeddings(await self._apost(list(texts)), len(texts))
+
+    async def aembed_one(self, text: str) -> np.ndarray:
+        return self._to_vector(await self._apost(text))
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_client_loop = None
+
+    def _to_vector(self, data) -> np.ndarray:
+        embedding = np.array(data, dtype=np.float32)
+
+        # Ensure it's 1D array of 384 dimensions
+        if embedding.ndim > 1:
+            embedding = embedding.flatten()
+
+        if len(embedding) != EMBEDDING_DIM:
+            raise ValueError(f"Expected {EMBEDDING_DIM} dimensions, got {len(embedding)}")
+
+        return embedding
+
+    def warmup(self):
+        # Nothing to load locally; avoid blocking startup on a remote call
+        pass
+
+class OnnxEmbedder(Embedder):
+    """
+    Embeds text in-process with an ONNX export of all-MiniLM-L6-v2.
+
+    Reproduces the sentence-transformers pipeline: tokenize (max 256 tokens),
+    run the transformer, mean-pool over the attention mask, L2-normalize.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str = EMBEDDING_ONNX_MODEL, tokenizer_path: str = EMBEDDING_TOKENIZER,
+                 threads: int = EMBEDDING_THREADS):
+        self.model_path = model_path
+        self.tokenizer_path = tokenizer_path
+        self.threads = threads
+        self._session = None
+        self._tokenizer = None
+        self._input_names = ()
+        self._lock = threading.Lock()
+        # Taken before model_path is resolved to a download location, so it names the configured export
+        self._identity = f"{self.name}:{model_path or f'{MODEL_NAME}/{EMBEDDING_ONNX_FILE}'}"
+
+    @property
+    def identity(self) -> str:
+        return self._identity
+
+    def load(self):
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            try:
+                import onnxruntime as ort
+                from tokenizers import Tokenizer
+            except ImportError:
+                raise ImportError("onnxruntime and tokenizers are required for EMBEDDING_BACKEND=onnx. "
+                                  "Install them with: pip install onnxruntime tokenizers")
+
+            model_path, tokenizer_path = self._resolve_files()
+
+            print(f"Loading ONNX embedding model from {model_path}...")
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+            tokenizer.enable_truncation(max_length=EMBEDDING_MAX_LENGTH)
+            tokenizer.enable_padding()
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads > 0:
+                options.intra_op_num_threads = self.threads
+            session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+            self._input_names = tuple(i.name for i in session.get_inputs())
+            self._tokenizer = tokenizer
+            self._session = session
+            print("ONNX embedding model loaded successfully!")
+
+    def _resolve_files(self):
+        """Local model and tokenizer paths, downloading them from the Hub if not configured."""
+        if not self.model_path or not self.tokenizer_path:
+            try:
+                from huggingface_hub import hf_hub_download
+            except ImportError:
+                raise ImportError("Set EMBEDDING_ONNX_MODEL and EMBEDDING_TOKENIZER, or install huggingface_hub "
+                                  "to download them: pip install huggingface_hub")
+            self.model_path = self.model_path or hf_hub_download(MODEL_NAME, EMBEDDING_ONNX_FILE)
+            self.tokenizer_path = self.tokenizer_path or hf_hub_download(MODEL_NAME, "tokenizer.json")
+        return self.model_path, self.tokenizer_path
+
+    def preload(self):
+        # ONNX Runtime sessions own thread pools, so each worker creates its own;
+        # download the files once here so workers do not race to fetch them
+        self._resolve_files()
+
+    def configure_threads(self, threads: int):
+        if self.threads <= 0 and self._session is None:
+            self.threads = threads
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        self.load()
+        encodings = self._tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self._input_names:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self._session.run(None, feeds)[0]
+
+        # Mean pooling over real (non-padding) tokens, then L2 normalization
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+        norms = np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return _check_embeddings(embeddings / norms, len(texts))
+
+class SentenceTransformerEmbedder(Embedder):
+    """Embeds text in-process with the same sentence-transformers model used for ingest."""
+
+    name = "sentence-transformers"
+
+    def load(self):
+        from process_kaggle import get_model
+        get_model()
+
+    def preload(self):
+        # Weights loaded before the fork stay shared (copy-on-write) between workers
+        self.load()
+
+    def configure_threads(self, threads: int):
+        import torch
+        torch.set_num_threads(threads)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        from process_kaggle import get_model
+        embeddings = get_model().encode(list(texts), batch_size=32, show_progress_bar=False)
+        return _check_embeddings(embeddings, len(texts))
+
+EMBEDDER_BACKENDS = {
+    'api': HuggingFaceAPIEmbedder,
+    'onnx': OnnxEmbedder,
+    'sentence-transformers': SentenceTransformerEmbedder,
+}
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder(backend: Optional[str] = None) -> Embedder:
+    """
+    Get the process-wide embedder for the configured backend.
+
+    Args:
+        backend: Backend name; defaults to the EMBEDDING_BACKEND setting
+    """
+    global _embedder
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if _embedder is not None and _embedder.name == backend:
+        return _embedder
+
+    with _embedder_lock:
+        if _embedder is None or _embedder.name != backend:
+            if backend not in EMBEDDER_BACKENDS:
+                raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. "
+                                 f"Choose one of: {', '.join(EMBEDDER_BACKENDS)}")
+            _embedder = EMBEDDER_BACKENDS[backend]()
+            print(f"Using embedding backend: {backend}")
+        return _embedder
@@ -0,0 +1,231 @@
+"""
+Bounded cache of prompt embeddings.
+
+Mood prompts repeat a lot ("something funny", "feel-good movie", ...), so prompt
+vectors are cached in memory with LRU eviction and a TTL. The cache is keyed on
+normalized prompt text: all-MiniLM-L6-v2 uses an uncased tokenizer that ignores
+extra whitespace, so lowercasing and collapsing whitespace does not change the
+resulting vector.
+
+An optional SQLite file acts as a second tier so that a restarted API does not
+begin with a cold cache. Keys are prefixed with the embedder identity (backend
+and model, see Embedder.identity), so after a model change the persisted
+vectors of the old model are ignored instead of being mixed into searches.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_prompt(text: str) -> str:
+    """Normalize prompt text for use as a cache key."""
+    return _WHITESPACE_RE.sub(' ', text).strip().lower()
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU + TTL cache of embedding vectors.
+
+    Args:
+        max_entries: Maximum number of vectors kept in memory
+        ttl_seconds: Seconds an entry stays valid (0 = never expires)
+        disk_path: Optional SQLite file used as a persistent second tier
+        namespace: Identity of the embedding model; entries cached under
+            another namespace are never returned
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400, disk_path: Optional[str] = None,
+                 namespace: str = ''):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.namespace = namespace
+        self._entries = OrderedDict()  # key -> (created_at, vector)
+        self._lock = threading.Lock()  # memory tier
+        self._disk_lock = threading.Lock()  # SQLite tier; never held together with _lock while waiting on disk
+        self._disk = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    prompt TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            """)
+            self._disk.commit()
+
+    def _key(self, text: str) -> str:
+        prompt = normalize_prompt(text)
+        return f"{self.namespace}\x1f{prompt}" if self.namespace else prompt
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    @property
+    def has_disk(self) -> bool:
+        """True if a SQLite file backs the cache (lookups may then block on disk I/O)."""
+        return self._disk is not None
+
+    def get_memory(self, text: str) -> Optional[np.ndarray]:
+        """
+        Return the vector from the memory tier only, or None.
+
+        Never touches disk, so it is safe to call on an event loop. Misses are
+        not counted; follow a miss with get() (e.g. in a worker thread).
+        """
+        key = self._key(text)
+        with self._lock:
+            vector = self._get_memory(key, time.time())
+            if vector is not None:
+                self.hits += 1
+            return vector
+
+    def _get_memory(self, key: str, now: float) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, vector = entry
+        if self._expired(created_at, now):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached vector for a prompt, or None on a miss."""
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            vector = self._get_memory(key, now)
+            if vector is not None:
+                self.hits += 1
+                return vector
+
+        row = self._get_disk(key)
+        with self._lock:
+            if row is not None and not self._expired(row[0], now):
+                vector = np.frombuffer(row[1], dtype=np.float32)
+                self._store(key, row[0], vector)
+                self.hits += 1
+                self.disk_hits += 1
+                return vector
+            self.misses += 1
+            return None
+
+    def _get_disk(self, key: str):
+        if self._disk is None:
+            return None
+        with self._disk_lock:
+            try:
+                return self._disk.execute(
+                    "SELECT created_at, vector FROM embedding_cache WHERE prompt = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"WARNING: Embedding cache read failed: {e}")
+                return None
+
+    def put(self, text: str, vector: np.ndarray, disk: bool = True):
+        """
+        Cache the vector for a prompt.
+
+        With disk=False only the memory tier is written; call put_disk() for
+        the SQLite tier separately (e.g. from a worker thread).
+        """
+        key = self._key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)  # cached vectors are shared between requests
+        now = time.time()
+        with self._lock:
+            self._store(key, now, vector)
+        if disk:
+            self._put_disk(key, now, vector)
+
+    def put_disk(self, text: str, vector: np.ndarray):
+        """Write the vector for a prompt to the SQLite tier only."""
+        self._put_disk(self._key(text), time.time(), np.asarray(vector, dtype=np.float32))
+
+    def _put_disk(self, key: str, created_at: float, vector: np.ndarray):
+        # A failed write only loses the persisted copy, never the request
+        if self._disk is None:
+            return
+        with self._disk_lock:
+            try:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO embedding_cache (prompt, created_at, vector) VALUES (?, ?, ?)",
+                    (key, created_at, vector.tobytes())
+                )
+                self._disk.commit()
+            except sqlite3.Error as e:
+                print(f"WARNING: Embedding cache write failed: {e}")
+
+    def _store(self, key: str, created_at: float, vector: np.ndarray):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all entries from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM embedding_cache")
+                self._disk.commit()
+
+    def prune_disk(self):
+        """Delete expired entries from the disk tier."""
+        if self._disk is None or self.ttl_seconds <= 0:
+            return
+        with self._disk_lock:
+            self._disk.execute("DELETE FROM embedding_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._disk.commit()
+
+    def stats(self) -> Dict:
+        """Cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': True,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'disk_path': self.disk_path,
+            'namespace': self.namespace,
+        }
+
+def create_embedding_cache_from_env(namespace: str = '') -> Optional[EmbeddingCache]:
+    """
+    Create the embedding cache from environment settings, or None if disabled.
+
+    Args:
+        namespace: Identity of the embedder whose vectors are cached
+    """
+    max_entries = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+    if max_entries <= 0:
+        return None
+    cache = EmbeddingCache(
+        max_entries=max_entries,
+        ttl_seconds=float(os.getenv('EMBEDDING_CACHE_TTL', '86400')),
+        disk_path=os.getenv('EMBEDDING_CACHE_PATH') or None,
+        namespace=namespace,
+    )
+    cache.prune_disk()
+    return cache
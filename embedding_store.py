@@ -0,0 +1,142 @@
+"""
+Incremental, memory-mapped store of catalog embeddings.
+
+Each stored vector is keyed by (movie id, hash of its search_blob, model name).
+Syncing the store against the current catalog only encodes movies that are
+new or whose search_blob changed; vectors of movies that are no longer in the
+catalog are dropped.
+
+Files (for a store at path "embedding_store"):
+- embedding_store.vectors: raw float32 matrix, one 384-dim row per movie
+- embedding_store.index.json: model name plus the id and blob hash of each row
+
+Rows are always kept in the order of the last sync, so the aligned embedding
+matrix can be returned as a read-only memory map of the vectors file without
+copying it into memory.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+from typing import Callable, List, Sequence
+
+EMBEDDING_DIM = 384
+
+def hash_search_blob(search_blob: str) -> str:
+    """Stable content hash of a search blob."""
+    return hashlib.blake2b(search_blob.encode('utf-8'), digest_size=16).hexdigest()
+
+class EmbeddingStore:
+    """
+    Embedding store backed by a memory-mapped float32 file.
+
+    Args:
+        path: Path prefix of the store files
+        model_name: Embedding model name; vectors from another model are never reused
+        dim: Embedding dimension
+    """
+
+    def __init__(self, path: str = 'embedding_store', model_name: str = 'all-MiniLM-L6-v2', dim: int = EMBEDDING_DIM):
+        self.path = path
+        self.model_name = model_name
+        self.dim = dim
+        self.vectors_file = f"{path}.vectors"
+        self.index_file = f"{path}.index.json"
+
+    def _load_index(self) -> dict:
+        if not (os.path.exists(self.index_file) and os.path.exists(self.vectors_file)):
+            return {'model_name': self.model_name, 'dim': self.dim, 'ids': [], 'hashes': []}
+        with open(self.index_file, 'r') as f:
+            index = json.load(f)
+        if index.get('model_name') != self.model_name or index.get('dim') != self.dim:
+            print(f"Embedding store was built with {index.get('model_name')} ({index.get('dim')} dims); "
+                  f"re-encoding everything for {self.model_name}")
+            return {'model_name': self.model_name, 'dim': self.dim, 'ids': [], 'hashes': []}
+        return index
+
+    def _save_index(self, ids: List[int], hashes: List[str]):
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'model_name': self.model_name, 'dim': self.dim, 'ids': ids, 'hashes': hashes}, f)
+        os.replace(tmp_file, self.index_file)
+
+    def load(self) -> np.ndarray:
+        """Open the stored matrix as a read-only memory map (rows in last sync order)."""
+        index = self._load_index()
+        if not index['ids']:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self.vectors_file, dtype=np.float32, mode='r', shape=(len(index['ids']), self.dim))
+
+    def sync(self, movie_ids: Sequence[int], search_blobs: Sequence[str],
+             encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Bring the store in line with the catalog and return the aligned matrix.
+
+        Args:
+            movie_ids: Catalog ids, in insert order
+            search_blobs: Search blob of each movie
+            encode: Function embedding a list of texts, e.g. process_kaggle.create_embeddings
+
+        Returns:
+            Read-only memory map of shape (len(movie_ids), 384); row i is the
+            embedding of movie_ids[i]
+        """
+        movie_ids = [int(movie_id) for movie_id in movie_ids]
+        hashes = [hash_search_blob(blob) for blob in search_blobs]
+        index = self._load_index()
+        old_rows = {(movie_id, blob_hash): row
+                    for row, (movie_id, blob_hash) in enumerate(zip(index['ids'], index['hashes']))}
+
+        # Reuse unchanged vectors; encode only new or changed blobs
+        reused = {}  # new row -> old row
+        to_encode = []
+        for row, key in enumerate(zip(movie_ids, hashes)):
+            old_row = old_rows.get(key)
+            if old_row is None:
+                to_encode.append(row)
+            else:
+                reused[row] = old_row
+        stale = len(index['ids']) - len(reused)
+        print(f"Embedding store: {len(reused)} reused, {len(to_encode)} to encode, {stale} stale entries removed")
+
+        new_vectors = None
+        if to_encode:
+            new_vectors = np.asarray(encode([search_blobs[row] for row in to_encode]), dtype=np.float32)
+            if new_vectors.shape != (len(to_encode), self.dim):
+                raise ValueError(f"Expected embeddings of shape ({len(to_encode)}, {self.dim}), got {new_vectors.shape}")
+
+        count = len(movie_ids)
+        in_place = all(new_row == old_row for new_row, old_row in reused.items())
+        if in_place:
+            # Every reused vector is already at its final row: overwrite changed rows
+            # and resize the file instead of rewriting it
+            with open(self.vectors_file, 'ab') as f:
+                f.truncate(count * self.dim * 4)
+            if count and new_vectors is not None:
+                matrix = np.memmap(self.vectors_file, dtype=np.float32, mode='r+', shape=(count, self.dim))
+                matrix[to_encode] = new_vectors
+                matrix.flush()
+                del matrix
+        else:
+            # Rows moved: write a new file in catalog order, then swap it in
+            tmp_file = self.vectors_file + '.tmp'
+            matrix = np.memmap(tmp_file, dtype=np.float32, mode='w+', shape=(max(count, 1), self.dim))
+            if reused:
+                old_matrix = np.memmap(self.vectors_file, dtype=np.float32, mode='r',
+                                       shape=(len(index['ids']), self.dim))
+                new_rows = np.fromiter(reused.keys(), dtype=np.int64, count=len(reused))
+                matrix[new_rows] = old_matrix[np.fromiter(reused.values(), dtype=np.int64, count=len(reused))]
+                del old_matrix
+            if new_vectors is not None:
+                matrix[to_encode] = new_vectors
+            matrix.flush()
+            del matrix
+            with open(tmp_file, 'ab') as f:
+                f.truncate(count * self.dim * 4)
+            os.replace(tmp_file, self.vectors_file)
+
+        self._save_index(movie_ids, hashes)
+        if count == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self.vectors_file, dtype=np.float32, mode='r', shape=(count, self.dim))
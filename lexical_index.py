@@ -0,0 +1,227 @@
+"""
+In-process BM25 keyword index for hybrid retrieval.
+
+Vector search handles mood-style prompts well but can miss prompts that name a
+title, actor or keyword ("Tom Hanks war movie"). The lexical index scores the
+catalog's search text (title, overview, keywords, cast and director) with BM25,
+and recommend_movies fuses its ranking with the vector ranking through
+reciprocal-rank fusion (RRF).
+
+Postings are stored compressed-sparse-row style: for term t, documents
+doc_ids[offsets[t]:offsets[t + 1]] with precomputed BM25 weights (IDF times the
+saturated, length-normalized term frequency). Scoring a query is one
+vectorized scatter-add per query term, typically well under a millisecond for
+the ~4.8k movie catalog.
+
+The index also stores the metadata filter columns (see search_filters.py), so a
+filtered search restricts the documents before taking the top matches instead
+of dropping non-matching keyword hits afterwards.
+
+process_kaggle builds the index after ingest and saves it to a directory of
+.npy files, switched into place atomically (see catalog_snapshot.write_directory);
+the API loads them as read-only memory maps.
+"""
+
+import json
+import os
+import re
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from catalog_snapshot import resolve_directory, write_directory
+from search_filters import METADATA_COLUMNS, SearchFilters, empty_metadata
+
+# content_type values searched when no filter is given (same as the vector search)
+DEFAULT_CONTENT_TYPES = ('Movie', 'YouTube Clips')
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its me my of on or our
+she so that the their them they this to was we were what when which who will with you your
+movie movies film films something some want like about
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+class BM25Index:
+    """
+    BM25 index over the catalog's search text.
+
+    Use BM25Index.build() to create one from documents, or BM25Index.load().
+
+    Args:
+        ids: Catalog id of each document
+        content_types: Content type of each document
+        vocabulary: Term of each term id
+        offsets: Postings start of each term id (length len(vocabulary) + 1)
+        doc_ids: Document positions of all postings
+        weights: BM25 weight of each posting
+        filter_columns: Metadata filter arrays by column (see search_filters.METADATA_COLUMNS);
+            missing columns have no values and match no filter on them
+    """
+
+    _ARRAYS = ('ids', 'offsets', 'doc_ids', 'weights')
+
+    def __init__(self, ids: np.ndarray, content_types: Sequence[str], vocabulary: Sequence[str],
+                 offsets: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray, k1: float = 1.2, b: float = 0.75,
+                 filter_columns: Optional[Dict[str, np.ndarray]] = None):
+        self.ids = ids
+        self.content_types = np.asarray(content_types, dtype=object)
+        self.vocabulary = list(vocabulary)
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.k1 = k1
+        self.b = b
+        self.filter_columns = empty_metadata(len(ids))
+        for name, values in (filter_columns or {}).items():
+            if name in METADATA_COLUMNS:
+                self.filter_columns[name] = np.asarray(values, dtype=METADATA_COLUMNS[name])
+        self._term_ids = {term: i for i, term in enumerate(self.vocabulary)}
+        self._masks = {
+            value: self.content_types == value
+            for value in set(self.content_types.tolist())
+        }
+        self._masks[None] = np.isin(self.content_types, DEFAULT_CONTENT_TYPES)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: Iterable[int], texts: Iterable[str], content_types: Optional[Iterable[str]] = None,
+              k1: float = 1.2, b: float = 0.75,
+              filter_columns: Optional[Dict[str, np.ndarray]] = None) -> "BM25Index":
+        """
+        Build an index.
+
+        Args:
+            ids: Catalog id of each document
+            texts: Search text of each document
+            content_types: Content type of each document (default 'Movie')
+            k1: Term frequency saturation
+            b: Document length normalization
+            filter_columns: Metadata filter arrays of the documents
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        term_ids = {}
+        doc_terms = []  # per document: (term ids, term frequencies)
+        lengths = np.zeros(len(ids), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text or '')
+            lengths[doc] = len(tokens)
+            counts = {}
+            for token in tokens:
+                term = term_ids.setdefault(token, len(term_ids))
+                counts[term] = counts.get(term, 0) + 1
+            doc_terms.append((np.fromiter(counts.keys(), dtype=np.int32, count=len(counts)),
+                              np.fromiter(counts.values(), dtype=np.float32, count=len(counts))))
+        if len(doc_terms) != len(ids):
+            raise ValueError(f"Got {len(ids)} ids for {len(doc_terms)} documents")
+
+        # Group postings by term (stable, so doc ids stay ascending within a term)
+        terms = np.concatenate([t for t, _ in doc_terms]) if doc_terms else np.empty(0, dtype=np.int32)
+        frequencies = np.concatenate([f for _, f in doc_terms]) if doc_terms else np.empty(0, dtype=np.float32)
+        docs = np.repeat(np.arange(len(ids), dtype=np.int32), [len(t) for t, _ in doc_terms])
+        order = np.argsort(terms, kind='stable')
+        terms, frequencies, docs = terms[order], frequencies[order], docs[order]
+
+        document_frequency = np.bincount(terms, minlength=len(term_ids)).astype(np.float32)
+        offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=offsets[1:])
+
+        # Precompute idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)) per posting
+        idf = np.log1p((len(ids) - document_frequency + 0.5) / (document_frequency + 0.5))
+        avg_length = max(float(lengths.mean()) if len(lengths) else 0.0, 1.0)
+        norm = k1 * (1 - b + b * lengths[docs] / avg_length)
+        weights = (idf[terms] * frequencies * (k1 + 1) / (frequencies + norm)).astype(np.float32)
+
+        content_types = list(content_types) if content_types is not None else ['Movie'] * len(ids)
+        return cls(ids, content_types, list(term_ids), offsets, docs, weights, k1=k1, b=b, filter_columns=filter_columns)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for a query (0 where no term matches)."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term = self._term_ids.get(token)
+            if term is not None:
+                start, end = self.offsets[term], self.offsets[term + 1]
+                scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query: str, top_n: int = 50, content_type: Optional[str] = None,
+               allowed: Optional[np.ndarray] = None,
+               filters: Optional[SearchFilters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the documents with the highest BM25 scores.
+
+        Args:
+            query: Query text
+            top_n: Maximum number of results
+            content_type: Filter by content type, None for the default types
+            allowed: Optional boolean mask over documents; False rows are excluded
+            filters: Metadata filters; non-matching documents are excluded before the top_n
+
+        Returns:
+            (catalog ids, scores), best first; only documents matching at least one term
+        """
+        scores = self.scores(query)
+        mask = self._masks.get(content_type)
+        if mask is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if allowed is not None:
+            mask = mask & allowed
+        if filters:
+            mask = mask & filters.mask(self.filter_columns)
+        scores = np.where(mask, scores, 0.0)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_n:
+            candidates = candidates[np.argpartition(-scores[candidates], top_n - 1)[:top_n]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return self.ids[candidates], scores[candidates]
+
+    # Persistence
+
+    def save(self, path: str):
+        """Save the index to a directory of .npy files (replacing any previous version atomically)."""
+        write_directory(path, self._write)
+
+    def _write(self, directory: str):
+        for name in self._ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        for name, values in self.filter_columns.items():
+            np.save(os.path.join(directory, f"column_{name}.npy"), values)
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'k1': self.k1, 'b': self.b, 'vocabulary': self.vocabulary,
+                       'content_types': self.content_types.tolist(),
+                       'filter_columns': list(self.filter_columns)}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index saved with save(); arrays are memory-mapped read-only."""
+        path = resolve_directory(path)
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in cls._ARRAYS}
+        # Indexes written before the filter columns existed load without them (no document matches a filter)
+        filter_columns = {name: np.load(os.path.join(path, f"column_{name}.npy"), mmap_mode='r')
+                          for name in meta.get('filter_columns', ())}
+        return cls(arrays['ids'], meta['content_types'], meta['vocabulary'], arrays['offsets'],
+                   arrays['doc_ids'], arrays['weights'], k1=meta['k1'], b=meta['b'], filter_columns=filter_columns)
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse rankings with reciprocal-rank fusion: score(id) = sum of 1 / (k + rank).
+
+    Args:
+        rankings: Lists of ids, best first
+        k: Rank offset; larger values flatten the contribution of top ranks
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
@@ -0,0 +1,390 @@
+"""
+In-process vector search over the movie catalog.
+
+The catalog (~4.8k TMDB movies plus a few clips, 384-dim vectors) fits in a few
+MB, so it can be searched in memory instead of sending every query to Oracle.
+LocalVectorIndex keeps a normalized float32 embedding matrix and answers a query
+with one matrix-vector product plus an argpartition top-k.
+
+Scores are cosine distances (1 - cosine similarity), the same metric and
+ascending order as Oracle's default VECTOR_DISTANCE, so results match the
+Oracle search path.
+
+The index is loaded either from the process_kaggle embedding store or an
+embeddings .npy file (paired with the rows of the TMDB CSVs in the order
+process_kaggle created them), with one bulk fetch from the movie_search table,
+or from a memory-mapped catalog snapshot (see catalog_snapshot.py), which needs
+no database round trip and shares one page-cache copy across worker processes.
+
+Metadata filters (genres, release year, runtime, rating) are applied to the
+candidate rows before the top-k selection, like the WHERE clause of the Oracle
+query, so a filtered search still returns top_k matching results.
+
+quantize() switches the scan to compressed codes (int8 or product quantization,
+see quantization.py): candidates are scored with asymmetric distances and the
+best ones reranked with the full-precision vectors, so returned distances stay exact.
+"""
+
+import os
+import numpy as np
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, List, Optional, Sequence
+from quantization import QuantizedSearcher
+from search_filters import METADATA_COLUMNS, SearchFilters, empty_metadata, metadata_from_rows
+
+EMBEDDING_DIM = 384
+
+# content_type values searched when no filter is given (same as the Oracle query)
+DEFAULT_CONTENT_TYPES = ('Movie', 'YouTube Clips')
+
+def read_catalog_version(connection) -> int:
+    """Catalog version bumped by process_kaggle on every insert; 0 if nothing has been versioned yet."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+    except Exception as e:
+        # ORA-00942: table or view does not exist
+        if 'ORA-00942' not in str(e):
+            raise
+        return 0
+    finally:
+        cursor.close()
+
+def _as_sequence(values) -> Sequence:
+    """Keep indexable columns (lists, snapshot string columns) as they are."""
+    return values if isinstance(values, SequenceABC) and not isinstance(values, str) else list(values)
+
+class LocalVectorIndex:
+    """
+    Brute-force cosine-distance index over an in-memory embedding matrix.
+
+    Args:
+        ids: Catalog ids, one per row
+        titles: Titles, one per row
+        descriptions: Descriptions (already truncated for responses)
+        urls: URLs (None for movies)
+        content_types: Content type of each row ('Movie' or 'YouTube Clips')
+        embeddings: Array of shape (n, 384)
+        normalized: Rows of embeddings are already L2-normalized; the array is
+            then used as is (e.g. a memory map) instead of being copied
+        filter_columns: Metadata filter arrays by column (see search_filters.METADATA_COLUMNS);
+            missing columns have no values and match no filter on them
+    """
+
+    # Catalog version of the loaded data (snapshot header or catalog_version table),
+    # None when the source does not record one (embedding files)
+    catalog_version = None
+
+    # QuantizedSearcher over the embeddings when quantize() was called, else None
+    quantized = None
+
+    def __init__(self, ids: Sequence[int], titles: Sequence[str], descriptions: Sequence[str],
+                 urls: Sequence[Optional[str]], content_types: Sequence[str], embeddings: np.ndarray,
+                 normalized: bool = False, filter_columns: Optional[Dict[str, np.ndarray]] = None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[1] != EMBEDDING_DIM:
+            raise ValueError(f"Expected embeddings of shape (n, {EMBEDDING_DIM}), got {embeddings.shape}")
+        if not (len(ids) == len(titles) == len(descriptions) == len(urls) == len(content_types) == len(embeddings)):
+            raise ValueError("All index columns must have the same length")
+
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.titles = _as_sequence(titles)
+        self.descriptions = _as_sequence(descriptions)
+        self.urls = _as_sequence(urls)
+        self.content_types = np.asarray(content_types, dtype=object)
+        self.filter_columns = empty_metadata(len(self.ids))
+        for name, values in (filter_columns or {}).items():
+            if name in METADATA_COLUMNS:
+                self.filter_columns[name] = np.asarray(values, dtype=METADATA_COLUMNS[name])
+
+        # Normalize rows once so cosine distance is 1 - dot product
+        if normalized:
+            self.embeddings = embeddings
+        else:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            self.embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        # Precomputed row positions for each content_type filter
+        self._masks = {
+            value: np.flatnonzero(self.content_types == value)
+            for value in set(self.content_types.tolist())
+        }
+        self._masks[None] = np.flatnonzero(np.isin(self.content_types, DEFAULT_CONTENT_TYPES))
+        self._rows_by_id = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _candidate_rows(self, content_type: Optional[str], filters: Optional[SearchFilters] = None) -> np.ndarray:
+        rows = self._masks.get(content_type)
+        if rows is None:
+            return np.empty(0, dtype=np.int64)
+        if filters:
+            rows = rows[filters.mask(self.filter_columns)[rows]]
+        return rows
+
+    def quantize(self, method: str = 'int8', rerank: int = 10, **params) -> "LocalVectorIndex":
+        """
+        Answer scans from quantized codes instead of the float32 matrix.
+
+        Args:
+            method: 'int8' or 'pq' (see quantization.create_quantizer)
+            rerank: Candidates rescored in full precision, as a multiple of top_k
+            params: Quantizer parameters (e.g. subvectors for 'pq')
+        """
+        self.quantized = QuantizedSearcher.build(self.embeddings, method, rerank=rerank, **params)
+        return self
+
+    def _quantized_search(self, query: np.ndarray, rows: np.ndarray, top_k: int) -> List[Dict]:
+        # rows come from flatnonzero, so all rows means no restriction (avoids copying the codes)
+        candidates = None if len(rows) == len(self.ids) else rows
+        positions, distances = self.quantized.search(query, top_k, candidates=candidates)
+        return [self._result(row, distance) for row, distance in zip(positions, distances)]
+
+    def _top_k(self, distances: np.ndarray, top_k: int) -> np.ndarray:
+        """Positions of the top_k smallest distances, sorted ascending."""
+        if top_k < len(distances):
+            candidates = np.argpartition(distances, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(distances))
+        return candidates[np.argsort(distances[candidates], kind='stable')]
+
+    def search(self, query: np.ndarray, top_k: int = 10, content_type: Optional[str] = None,
+               filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """
+        Find the catalog items closest to a query vector.
+
+        Args:
+            query: 384-dimensional query embedding
+            top_k: Number of results to return
+            content_type: Filter by content type ('Movie' or 'YouTube Clips'), None for all
+            filters: Optional metadata filters
+
+        Returns:
+            List of movie dictionaries with similarity scores (cosine distance, lower is better)
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        rows = self._candidate_rows(content_type, filters)
+        if len(rows) == 0 or top_k <= 0:
+            return []
+        if self.quantized is not None:
+            return self._quantized_search(query, rows, top_k)
+
+        distances = 1.0 - (self.embeddings @ query)[rows]
+        order = self._top_k(distances, top_k)
+        return [self._result(rows[i], distances[i]) for i in order]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 10, content_type: Optional[str] = None,
+                     block_size: int = 256, filters: Optional[SearchFilters] = None) -> List[List[Dict]]:
+        """
+        Search for many query vectors at once with matrix-matrix products.
+
+        Queries are processed in blocks of block_size to bound the size of the
+        (queries x catalog) distance matrix.
+
+        Args:
+            queries: Array of shape (n_queries, 384)
+            top_k: Number of results per query
+            content_type: Filter by content type, None for all
+            block_size: Number of queries scored per matrix product
+            filters: Optional metadata filters (shared by all queries)
+
+        Returns:
+            One result list per query, in the same order as queries
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+
+        rows = self._candidate_rows(content_type, filters)
+        if len(rows) == 0 or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        if self.quantized is not None:
+            return [self._quantized_search(query, rows, top_k) for query in queries]
+
+        k = min(top_k, len(rows))
+        results = []
+        for start in range(0, len(queries), block_size):
+            block = queries[start:start + block_size]
+            distances = 1.0 - (block @ self.embeddings.T)[:, rows]
+            if k < len(rows):
+                candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                candidates = np.broadcast_to(np.arange(len(rows)), (len(block), len(rows)))
+            candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+            order = np.argsort(candidate_distances, axis=1, kind='stable')
+            top = np.take_along_axis(candidates, order, axis=1)
+            top_distances = np.take_along_axis(candidate_distances, order, axis=1)
+            for query_top, query_distances in zip(top, top_distances):
+                results.append([self._result(rows[i], d) for i, d in zip(query_top, query_distances)])
+        return results
+
+    def score_ids(self, query: np.ndarray, ids: Sequence[int], filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """
+        Results for specific catalog ids with their distance to a query vector.
+
+        Used to add keyword-only matches to hybrid results. Unknown ids and ids
+        not matching filters are skipped.
+        """
+        rows_by_id = self._row_lookup()
+        rows = np.array([rows_by_id[int(i)] for i in ids if int(i) in rows_by_id], dtype=np.int64)
+        if filters and len(rows):
+            rows = rows[filters.mask(self.filter_columns)[rows]]
+        if len(rows) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        distances = 1.0 - self.embeddings[rows] @ query
+        return [self._result(row, distance) for row, distance in zip(rows, distances)]
+
+    def vectors(self, ids: Sequence[int]) -> np.ndarray:
+        """Normalized embeddings of catalog ids, shape (len(ids), 384); zeros for unknown ids."""
+        rows_by_id = self._row_lookup()
+        vectors = np.zeros((len(ids), EMBEDDING_DIM), dtype=np.float32)
+        positions = [(i, rows_by_id[int(movie_id)]) for i, movie_id in enumerate(ids) if int(movie_id) in rows_by_id]
+        if positions:
+            found, rows = zip(*positions)
+            vectors[list(found)] = self.embeddings[list(rows)]
+        return vectors
+
+    def items(self, ids: Sequence[int]) -> Dict[int, Dict]:
+        """Result dictionaries of catalog ids (similarity_score None); unknown ids are skipped."""
+        rows_by_id = self._row_lookup()
+        return {int(i): self._result(rows_by_id[int(i)], None) for i in ids if int(i) in rows_by_id}
+
+    def _row_lookup(self) -> Dict[int, int]:
+        if self._rows_by_id is None:
+            self._rows_by_id = {int(movie_id): row for row, movie_id in enumerate(self.ids.tolist())}
+        return self._rows_by_id
+
+    def _result(self, row: int, distance: Optional[float]) -> Dict:
+        return {
+            'id': int(self.ids[row]),
+            'title': self.titles[row] or "Unknown",
+            'description': self.descriptions[row] or "",
+            'content_type': self.content_types[row] or "Movie",
+            'url': self.urls[row],
+            'similarity_score': float(distance) if distance is not None else None,
+        }
+
+    @classmethod
+    def from_embeddings_file(cls, embeddings_file: str = 'embedding_store', merged_df=None) -> "LocalVectorIndex":
+        """
+        Build the index from the embedding store (or a .npy file) and the TMDB CSVs.
+
+        Rows are matched to the merged CSV rows by position, the same way
+        process_kaggle.main inserts them. YouTube clips are not embedded
+        there and are therefore not included.
+        """
+        import pandas as pd
+        from process_kaggle import EMBEDDING_MODEL_NAME, load_and_merge_data
+
+        if merged_df is None:
+            merged_df = load_and_merge_data()
+        if embeddings_file.endswith('.npy'):
+            embeddings = np.load(embeddings_file, mmap_mode='r')
+        else:
+            from embedding_store import EmbeddingStore
+            embeddings = EmbeddingStore(embeddings_file, model_name=EMBEDDING_MODEL_NAME).load()
+        if len(embeddings) != len(merged_df):
+            raise ValueError(f"{embeddings_file} has {len(embeddings)} rows but the dataset has {len(merged_df)} movies")
+
+        from process_kaggle import build_movie_metadata
+
+        descriptions = [str(overview)[:500] if pd.notna(overview) else "" for overview in merged_df['overview']]
+        return cls(
+            ids=merged_df['id'].astype(int).tolist(),
+            titles=merged_df['title'].astype(str).tolist(),
+            descriptions=descriptions,
+            urls=[None] * len(merged_df),
+            content_types=['Movie'] * len(merged_df),
+            embeddings=embeddings,
+            filter_columns=metadata_from_rows(build_movie_metadata(merged_df)),
+        )
+
+    def save_snapshot(self, path: str, metadata: Optional[Dict] = None) -> int:
+        """Write the index to a catalog snapshot file; returns the number of rows."""
+        from catalog_snapshot import write_snapshot
+        return write_snapshot(path, self.ids, self.titles, self.descriptions, self.urls,
+                              self.content_types.tolist(), self.embeddings, metadata, normalized=True,
+                              filter_columns=self.filter_columns)
+
+    @classmethod
+    def from_snapshot(cls, path: str = 'catalog.snapshot') -> "LocalVectorIndex":
+        """
+        Open a catalog snapshot with mmap. Ids, vectors and strings stay in the
+        mapped file; only the content type column is materialized.
+        """
+        from catalog_snapshot import CatalogSnapshot
+        snapshot = CatalogSnapshot(path)
+        index = cls(
+            ids=snapshot.ids,
+            titles=snapshot.titles,
+            descriptions=snapshot.descriptions,
+            urls=snapshot.urls,
+            content_types=snapshot.content_types,
+            embeddings=snapshot.embeddings,
+            normalized=True,
+            filter_columns=snapshot.filter_columns,
+        )
+        index.snapshot_metadata = snapshot.metadata
+        index.catalog_version = snapshot.metadata.get('catalog_version')
+        return index
+
+    @classmethod
+    def from_database(cls, connection) -> "LocalVectorIndex":
+        """Build the index with one bulk fetch from the movie_search table."""
+        catalog_version = read_catalog_version(connection)  # read first, so a concurrent insert is seen as newer
+        cursor = connection.cursor()
+        cursor.arraysize = 1000
+        try:
+            cursor.execute("""
+                SELECT id, title, DBMS_LOB.SUBSTR(description, 500, 1), url, content_type, embedding,
+                       genre_mask, release_year, runtime, vote_average
+                FROM movie_search
+            """)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        embeddings = np.empty((len(rows), EMBEDDING_DIM), dtype=np.float32)
+        for i, row in enumerate(rows):
+            embeddings[i] = row[5]  # VECTOR columns are fetched as array.array
+        index = cls(
+            ids=[int(row[0]) for row in rows],
+            titles=[str(row[1]) if row[1] else "Unknown" for row in rows],
+            descriptions=[row[2] or "" for row in rows],
+            urls=[str(row[3]) if row[3] else None for row in rows],
+            content_types=[str(row[4]) if row[4] else "Movie" for row in rows],
+            embeddings=embeddings,
+            filter_columns=metadata_from_rows([row[6:] for row in rows]),
+        )
+        index.catalog_version = catalog_version
+        return index
+
+def load_local_index(source: Optional[str] = None, connection=None) -> LocalVectorIndex:
+    """
+    Load the local index from the configured source.
+
+    Args:
+        source: 'database' (bulk fetch from movie_search), 'snapshot' (the catalog
+            snapshot at CATALOG_SNAPSHOT), a path to a .snapshot file, an embedding
+            store path prefix or a path to an embeddings .npy file; defaults to the
+            LOCAL_INDEX_SOURCE setting
+        connection: Database connection, required for the 'database' source
+    """
+    source = source or os.getenv('LOCAL_INDEX_SOURCE', 'database')
+    if source == 'database':
+        if connection is None:
+            raise ValueError("A database connection is required to load the index from movie_search")
+        index = LocalVectorIndex.from_database(connection)
+    elif source == 'snapshot' or source.endswith('.snapshot'):
+        path = os.getenv('CATALOG_SNAPSHOT', 'catalog.snapshot') if source == 'snapshot' else source
+        index = LocalVectorIndex.from_snapshot(path)
+    else:
+        index = LocalVectorIndex.from_embeddings_file(source)
+    print(f"Loaded local vector index with {len(index)} items from {source}")
+    return index
@@ -5,29 +5,88 @@ This service can be deployed on Railway alongside the Express server.
 The Express server can call this API to get movie recommendations.
 """
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 import os
 import sys
+import time
 
 # Import recommendation functions
 # Try to import, but allow API to start even if it fails (for health checks)
 try:
     sys.path.insert(0, os.path.dirname(__file__))
-    from recommend_movies import recommend_movies
+    from recommend_movies import (
+        recommend_movies,
+        recommend_movies_async,
+        recommend_movies_batch,
+        similar_movies,
+        init_connection_pool,
+        close_connection_pool,
+        init_async_connection_pool,
+        close_async_connection_pool,
+        warmup_embedder,
+        init_search_backend,
+        get_pool_stats,
+        get_embedding_cache_stats,
+        get_catalog_version,
+        RESULT_FIELDS,
+        RETRIEVAL_MODES,
+    )
     RECOMMENDATIONS_AVAILABLE = True
 except Exception as e:
     print(f"WARNING: Could not import recommend_movies: {e}")
     print("API will start but /recommend endpoint will not work until this is fixed.")
     RECOMMENDATIONS_AVAILABLE = False
     recommend_movies = None
+    recommend_movies_batch = None
+    similar_movies = None
+    RESULT_FIELDS = ('full', 'ids')
+    RETRIEVAL_MODES = ('vector', 'hybrid')
+
+from response_cache import create_response_cache_from_env, make_request_key
+from search_filters import SearchFilters
+from reranking import parse_stages
+
+# Cache of full recommendation responses; None when RESPONSE_CACHE_SIZE=0
+response_cache = create_response_cache_from_env()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown."""
+    if RECOMMENDATIONS_AVAILABLE:
+        if os.getenv('EMBEDDING_WARMUP', 'true').lower() == 'true':
+            try:
+                warmup_embedder()
+            except Exception as e:
+                print(f"WARNING: Could not warm up embedding model: {e}")
+        try:
+            init_connection_pool()
+        except Exception as e:
+            # Keep the API up for health checks; requests fall back to standalone connections
+            print(f"WARNING: Could not create Oracle connection pool: {e}")
+        try:
+            await init_async_connection_pool()
+        except Exception as e:
+            # Requests fall back to the synchronous search in a worker thread
+            print(f"WARNING: Could not create async Oracle connection pool: {e}")
+        try:
+            init_search_backend()
+        except Exception as e:
+            print(f"WARNING: Could not prepare search backend: {e}")
+    yield
+    if RECOMMENDATIONS_AVAILABLE:
+        await close_async_connection_pool()
+        close_connection_pool()
 
 app = FastAPI(
     title="Movie Recommendation API",
     description="Semantic movie recommendations using Oracle 26ai Vector Search",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware - allow requests from your frontend
@@ -43,6 +102,17 @@ class RecommendationRequest(BaseModel):
     prompt: str
     top_k: Optional[int] = 10
     content_type: Optional[str] = "Movie"  # "Movie", "YouTube Clips", or None for all
+    fields: Optional[str] = "full"  # "full", or "ids" for ids and similarity scores only
+    mode: Optional[str] = None  # "vector" or "hybrid" (vector + keyword ranking); None for the server default
+    # Metadata filters, applied inside the search (all given conditions must hold)
+    genres: Optional[List[str]] = None  # any of these TMDB genres
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    runtime_min: Optional[int] = None  # minutes
+    runtime_max: Optional[int] = None
+    min_rating: Optional[float] = None  # TMDB vote average (0-10)
+    # Second-stage rerank: "mmr", "cross_encoder", "mmr,cross_encoder" or "none"; None for the server default
+    rerank: Optional[str] = None
 
 class MovieRecommendation(BaseModel):
     id: int
@@ -52,10 +122,97 @@ class MovieRecommendation(BaseModel):
     url: Optional[str] = None
     content_type: str
 
+class MovieScore(BaseModel):
+    id: int
+    similarity_score: Optional[float] = None
+
 class RecommendationResponse(BaseModel):
-    recommendations: List[MovieRecommendation]
+    recommendations: List[Union[MovieRecommendation, MovieScore]]
     prompt: str
     count: int
+    # Per-stage milliseconds (embedding_ms, search_ms, rerank_ms, ..., total_ms); only total_ms when cached
+    timings: Optional[Dict[str, Any]] = None
+
+class SimilarMoviesResponse(BaseModel):
+    movie_id: int
+    recommendations: List[Union[MovieRecommendation, MovieScore]]
+    count: int
+
+class BatchRecommendationRequest(BaseModel):
+    prompts: List[str]
+    top_k: Optional[int] = 10
+    content_type: Optional[str] = "Movie"  # "Movie", "YouTube Clips", or None for all
+    fields: Optional[str] = "full"  # "full", or "ids" for ids and similarity scores only
+    # Metadata filters shared by all prompts (see RecommendationRequest)
+    genres: Optional[List[str]] = None
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    runtime_min: Optional[int] = None
+    runtime_max: Optional[int] = None
+    min_rating: Optional[float] = None
+
+class BatchRecommendationItem(BaseModel):
+    prompt: str
+    recommendations: List[Union[MovieRecommendation, MovieScore]]
+    count: int
+    error: Optional[str] = None
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[BatchRecommendationItem]
+    count: int
+    failed: int
+
+# Maximum number of prompts accepted by /recommend/batch
+BATCH_MAX_PROMPTS = int(os.getenv('BATCH_MAX_PROMPTS', '1000'))
+
+def validate_fields(fields: Optional[str]) -> bool:
+    """Check the requested result fields; returns True for ids-and-scores-only results."""
+    fields = fields or "full"
+    if fields not in RESULT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"fields must be one of: {', '.join(RESULT_FIELDS)}")
+    return fields == "ids"
+
+def validate_mode(mode: Optional[str]) -> Optional[str]:
+    """Check the requested retrieval mode (None keeps the server default)."""
+    if mode is not None and mode.lower() not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(RETRIEVAL_MODES)}")
+    return mode.lower() if mode else None
+
+def validate_rerank(rerank: Optional[str]) -> Optional[str]:
+    """Check the requested rerank stages (None keeps the server default)."""
+    if rerank is None:
+        return None
+    try:
+        return ','.join(parse_stages(rerank)) or 'none'
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def build_filters(request) -> Optional[SearchFilters]:
+    """Metadata filters of a request, or None without any. Genres may also be comma-separated."""
+    genres = [genre for value in request.genres or [] for genre in value.split(',') if genre.strip()]
+    try:
+        filters = SearchFilters(genres=genres, year_min=request.year_min, year_max=request.year_max,
+                                runtime_min=request.runtime_min, runtime_max=request.runtime_max,
+                                min_rating=request.min_rating)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return filters or None
+
+def to_movie_recommendations(recommendations, ids_only: bool = False) -> List[Union[MovieRecommendation, MovieScore]]:
+    """Convert recommendation dictionaries to response models."""
+    if ids_only:
+        return [MovieScore(id=rec['id'], similarity_score=rec.get('similarity_score')) for rec in recommendations]
+    movie_recommendations = []
+    for rec in recommendations:
+        movie_recommendations.append(MovieRecommendation(
+            id=rec['id'],
+            title=rec['title'],
+            description=rec.get('description', '')[:500],  # Limit description length
+            similarity_score=rec.get('similarity_score'),
+            url=rec.get('url'),
+            content_type=rec.get('content_type', 'Movie')
+        ))
+    return movie_recommendations
 
 @app.get("/")
 async def root():
@@ -67,12 +224,21 @@ async def root():
     }
 
 @app.get("/health")
-async def health():
-    """Health check endpoint."""
+async def health(check_db: bool = False):
+    """
+    Health check endpoint.
+    
+    Args:
+        check_db: Also ping the database through the connection pool
+    """
     return {
         "status": "healthy",
         "recommendations_available": RECOMMENDATIONS_AVAILABLE,
-        "service": "Movie Recommendation API"
+        "service": "Movie Recommendation API",
+        "worker_pid": os.getpid(),
+        "db_pool": await asyncio.to_thread(get_pool_stats, check_db) if RECOMMENDATIONS_AVAILABLE else None,
+        "embedding_cache": get_embedding_cache_stats() if RECOMMENDATIONS_AVAILABLE else None,
+        "response_cache": response_cache.stats() if response_cache else {"enabled": False}
     }
 
 @app.post("/recommend", response_model=RecommendationResponse)
@@ -100,12 +266,40 @@ async def get_recommendations(request: RecommendationRequest):
         if request.top_k and (request.top_k < 1 or request.top_k > 50):
             raise HTTPException(status_code=400, detail="top_k must be between 1 and 50")
         
-        # Get recommendations
-        recommendations = recommend_movies(
-            prompt=request.prompt,
-            top_k=request.top_k or 10,
-            content_type=request.content_type
-        )
+        ids_only = validate_fields(request.fields)
+        mode = validate_mode(request.mode)
+        filters = build_filters(request)
+        rerank = validate_rerank(request.rerank)
+        
+        # Get recommendations (identical requests are served from the response cache)
+        top_k = request.top_k or 10
+        start = time.perf_counter()
+        timings = {}
+        
+        def compute():
+            return recommend_movies_async(
+                prompt=request.prompt,
+                top_k=top_k,
+                content_type=request.content_type,
+                ids_only=ids_only,
+                mode=mode,
+                filters=filters,
+                rerank=rerank,
+                timings=timings
+            )
+        
+        if response_cache is not None:
+            try:
+                version = await asyncio.to_thread(get_catalog_version)
+                if version is not None:
+                    response_cache.set_version(version)
+            except Exception as e:
+                print(f"WARNING: Could not check catalog version: {e}")
+            key = make_request_key(request.prompt, top_k, request.content_type, ids_only=ids_only, mode=mode,
+                                   filters=filters.key() if filters else None, rerank=rerank)
+            recommendations = await response_cache.aget_or_compute(key, compute)
+        else:
+            recommendations = await compute()
         
         if not recommendations:
             raise HTTPException(
@@ -114,21 +308,14 @@ async def get_recommendations(request: RecommendationRequest):
             )
         
         # Convert to response format
-        movie_recommendations = []
-        for rec in recommendations:
-            movie_recommendations.append(MovieRecommendation(
-                id=rec['id'],
-                title=rec['title'],
-                description=rec.get('description', '')[:500],  # Limit description length
-                similarity_score=rec.get('similarity_score'),
-                url=rec.get('url'),
-                content_type=rec.get('content_type', 'Movie')
-            ))
+        movie_recommendations = to_movie_recommendations(recommendations, ids_only)
+        timings['total_ms'] = round((time.perf_counter() - start) * 1000, 2)
         
         return RecommendationResponse(
             recommendations=movie_recommendations,
             prompt=request.prompt,
-            count=len(movie_recommendations)
+            count=len(movie_recommendations),
+            timings=timings
         )
         
     except HTTPException:
@@ -145,11 +332,137 @@ async def get_recommendations(request: RecommendationRequest):
             detail=f"Failed to get recommendations: {error_msg}"
         )
 
+@app.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def get_recommendations_batch(request: BatchRecommendationRequest):
+    """
+    Get recommendations for many prompts in one call (for bulk jobs).
+    
+    Prompts are embedded together and searched with one multi-query search.
+    A failing prompt does not fail the batch; its error is reported per item.
+    
+    Args:
+        request: BatchRecommendationRequest with prompts, top_k, and content_type
+        
+    Returns:
+        BatchRecommendationResponse with one result per prompt, in request order
+    """
+    if not RECOMMENDATIONS_AVAILABLE or recommend_movies_batch is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Recommendation service is not available. Check server logs for details."
+        )
+    
+    if not request.prompts:
+        raise HTTPException(status_code=400, detail="prompts cannot be empty")
+    
+    if len(request.prompts) > BATCH_MAX_PROMPTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_PROMPTS} prompts per batch")
+    
+    if request.top_k and (request.top_k < 1 or request.top_k > 50):
+        raise HTTPException(status_code=400, detail="top_k must be between 1 and 50")
+    
+    ids_only = validate_fields(request.fields)
+    filters = build_filters(request)
+    
+    try:
+        # Bulk work is blocking; keep it off the event loop
+        items = await asyncio.to_thread(
+            recommend_movies_batch,
+            prompts=request.prompts,
+            top_k=request.top_k or 10,
+            content_type=request.content_type,
+            ids_only=ids_only,
+            filters=filters
+        )
+    except Exception as e:
+        error_msg = str(e)
+        print(f"ERROR in batch recommendation API: {error_msg}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get recommendations: {error_msg}"
+        )
+    
+    results = []
+    for item in items:
+        movie_recommendations = to_movie_recommendations(item['recommendations'], ids_only)
+        results.append(BatchRecommendationItem(
+            prompt=item['prompt'],
+            recommendations=movie_recommendations,
+            count=len(movie_recommendations),
+            error=item['error']
+        ))
+    
+    return BatchRecommendationResponse(
+        results=results,
+        count=len(results),
+        failed=sum(1 for item in results if item.error)
+    )
+
+@app.get("/similar/{movie_id}", response_model=SimilarMoviesResponse)
+async def get_similar_movies(
+    movie_id: int,
+    top_k: Optional[int] = 10,
+    content_type: Optional[str] = None,
+    fields: Optional[str] = "full"
+):
+    """
+    Movies most similar to a catalog item ("more like this").
+    
+    Served from the neighbor table precomputed by process_kaggle: no embedding
+    call and no vector search.
+    
+    Args:
+        movie_id: Catalog id
+        top_k: Number of results (default: 10, max: the precomputed neighbor count)
+        content_type: Keep only "Movie" or "YouTube Clips" neighbors (default: all)
+        fields: "full", or "ids" for ids and similarity scores only
+    """
+    if not RECOMMENDATIONS_AVAILABLE or similar_movies is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Recommendation service is not available. Check server logs for details."
+        )
+    
+    if top_k and (top_k < 1 or top_k > 50):
+        raise HTTPException(status_code=400, detail="top_k must be between 1 and 50")
+    
+    ids_only = validate_fields(fields)
+    
+    try:
+        # A direct lookup with ids_only or the local backends; otherwise one primary-key query
+        recommendations = await asyncio.to_thread(similar_movies, movie_id, top_k or 10, content_type, ids_only)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"ERROR in similar movies API: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get similar movies: {e}")
+    
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail=f"Movie {movie_id} not found")
+    
+    movie_recommendations = to_movie_recommendations(recommendations, ids_only)
+    return SimilarMoviesResponse(
+        movie_id=movie_id,
+        recommendations=movie_recommendations,
+        count=len(movie_recommendations)
+    )
+
 @app.get("/recommend")
 async def get_recommendations_get(
     prompt: str,
     top_k: Optional[int] = 10,
-    content_type: Optional[str] = "Movie"
+    content_type: Optional[str] = "Movie",
+    fields: Optional[str] = "full",
+    mode: Optional[str] = None,
+    genres: Optional[List[str]] = Query(None),
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    runtime_min: Optional[int] = None,
+    runtime_max: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    rerank: Optional[str] = None
 ):
     """
     GET endpoint for movie recommendations (for easier testing).
@@ -158,36 +471,46 @@ async def get_recommendations_get(
         prompt: Natural language movie preference
         top_k: Number of recommendations (default: 10, max: 50)
         content_type: Filter by type ("Movie", "YouTube Clips", or None)
+        fields: "full", or "ids" for ids and similarity scores only
+        mode: "vector" or "hybrid" retrieval (default: server setting)
+        genres: Genres to match (repeated or comma-separated, any of them)
+        year_min, year_max: Release year range
+        runtime_min, runtime_max: Runtime range in minutes
+        min_rating: Minimum TMDB vote average
+        rerank: "mmr", "cross_encoder", "mmr,cross_encoder" or "none" (default: server setting)
     """
     request = RecommendationRequest(
         prompt=prompt,
         top_k=top_k,
-        content_type=content_type
+        content_type=content_type,
+        fields=fields,
+        mode=mode,
+        genres=genres,
+        year_min=year_min,
+        year_max=year_max,
+        runtime_min=runtime_min,
+        runtime_max=runtime_max,
+        min_rating=min_rating,
+        rerank=rerank
     )
     return await get_recommendations(request)
 
 if __name__ == "__main__":
-    import uvicorn
+    from serving import run, worker_count
     
     # Use a fixed port for Python API (8000) since Node.js server uses PORT env var
     # Both services run in the same container, so Python API uses localhost:8000
     port = int(os.getenv("PYTHON_API_PORT", 8000))
+    workers = worker_count()
     
-    print(f"Starting Movie Recommendation API on port {port}...")
+    print(f"Starting Movie Recommendation API on port {port} with {workers} worker(s)...")
     print(f"Health check: http://localhost:{port}/health")
     print(f"Recommend endpoint: http://localhost:{port}/recommend")
     
     try:
-        uvicorn.run(
-            "movie_recommendation_api:app",
-            host="0.0.0.0",
-            port=port,
-            reload=False,
-            log_level="info"
-        )
+        run("movie_recommendation_api:app", host="0.0.0.0", port=port, workers=workers)
     except Exception as e:
         print(f"FATAL ERROR starting Python API: {e}")
         import traceback
         traceback.print_exc()
         raise
-
@@ -0,0 +1,136 @@
+"""
+Precomputed item-to-item neighbors for "more like this" lookups.
+
+process_kaggle computes the top-N most similar catalog items of every item
+after ingest, and the API answers GET /similar/{id} by looking the row up
+instead of embedding text and searching.
+
+Neighbors are computed with blocked matrix products: block_size rows of the
+normalized embedding matrix are scored against the whole catalog at a time, so
+peak memory is block_size x catalog size floats (about 20 MB for 1024 x 5k)
+however large the catalog grows.
+
+The table is stored compactly in a directory of .npy files, written as a new
+version and switched into place atomically (see catalog_snapshot.write_directory):
+- ids: int64[count], catalog id of each row
+- neighbors: int32[count, top_n], neighbor rows, closest first (-1 = none)
+- distances: float16[count, top_n], cosine distances (1 - cosine similarity)
+The API loads them as read-only memory maps.
+"""
+
+import json
+import os
+import time
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+from catalog_snapshot import resolve_directory, write_directory
+
+class NeighborTable:
+    """
+    Top-N nearest neighbors of every catalog item.
+
+    Use NeighborTable.build() to compute one from embeddings, or NeighborTable.load().
+
+    Args:
+        ids: Catalog id of each row
+        neighbors: Neighbor rows of each row, shape (count, top_n), closest first
+        distances: Cosine distance of each neighbor, same shape
+        metadata: Extra JSON-serializable fields (e.g. catalog_version)
+    """
+
+    _ARRAYS = ('ids', 'neighbors', 'distances')
+
+    def __init__(self, ids: np.ndarray, neighbors: np.ndarray, distances: np.ndarray,
+                 metadata: Optional[Dict] = None):
+        if neighbors.shape != distances.shape or len(neighbors) != len(ids):
+            raise ValueError("ids, neighbors and distances must describe the same rows")
+        self.ids = ids
+        self.neighbors = neighbors
+        self.distances = distances
+        self.metadata = metadata or {}
+        self._rows_by_id = {movie_id: row for row, movie_id in enumerate(np.asarray(ids).tolist())}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, movie_id) -> bool:
+        return int(movie_id) in self._rows_by_id
+
+    @property
+    def top_n(self) -> int:
+        return self.neighbors.shape[1] if self.neighbors.ndim == 2 else 0
+
+    @classmethod
+    def build(cls, ids: Sequence[int], embeddings: np.ndarray, top_n: int = 20, block_size: int = 1024,
+              normalized: bool = False, metadata: Optional[Dict] = None) -> "NeighborTable":
+        """
+        Compute the neighbor table.
+
+        Args:
+            ids: Catalog id of each embedding row
+            embeddings: Array of shape (count, dim)
+            top_n: Neighbors kept per item (the item itself is excluded)
+            block_size: Rows scored per matrix product (bounds peak memory)
+            normalized: Rows of embeddings are already L2-normalized
+            metadata: Extra fields stored with the table
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if len(vectors) != len(ids):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} embeddings")
+        if not normalized:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        count = len(ids)
+        k = min(top_n, max(count - 1, 0))
+        neighbors = np.full((count, top_n), -1, dtype=np.int32)
+        distances = np.full((count, top_n), np.inf, dtype=np.float16)
+        if k == 0:
+            return cls(ids, neighbors, distances, metadata)
+
+        for start in range(0, count, block_size):
+            end = min(start + block_size, count)
+            similarities = vectors[start:end] @ vectors.T
+            similarities[np.arange(end - start), np.arange(start, end)] = -np.inf  # exclude the item itself
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            top_similarities = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_similarities, axis=1, kind='stable')
+            neighbors[start:end, :k] = np.take_along_axis(top, order, axis=1)
+            distances[start:end, :k] = 1.0 - np.take_along_axis(top_similarities, order, axis=1)
+        return cls(ids, neighbors, distances, metadata)
+
+    def similar(self, movie_id: int, top_k: Optional[int] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Nearest neighbors of a catalog item.
+
+        Returns:
+            (catalog ids, cosine distances), closest first, at most top_k
+            (default: all stored); None if movie_id is not in the table
+        """
+        row = self._rows_by_id.get(int(movie_id))
+        if row is None:
+            return None
+        neighbors = self.neighbors[row, :top_k]
+        found = neighbors >= 0
+        return self.ids[neighbors[found]], self.distances[row, :top_k][found].astype(np.float32)
+
+    # Persistence
+
+    def save(self, path: str):
+        """Save the table to a directory of .npy files (replacing any previous version atomically)."""
+        write_directory(path, self._write)
+
+    def _write(self, directory: str):
+        for name in self._ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'top_n': self.top_n, 'count': len(self), 'created_at': time.time(), **self.metadata}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "NeighborTable":
+        """Load a table saved with save(); arrays are memory-mapped read-only."""
+        path = resolve_directory(path)
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in cls._ARRAYS}
+        return cls(arrays['ids'], arrays['neighbors'], arrays['distances'], meta)
@@ -14,18 +14,27 @@ Requires environment variables:
 - ORACLE_TNS: TNS name (default: movierecdb_tp) or full connection string
 """
 
+import array
 import pandas as pd
 import oracledb
+import hashlib
 import json
 import os
-from typing import List, Tuple
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 import numpy as np
 
+from embedding_store import EmbeddingStore
+from search_filters import genre_mask_from_json, metadata_from_rows
+
 # Thin mode is the default in python-oracledb
 # No need to call init_oracle_client() for Thin mode
 # If you need Thick mode, uncomment: oracledb.init_oracle_client()
 
 # Lazy import of sentence_transformers (only needed for create_embeddings)
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 _model = None
 
 def get_model():
@@ -35,14 +44,25 @@ def get_model():
         try:
             from sentence_transformers import SentenceTransformer
             print("Loading sentence transformer model...")
-            _model = SentenceTransformer('all-MiniLM-L6-v2')
+            _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
             print("Model loaded successfully!")
         except ImportError:
             raise ImportError("sentence-transformers is required for creating embeddings. Install it with: pip install sentence-transformers")
     return _model
 
-def load_config():
-    """Load configuration from config.env file or environment variables."""
+_config = None
+
+def load_config(reload: bool = False):
+    """
+    Load configuration from config.env file or environment variables.
+    
+    The result is cached for the life of the process; pass reload=True to
+    re-read config.env and the environment.
+    """
+    global _config
+    if _config is not None and not reload:
+        return dict(_config)
+    
     config = {}
     
     # Try to load from config.env file first
@@ -65,7 +85,8 @@ def load_config():
     config['ORACLE_TNS'] = os.getenv('ORACLE_TNS', config.get('ORACLE_TNS', 'movierecdb_tp'))
     config['TNS_ADMIN'] = os.getenv('TNS_ADMIN', config.get('TNS_ADMIN', ''))
     
-    return config
+    _config = config
+    return dict(config)
 
 # Model is now loaded lazily via get_model() function
 # This allows process_kaggle.py to be imported without sentence-transformers
@@ -150,16 +171,385 @@ def load_and_merge_data() -> pd.DataFrame:
     
     return merged_df
 
-def create_embeddings(search_blobs: List[str], batch_size: int = 32) -> np.ndarray:
-    """Create embeddings for search blobs using sentence-transformers."""
+def to_vector_bind(embedding: np.ndarray) -> array.array:
+    """
+    Convert an embedding to a float32 array.array for binding to a VECTOR column.
+    
+    python-oracledb sends array.array('f') values in Oracle's native binary
+    vector format (4 bytes per dimension) instead of a '[0.0123, ...]' string
+    that the server would have to parse.
+    """
+    vector = array.array('f')
+    vector.frombytes(np.ascontiguousarray(embedding, dtype=np.float32).tobytes())
+    return vector
+
+def _text_column(df: pd.DataFrame, column: str) -> Tuple[pd.Series, pd.Series]:
+    """Return (str values with '' for missing, present mask) for an optional column."""
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object), pd.Series(False, index=df.index)
+    values = df[column]
+    present = values.notna()
+    return values.astype(str).where(present, ''), present
+
+def parse_json_column(values: pd.Series) -> pd.Series:
+    """
+    Column version of parse_json_field.
+    
+    Each distinct value is parsed once, so repeated values (e.g. '[]' or common
+    genre lists) cost a dictionary lookup instead of a json.loads call.
+    """
+    parsed = {value: parse_json_field(value) for value in values.dropna().unique()}
+    return values.map(parsed).fillna('').astype(object)
+
+def build_search_blobs(df: pd.DataFrame) -> pd.Series:
+    """
+    Build the search_blob column with column-wise string operations.
+    
+    Produces exactly what df.apply(create_search_blob, axis=1) produces:
+    title, overview and parsed keywords, skipping missing parts, joined by spaces.
+    """
+    title, has_title = _text_column(df, 'title')
+    overview, has_overview = _text_column(df, 'overview')
+    if 'keywords' in df.columns:
+        keywords = parse_json_column(df['keywords'])
+    else:
+        keywords = pd.Series('', index=df.index, dtype=object)
+    has_keywords = keywords != ''
+    
+    blobs = (
+        title
+        + np.where(has_title & has_overview, ' ', '')
+        + overview
+        + np.where((has_title | has_overview) & has_keywords, ' ', '')
+        + keywords
+    )
+    return blobs.astype(object)
+
+# Cast members per movie added to the lexical (BM25) search text
+LEXICAL_CAST_LIMIT = int(os.getenv('LEXICAL_CAST_LIMIT', '10'))
+
+def _credit_names(value, limit: Optional[int] = None, job: Optional[str] = None) -> str:
+    """Names from a TMDB cast/crew JSON list, optionally the first `limit` or one job only."""
+    if pd.isna(value) or value == '':
+        return ''
+    try:
+        people = json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return ''
+    names = [person.get('name', '') for person in people
+             if isinstance(person, dict) and (job is None or person.get('job') == job)]
+    return ' '.join(names[:limit])
+
+def _people_text(cast_value, crew_value) -> str:
+    """Top-billed cast and directors of one credits row, for the BM25 search text."""
+    return ' '.join(part for part in (_credit_names(cast_value, limit=LEXICAL_CAST_LIMIT),
+                                      _credit_names(crew_value, job='Director')) if part)
+
+def build_lexical_texts(df: pd.DataFrame) -> List[str]:
+    """
+    Search text for the BM25 index: the search_blob plus the top-billed cast and
+    the directors from the credits CSV, so prompts naming people match.
+    """
+    blobs = df['search_blob'] if 'search_blob' in df.columns else build_search_blobs(df)
+    cast = df['cast'] if 'cast' in df.columns else pd.Series('', index=df.index)
+    crew = df['crew'] if 'crew' in df.columns else pd.Series('', index=df.index)
+    return [
+        ' '.join(part for part in (str(blob) if pd.notna(blob) else '', _people_text(cast_value, crew_value)) if part)
+        for blob, cast_value, crew_value in zip(blobs, cast, crew)
+    ]
+
+def load_credit_people(path: str = 'db/tmdb_5000_credits.csv', chunk_size: int = 1000) -> Dict[int, str]:
+    """
+    Cast and director text of every movie in the credits CSV, by movie id.
+    
+    The CSV is read in chunks and only the extracted names are kept (a few
+    hundred bytes per movie), so the full cast/crew JSON is never in memory at once.
+    """
+    people = {}
+    for chunk in pd.read_csv(path, usecols=['movie_id', 'cast', 'crew'], chunksize=chunk_size):
+        for movie_id, cast_value, crew_value in zip(chunk['movie_id'], chunk['cast'], chunk['crew']):
+            text = _people_text(cast_value, crew_value)
+            if text:
+                people[int(movie_id)] = text
+    return people
+
+def write_lexical_index(path: str, ids: List[int], texts: List[str], content_types: Optional[List[str]] = None,
+                        metadata: Optional[List[Tuple]] = None) -> int:
+    """
+    Build the BM25 index used for hybrid retrieval (see lexical_index.py) and save it to path.
+    
+    metadata holds the (genre_mask, release_year, runtime, vote_average) tuple of
+    each document, so filtered hybrid searches filter keyword matches before ranking.
+    """
+    from lexical_index import BM25Index
+    
+    filter_columns = metadata_from_rows(metadata) if metadata is not None else None
+    index = BM25Index.build(ids, texts, content_types, filter_columns=filter_columns)
+    index.save(path)
+    print(f"Lexical index written to {path}: {len(index)} documents, {len(index.vocabulary)} terms, "
+          f"{len(index.doc_ids)} postings")
+    return len(index)
+
+def write_lexical_index_from_database(connection, path: str, people: Optional[Dict[int, str]] = None) -> int:
+    """
+    Build the BM25 index from the search_blob column of movie_search.
+    
+    Args:
+        connection: Database connection
+        path: Directory to save the index to
+        people: Cast and director text by movie id (see load_credit_people),
+            appended to the search text like build_lexical_texts() does
+    """
+    def clob_as_string(cursor, metadata):
+        if metadata.type_code is oracledb.DB_TYPE_CLOB:
+            return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    
+    cursor = connection.cursor()
+    cursor.outputtypehandler = clob_as_string
+    cursor.arraysize = 1000
+    try:
+        cursor.execute("""
+            SELECT id, search_blob, content_type, genre_mask, release_year, runtime, vote_average
+            FROM movie_search ORDER BY id
+        """)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    people = people or {}
+    texts = [' '.join(part for part in (row[1] or '', people.get(int(row[0]), '')) if part) for row in rows]
+    return write_lexical_index(path, [int(row[0]) for row in rows], texts,
+                               [row[2] or 'Movie' for row in rows], [row[3:] for row in rows])
+
+def build_movie_metadata(df: pd.DataFrame) -> List[Tuple]:
+    """
+    Build (genre_mask, release_year, runtime, vote_average) tuples for the
+    metadata filter columns. Missing or zero runtimes and unparseable dates are None.
+    """
+    count = len(df)
+    if 'genres' in df.columns:
+        masks = df['genres'].map({value: genre_mask_from_json(value) for value in df['genres'].dropna().unique()})
+        masks = masks.fillna(0).astype(int).tolist()
+    else:
+        masks = [0] * count
+    if 'release_date' in df.columns:
+        years = pd.to_datetime(df['release_date'], errors='coerce').dt.year
+        years = [int(year) if pd.notna(year) else None for year in years]
+    else:
+        years = [None] * count
+    if 'runtime' in df.columns:
+        runtimes = [int(runtime) if pd.notna(runtime) and runtime > 0 else None
+                    for runtime in pd.to_numeric(df['runtime'], errors='coerce')]
+    else:
+        runtimes = [None] * count
+    if 'vote_average' in df.columns:
+        ratings = [float(rating) if pd.notna(rating) else None
+                   for rating in pd.to_numeric(df['vote_average'], errors='coerce')]
+    else:
+        ratings = [None] * count
+    return list(zip(masks, years, runtimes, ratings))
+
+def build_movies_data(merged_df: pd.DataFrame) -> List[Tuple]:
+    """
+    Build (id, title, search_blob, overview, genre_mask, release_year, runtime,
+    vote_average) tuples from the merged dataframe.
+    """
+    # Explicitly get title - should be fixed after merge
+    title_column = next((c for c in ('title', 'title_x', 'title_y') if c in merged_df.columns), None)
+    if title_column is not None:
+        titles = merged_df[title_column]
+        # Ensure title is not null/NaN/empty
+        titles = titles.where(titles.notna() & (titles != ''), 'Unknown Title').astype(str)
+    else:
+        titles = pd.Series('Unknown Title', index=merged_df.index)
+    
+    def column_or(name, default):
+        return merged_df[name].tolist() if name in merged_df.columns else [default] * len(merged_df)
+    
+    return [movie + metadata for movie, metadata in zip(zip(
+        merged_df['id'].tolist(),
+        titles.tolist(),
+        column_or('search_blob', ''),
+        column_or('overview', ''),
+    ), build_movie_metadata(merged_df))]
+
+# Parallel embedding: EMBEDDING_WORKERS > 1 shards the blobs across a process pool
+EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', '1'))
+_embedding_pool = None
+_embedding_pool_workers = 0
+
+def _init_embedding_worker(threads: int):
+    """Process pool initializer: limit intra-op threads and load the model once."""
+    # Must be set before torch is imported by get_model()
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    model = get_model()
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    return model
+
+def _embed_shard(output_file: str, shape: Tuple[int, int], indices: List[int], texts: List[str],
+                 batch_size: int) -> Tuple[int, int, float]:
+    """Embed one shard in a worker and write the rows into the shared output file."""
+    import time
+    start = time.perf_counter()
+    embeddings = get_model().encode(texts, batch_size=batch_size, show_progress_bar=False)
+    output = np.memmap(output_file, dtype=np.float32, mode='r+', shape=shape)
+    output[indices] = embeddings
+    output.flush()
+    del output
+    return os.getpid(), len(texts), time.perf_counter() - start
+
+def get_embedding_pool(workers: int):
+    """Get the process pool for parallel embedding, creating it on first use."""
+    global _embedding_pool, _embedding_pool_workers
+    if _embedding_pool is None or _embedding_pool_workers != workers:
+        shutdown_embedding_pool()
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"Starting {workers} embedding workers ({threads} threads each)...")
+        # spawn: each worker gets a clean interpreter and its own copy of the model
+        _embedding_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_embedding_worker,
+            initargs=(threads,),
+        )
+        _embedding_pool_workers = workers
+    return _embedding_pool
+
+def shutdown_embedding_pool():
+    """Stop the embedding worker processes."""
+    global _embedding_pool, _embedding_pool_workers
+    if _embedding_pool is not None:
+        _embedding_pool.shutdown()
+        _embedding_pool = None
+        _embedding_pool_workers = 0
+
+def create_embeddings_parallel(search_blobs: List[str], workers: int, batch_size: int = 32,
+                               shard_batches: int = 8) -> np.ndarray:
+    """
+    Create embeddings with a pool of worker processes.
+    
+    Blobs are sorted by length and cut into shards of shard_batches * batch_size
+    texts, so every batch pads to a similar length. Shards are handed out to
+    workers as they become free, and each worker writes its rows, at their
+    original positions, into a shared memory-mapped output file.
+    
+    Args:
+        search_blobs: Texts to embed
+        workers: Number of worker processes
+        batch_size: Encode batch size inside a worker
+        shard_batches: Batches per shard (the unit of work handed to a worker)
+        
+    Returns:
+        float32 array of shape (len(search_blobs), 384) in the original order
+    """
+    import tempfile
+    import time
+    from concurrent.futures import as_completed
+    
+    count = len(search_blobs)
+    shape = (count, 384)
+    print(f"Creating embeddings for {count} items with {workers} worker processes...")
+    
+    order = sorted(range(count), key=lambda i: len(search_blobs[i]), reverse=True)
+    shard_size = batch_size * shard_batches
+    shards = [order[i:i + shard_size] for i in range(0, count, shard_size)]
+    
+    fd, output_file = tempfile.mkstemp(prefix='embeddings_', suffix='.f32')
+    os.close(fd)
+    try:
+        output = np.memmap(output_file, dtype=np.float32, mode='w+', shape=shape)
+        del output
+        
+        pool = get_embedding_pool(workers)
+        start = time.perf_counter()
+        futures = [
+            pool.submit(_embed_shard, output_file, shape, shard, [search_blobs[i] for i in shard], batch_size)
+            for shard in shards
+        ]
+        worker_stats = {}
+        done = 0
+        for future in as_completed(futures):
+            pid, texts, seconds = future.result()
+            stats = worker_stats.setdefault(pid, [0, 0.0])
+            stats[0] += texts
+            stats[1] += seconds
+            done += texts
+            print(f"  {done}/{count} embedded")
+        elapsed = time.perf_counter() - start
+        
+        for worker_num, (pid, (texts, seconds)) in enumerate(sorted(worker_stats.items()), start=1):
+            print(f"  Worker {worker_num} (pid {pid}): {texts} texts in {seconds:.1f}s "
+                  f"({texts / seconds if seconds else 0:.1f} texts/s)")
+        print(f"Embedded {count} texts in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} texts/s overall)")
+        
+        embeddings = np.array(np.memmap(output_file, dtype=np.float32, mode='r', shape=shape))
+    finally:
+        os.remove(output_file)
+    print(f"Created embeddings with shape: {embeddings.shape}")
+    return embeddings
+
+def create_embeddings(search_blobs: List[str], batch_size: int = 32, workers: Optional[int] = None) -> np.ndarray:
+    """
+    Create embeddings for search blobs using sentence-transformers.
+    
+    With more than one worker (workers argument or EMBEDDING_WORKERS) the
+    blobs are embedded by a process pool, see create_embeddings_parallel().
+    """
+    workers = EMBEDDING_WORKERS if workers is None else workers
+    if workers > 1 and len(search_blobs) > batch_size:
+        return create_embeddings_parallel(search_blobs, workers, batch_size=batch_size)
+    
     model = get_model()  # Lazy load model only when needed
     print(f"Creating embeddings for {len(search_blobs)} items...")
     embeddings = model.encode(search_blobs, batch_size=batch_size, show_progress_bar=True)
     print(f"Created embeddings with shape: {embeddings.shape}")
     return embeddings
 
-def get_oracle_connection():
-    """Get Oracle database connection using movierecdb_tp TNS name in Thin mode."""
+# TNS descriptions for Oracle Cloud (provided by user)
+TNS_DESCRIPTIONS = {
+    'movierecdb_tp': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_tp.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
+    'movierecdb_high': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_high.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
+    'movierecdb_medium': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_medium.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
+    'movierecdb_low': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_low.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
+    'movierecdb_tpurgent': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_tpurgent.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))'
+}
+
+@lru_cache(maxsize=None)
+def parse_tns_description(tns_desc: str) -> Tuple[str, int, str, bool]:
+    """
+    Extract host, port, service_name and SSL flag from a TNS description.
+    
+    Cached, since the known TNS descriptions never change at runtime.
+    """
+    # Extract host, port, and service_name from TNS description
+    host_match = re.search(r'host=([^)]+)', tns_desc)
+    port_match = re.search(r'port=(\d+)', tns_desc)
+    service_match = re.search(r'service_name=([^)]+)', tns_desc)
+    
+    if not (host_match and port_match and service_match):
+        raise ValueError(f"Could not parse TNS description: {tns_desc}")
+    
+    # Check if SSL is required (protocol=tcps)
+    use_ssl = 'protocol=tcps' in tns_desc.lower() or 'tcps' in tns_desc.lower()
+    
+    return host_match.group(1), int(port_match.group(1)), service_match.group(1), use_ssl
+
+def get_connection_candidates() -> Tuple[List[Tuple[str, dict]], dict]:
+    """
+    Build the ordered list of connection methods to try for Oracle Cloud.
+    
+    Each candidate is a (method name, keyword arguments) pair that can be passed
+    to either oracledb.connect() or oracledb.create_pool().
+    
+    Returns:
+        Tuple of (candidates, connection details used for error reporting)
+    """
     # Load configuration
     config = load_config()
     username = config.get('ORACLE_USER')
@@ -172,13 +562,7 @@ def get_oracle_connection():
     
     if full_conn_str:
         # Use full connection string if provided
-        try:
-            connection = oracledb.connect(full_conn_str)
-            print("Connected to Oracle database successfully (using full connection string)!")
-            return connection
-        except Exception as e:
-            print(f"Error connecting with full connection string: {e}")
-            raise
+        return [("full connection string", {'dsn': full_conn_str})], {}
     
     if not username or not password:
         raise ValueError(
@@ -192,38 +576,14 @@ def get_oracle_connection():
             "  ORACLE_USER, ORACLE_PASSWORD, ORACLE_TNS, TNS_ADMIN"
         )
     
-    # TNS descriptions for Oracle Cloud (provided by user)
-    tns_descriptions = {
-        'movierecdb_tp': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_tp.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
-        'movierecdb_high': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_high.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
-        'movierecdb_medium': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_medium.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
-        'movierecdb_low': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_low.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))',
-        'movierecdb_tpurgent': '(description= (retry_count=20)(retry_delay=3)(address=(protocol=tcps)(port=1522)(host=adb.ap-hyderabad-1.oraclecloud.com))(connect_data=(service_name=g79c5351b32a34f_movierecdb_tpurgent.adb.oraclecloud.com))(security=(ssl_server_dn_match=yes)))'
-    }
-    
     # Get TNS description
-    tns_desc = tns_descriptions.get(tns_name.lower())
+    tns_desc = TNS_DESCRIPTIONS.get(tns_name.lower())
     
     if not tns_desc:
         raise ValueError(f"TNS name '{tns_name}' not found in known TNS descriptions.")
     
     # Extract connection details from TNS description
-    import re
-    
-    # Extract host, port, and service_name from TNS description
-    host_match = re.search(r'host=([^)]+)', tns_desc)
-    port_match = re.search(r'port=(\d+)', tns_desc)
-    service_match = re.search(r'service_name=([^)]+)', tns_desc)
-    
-    if not (host_match and port_match and service_match):
-        raise ValueError(f"Could not parse TNS description for {tns_name}")
-    
-    host = host_match.group(1)
-    port = int(port_match.group(1))
-    service_name = service_match.group(1)
-    
-    # Check if SSL is required (protocol=tcps)
-    use_ssl = 'protocol=tcps' in tns_desc.lower() or 'tcps' in tns_desc.lower()
+    host, port, service_name, use_ssl = parse_tns_description(tns_desc)
     
     print(f"Connecting to Oracle Cloud:")
     print(f"  Host: {host}")
@@ -231,90 +591,145 @@ def get_oracle_connection():
     print(f"  Service: {service_name}")
     print(f"  SSL: {use_ssl}")
     
+    details = {
+        'host': host,
+        'port': port,
+        'service_name': service_name,
+        'username': username,
+        'use_ssl': use_ssl,
+    }
+    
     # Try multiple connection methods for Oracle Cloud
-    connection_methods = []
+    candidates = []
     
     # Use wallet path from config
     if not wallet_path:
         wallet_path = os.getenv('TNS_ADMIN') or os.getenv('ORACLE_WALLET')
+    has_wallet = bool(wallet_path and os.path.exists(wallet_path))
     
-    if wallet_path and os.path.exists(wallet_path):
+    if has_wallet:
         # Method 1: Use TNS name from wallet's tnsnames.ora
-        try:
-            conn_str = f"{username}/{password}@{tns_name}"
-            connection = oracledb.connect(conn_str, config_dir=wallet_path)
-            print(f"[SUCCESS] Connected using wallet TNS name: {tns_name}")
-            return connection
-        except Exception as e1:
-            error_msg = str(e1)[:200]
-            connection_methods.append(f"Wallet TNS: {error_msg}")
-            print(f"Method 1 (Wallet TNS) failed: {error_msg}")
+        candidates.append((f"wallet TNS name: {tns_name}", {
+            'user': username,
+            'password': password,
+            'dsn': tns_name,
+            'config_dir': wallet_path,
+        }))
     
     if use_ssl:
         # Method 1b: Use full TNS description in connection string (if no wallet)
-        try:
-            conn_str = f"{username}/{password}@{tns_desc}"
-            connection = oracledb.connect(conn_str)
-            print(f"[SUCCESS] Connected using TNS description")
-            return connection
-        except Exception as e1:
-            error_msg = str(e1)[:200]
-            connection_methods.append(f"TNS description: {error_msg}")
-            print(f"Method 1b failed: {error_msg}")
+        candidates.append(("TNS description", {
+            'user': username,
+            'password': password,
+            'dsn': tns_desc,
+        }))
     
     # Method 2: Create DSN with SSL configuration
-    try:
-        dsn = oracledb.makedsn(host=host, port=port, service_name=service_name)
-        
-        # Use wallet path from config
-        if wallet_path and os.path.exists(wallet_path):
-            # Use wallet for SSL with DSN
-            connection = oracledb.connect(
-                user=username,
-                password=password,
-                dsn=dsn,
-                config_dir=wallet_path
-            )
-            print(f"[SUCCESS] Connected using wallet DSN")
-            return connection
-        else:
-            # Try without wallet (Thin mode should handle SSL)
-            connection = oracledb.connect(
-                user=username,
-                password=password,
-                dsn=dsn,
-                ssl_context=None  # Let Thin mode handle SSL
-            )
-            print(f"[SUCCESS] Connected using DSN (SSL auto-configured)")
-            return connection
-    except Exception as e2:
-        error_msg = str(e2)[:200]
-        connection_methods.append(f"DSN connection: {error_msg}")
-        print(f"Method 2 failed: {error_msg}")
+    dsn = oracledb.makedsn(host=host, port=port, service_name=service_name)
+    if has_wallet:
+        # Use wallet for SSL with DSN
+        candidates.append(("wallet DSN", {
+            'user': username,
+            'password': password,
+            'dsn': dsn,
+            'config_dir': wallet_path,
+        }))
+    else:
+        # Try without wallet (Thin mode should handle SSL)
+        candidates.append(("DSN (SSL auto-configured)", {
+            'user': username,
+            'password': password,
+            'dsn': dsn,
+            'ssl_context': None,  # Let Thin mode handle SSL
+        }))
     
     # Method 3: Try with explicit SSL parameters (for testing without wallet)
     if use_ssl:
+        import ssl
+        # Create SSL context that doesn't verify certificates (for testing)
+        # In production, use proper wallet certificates
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        
+        candidates.append(("SSL context (certificate verification disabled)", {
+            'user': username,
+            'password': password,
+            'dsn': dsn,
+            'ssl_context': ssl_context,
+        }))
+    
+    return candidates, details
+
+# Winning connection method, resolved once per process: (method name, connect kwargs)
+_connection_strategy = None
+_strategy_lock = threading.Lock()
+
+def invalidate_connection_strategy():
+    """Forget the cached connection method so the next connection probes again."""
+    global _connection_strategy
+    with _strategy_lock:
+        _connection_strategy = None
+
+def get_connection_strategy_name() -> Optional[str]:
+    """Name of the cached connection method, or None if not resolved yet."""
+    strategy = _connection_strategy
+    return strategy[0] if strategy else None
+
+def _connect_with_strategy(connect):
+    """
+    Connect using the cached connection method, probing all methods only when
+    no method has been resolved yet or the cached one stops working.
+    
+    Args:
+        connect: Callable taking connection keyword arguments, e.g. oracledb.connect
+    """
+    global _connection_strategy
+    strategy = _connection_strategy
+    if strategy is not None:
+        method_name, params = strategy
         try:
-            import ssl
-            # Create SSL context that doesn't verify certificates (for testing)
-            # In production, use proper wallet certificates
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            dsn = oracledb.makedsn(host=host, port=port, service_name=service_name)
-            connection = oracledb.connect(
-                user=username,
-                password=password,
-                dsn=dsn,
-                ssl_context=ssl_context
-            )
-            print(f"[SUCCESS] Connected using SSL context (certificate verification disabled)")
-            return connection
-        except Exception as e3:
-            error_msg = str(e3)[:200]
-            connection_methods.append(f"SSL context: {error_msg}")
-            print(f"Method 3 failed: {error_msg}")
+            return connect(**params)
+        except Exception as e:
+            print(f"Cached connection method ({method_name}) failed, probing again: {str(e)[:200]}")
+            with _strategy_lock:
+                if _connection_strategy is strategy:
+                    _connection_strategy = None
+    
+    with _strategy_lock:
+        # Another thread may have resolved the strategy while we waited
+        if _connection_strategy is not None and _connection_strategy is not strategy:
+            return connect(**_connection_strategy[1])
+        result, method_name, params = _connect_with_candidates(connect)
+        _connection_strategy = (method_name, params)
+        return result
+
+def _connect_with_candidates(connect):
+    """
+    Try each connection method in order and return the first successful result.
+    
+    Args:
+        connect: Callable taking connection keyword arguments, e.g. oracledb.connect
+        
+    Returns:
+        Tuple of (result, winning method name, winning connect kwargs)
+    """
+    candidates, details = get_connection_candidates()
+    connection_methods = []
+    
+    for method_num, (method_name, params) in enumerate(candidates, 1):
+        try:
+            result = connect(**params)
+            print(f"[SUCCESS] Connected using {method_name}")
+            return result, method_name, params
+        except Exception as e:
+            if not details:
+                # Full connection string: there is nothing else to fall back to
+                print(f"Error connecting with full connection string: {e}")
+                raise
+            error_msg = str(e)[:200]
+            connection_methods.append(f"{method_name}: {error_msg}")
+            print(f"Method {method_num} ({method_name}) failed: {error_msg}")
     
     # If all methods failed, provide detailed error
     print(f"\n[ERROR] All connection methods failed:")
@@ -322,21 +737,98 @@ def get_oracle_connection():
         print(f"  - {method}")
     
     print(f"\nConnection details:")
-    print(f"  Host: {host}")
-    print(f"  Port: {port}")
-    print(f"  Service: {service_name}")
-    print(f"  Username: {username}")
-    print(f"  SSL Required: {use_ssl}")
+    print(f"  Host: {details['host']}")
+    print(f"  Port: {details['port']}")
+    print(f"  Service: {details['service_name']}")
+    print(f"  Username: {details['username']}")
+    print(f"  SSL Required: {details['use_ssl']}")
     
     print(f"\nSolutions:")
     print(f"  1. Download Oracle Cloud wallet and set TNS_ADMIN or ORACLE_WALLET environment variable")
     print(f"  2. Verify your IP is whitelisted in Oracle Cloud Network Security")
     print(f"  3. Check if credentials are correct")
-    print(f"  4. Ensure network connectivity to {host}:{port}")
+    print(f"  4. Ensure network connectivity to {details['host']}:{details['port']}")
     print(f"  5. Try using a different TNS name (high/medium/low)")
     
     raise ConnectionError(f"Could not connect to Oracle Cloud database after trying {len(connection_methods)} methods")
+
+def get_oracle_connection():
+    """Get Oracle database connection using movierecdb_tp TNS name in Thin mode."""
+    return _connect_with_strategy(oracledb.connect)
+
+def create_oracle_pool(min: int = 1, max: int = 4, increment: int = 1, **pool_kwargs):
+    """
+    Create an Oracle connection pool using the first connection method that works.
+    
+    Thin mode pools open connections lazily, so each candidate pool is verified by
+    acquiring and releasing one connection before it is accepted.
+    
+    Args:
+        min: Minimum number of pooled connections
+        max: Maximum number of pooled connections
+        increment: Number of connections opened when the pool grows
+        **pool_kwargs: Extra oracledb.create_pool() arguments (ping_interval, wait_timeout, ...)
+        
+    Returns:
+        oracledb.ConnectionPool
+    """
+    def open_pool(**params):
+        pool = oracledb.create_pool(min=min, max=max, increment=increment, **params, **pool_kwargs)
+        try:
+            connection = pool.acquire()
+            pool.release(connection)
+        except Exception:
+            pool.close(force=True)
+            raise
+        return pool
     
+    return _connect_with_strategy(open_pool)
+
+def get_connection_params() -> dict:
+    """
+    Get the connect keyword arguments of the resolved connection method.
+    
+    Probes the connection methods first if none has been resolved yet.
+    """
+    strategy = _connection_strategy
+    if strategy is None:
+        get_oracle_connection().close()
+        strategy = _connection_strategy
+    return dict(strategy[1])
+
+async def create_oracle_pool_async(min: int = 1, max: int = 4, increment: int = 1, **pool_kwargs):
+    """
+    Create an asyncio Oracle connection pool using the resolved connection method.
+    
+    Args:
+        min: Minimum number of pooled connections
+        max: Maximum number of pooled connections
+        increment: Number of connections opened when the pool grows
+        **pool_kwargs: Extra oracledb.create_pool_async() arguments
+        
+    Returns:
+        oracledb.AsyncConnectionPool
+    """
+    params = get_connection_params()
+    pool = oracledb.create_pool_async(min=min, max=max, increment=increment, **params, **pool_kwargs)
+    try:
+        connection = await pool.acquire()
+        await pool.release(connection)
+    except Exception:
+        await pool.close(force=True)
+        invalidate_connection_strategy()
+        raise
+    return pool
+    
+
+# Columns added after the first release, with their types (added to existing tables)
+ADDED_MOVIE_COLUMNS = {
+    'content_hash': 'VARCHAR2(32)',
+    'genre_mask': 'NUMBER(10)',
+    'release_year': 'NUMBER(4)',
+    'runtime': 'NUMBER(5)',
+    'vote_average': 'NUMBER(3,1)',
+}
 
 def create_movie_search_table(connection):
     """Create movie_search table if it doesn't exist."""
@@ -364,6 +856,11 @@ def create_movie_search_table(connection):
                     description CLOB,
                     url VARCHAR2(1000),
                     content_type VARCHAR2(50) DEFAULT 'Movie',
+                    content_hash VARCHAR2(32),
+                    genre_mask NUMBER(10),
+                    release_year NUMBER(4),
+                    runtime NUMBER(5),
+                    vote_average NUMBER(3,1),
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
@@ -381,12 +878,19 @@ def create_movie_search_table(connection):
                 raise
     else:
         print("Table movie_search already exists.")
+        # Tables created by older versions lack the delta sync hash and metadata filter columns
+        cursor.execute("SELECT column_name FROM user_tab_columns WHERE table_name = 'MOVIE_SEARCH'")
+        existing_columns = {row[0] for row in cursor.fetchall()}
+        for column, column_type in ADDED_MOVIE_COLUMNS.items():
+            if column.upper() not in existing_columns:
+                print(f"Adding {column} column to movie_search...")
+                cursor.execute(f"ALTER TABLE movie_search ADD ({column} {column_type})")
         # Check if table has data
         cursor.execute("SELECT COUNT(*) FROM movie_search")
         count = cursor.fetchone()[0]
         if count > 0:
             print(f"Warning: Table already contains {count} records.")
-            print("Note: This script will attempt to insert movies. Duplicate IDs will cause errors.")
+            print("Note: This script will attempt to insert movies. Duplicate IDs will be reported as rejected rows.")
             # Check for duplicate IDs before inserting
             skip_duplicates = os.getenv('SKIP_DUPLICATES', 'false').lower() == 'true'
             if skip_duplicates:
@@ -394,32 +898,255 @@ def create_movie_search_table(connection):
     
     cursor.close()
 
-def insert_movies(connection, movies_data: List[Tuple], embeddings: np.ndarray):
-    """Insert movies into the movie_search table."""
+def bump_catalog_version(connection) -> int:
+    """
+    Increment the catalog version number.
+    
+    The recommendation API includes this version in its response cache keys,
+    so bumping it after every insert invalidates cached recommendations.
+    
+    Returns:
+        The new catalog version
+    """
     cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) FROM user_tables WHERE table_name = 'CATALOG_VERSION'
+        """)
+        if cursor.fetchone()[0] == 0:
+            print("Creating catalog_version table...")
+            cursor.execute("""
+                CREATE TABLE catalog_version (
+                    id NUMBER PRIMARY KEY,
+                    version NUMBER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+        
+        cursor.execute("""
+            MERGE INTO catalog_version t
+            USING (SELECT 1 AS id FROM dual) s
+            ON (t.id = s.id)
+            WHEN MATCHED THEN UPDATE SET t.version = t.version + 1, t.updated_at = CURRENT_TIMESTAMP
+            WHEN NOT MATCHED THEN INSERT (id, version) VALUES (1, 1)
+        """)
+        cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+        version = int(cursor.fetchone()[0])
+        connection.commit()
+        print(f"Catalog version bumped to {version}")
+        return version
+    finally:
+        cursor.close()
+
+# Approximate vector index on movie_search.embedding. The distance must match the
+# queries in recommend_movies (VECTOR_DISTANCE defaults to COSINE).
+VECTOR_INDEX_NAME = 'movie_search_vec_idx'
+VECTOR_INDEX_TYPES = ('hnsw', 'ivf')
+
+def vector_index_ddl(index_type: str = 'hnsw', target_accuracy: int = 95, neighbors: int = 32,
+                     efconstruction: int = 200, partitions: Optional[int] = None) -> str:
+    """
+    Build the CREATE VECTOR INDEX statement for movie_search.
     
-    print(f"Inserting {len(movies_data)} movies...")
+    Args:
+        index_type: 'hnsw' (in-memory neighbor graph) or 'ivf' (neighbor partitions)
+        target_accuracy: Default target accuracy (1-100) for approximate queries
+        neighbors: HNSW maximum neighbors per node
+        efconstruction: HNSW candidates considered while building
+        partitions: IVF partition count, None lets Oracle choose
+    """
+    index_type = index_type.lower()
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type '{index_type}'. Choose one of: {', '.join(VECTOR_INDEX_TYPES)}")
+    if not 0 < int(target_accuracy) <= 100:
+        raise ValueError(f"target_accuracy must be between 1 and 100, got {target_accuracy}")
     
-    # Check for existing IDs if SKIP_DUPLICATES is set
-    skip_duplicates = os.getenv('SKIP_DUPLICATES', 'false').lower() == 'true'
-    existing_ids = set()
-    if skip_duplicates:
-        cursor.execute("SELECT id FROM movie_search")
-        existing_ids = {row[0] for row in cursor.fetchall()}
-        print(f"Found {len(existing_ids)} existing records. Will skip duplicates.")
+    if index_type == 'hnsw':
+        organization = "INMEMORY NEIGHBOR GRAPH"
+        parameters = f"TYPE HNSW, NEIGHBORS {int(neighbors)}, EFCONSTRUCTION {int(efconstruction)}"
+    else:
+        organization = "NEIGHBOR PARTITIONS"
+        parameters = "TYPE IVF" + (f", NEIGHBOR PARTITIONS {int(partitions)}" if partitions else "")
+    return f"""
+        CREATE VECTOR INDEX {VECTOR_INDEX_NAME} ON movie_search (embedding)
+        ORGANIZATION {organization}
+        DISTANCE COSINE
+        WITH TARGET ACCURACY {int(target_accuracy)}
+        PARAMETERS ({parameters})
+    """
+
+def get_vector_index_info(connection) -> Optional[dict]:
+    """
+    Describe the vector index on movie_search.
     
-    # Prepare data for batch insert using executemany
-    # Oracle 26ai VECTOR type requires string format for TO_VECTOR function
-    insert_sql = """
-        INSERT INTO movie_search (id, title, search_blob, embedding, description, content_type)
-        VALUES (:1, :2, :3, TO_VECTOR(:4), :5, :6)
+    Returns:
+        Dict with name, type, subtype, status and DDL, or None if there is no vector index
+    """
+    cursor = connection.cursor()
+    try:
+        try:
+            cursor.execute("""
+                SELECT index_name, index_type, index_subtype, status
+                FROM user_indexes
+                WHERE table_name = 'MOVIE_SEARCH' AND index_type = 'VECTOR'
+            """)
+            row = cursor.fetchone()
+        except oracledb.DatabaseError as e:
+            # ORA-00904: invalid identifier (no index_subtype column on this release)
+            if 'ORA-00904' not in str(e):
+                raise
+            cursor.execute("""
+                SELECT index_name, index_type, NULL, status
+                FROM user_indexes
+                WHERE table_name = 'MOVIE_SEARCH' AND index_type = 'VECTOR'
+            """)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        
+        info = {'name': row[0], 'type': row[1], 'subtype': row[2], 'status': row[3], 'ddl': None}
+        try:
+            cursor.execute("SELECT DBMS_METADATA.GET_DDL('INDEX', :1) FROM dual", [row[0]])
+            ddl = cursor.fetchone()[0]
+            info['ddl'] = ddl.read().strip() if hasattr(ddl, 'read') else str(ddl).strip()
+        except oracledb.DatabaseError:
+            pass
+        return info
+    finally:
+        cursor.close()
+
+def drop_vector_index(connection) -> bool:
+    """Drop the vector index on movie_search. Returns False if there was none."""
+    info = get_vector_index_info(connection)
+    if info is None:
+        return False
+    cursor = connection.cursor()
+    try:
+        print(f"Dropping vector index {info['name']}...")
+        cursor.execute(f"DROP INDEX {info['name']}")
+        return True
+    finally:
+        cursor.close()
+
+def create_vector_index(connection, index_type: str = 'hnsw', target_accuracy: int = 95, neighbors: int = 32,
+                        efconstruction: int = 200, partitions: Optional[int] = None,
+                        replace: bool = False) -> dict:
     """
+    Create an approximate vector index on movie_search.embedding.
     
-    # Prepare all rows for insertion
+    HNSW indexes live in the vector memory pool (VECTOR_MEMORY_SIZE must be
+    set on non-Autonomous databases). IVF indexes are stored on disk.
+    
+    Args:
+        connection: Database connection
+        index_type, target_accuracy, neighbors, efconstruction, partitions: See vector_index_ddl()
+        replace: Drop an existing vector index first (rebuild)
+        
+    Returns:
+        Index description (see get_vector_index_info)
+    """
+    ddl = vector_index_ddl(index_type, target_accuracy, neighbors, efconstruction, partitions)
+    info = get_vector_index_info(connection)
+    if info is not None:
+        if not replace:
+            print(f"Vector index {info['name']} already exists ({info['subtype'] or info['type']}).")
+            return info
+        drop_vector_index(connection)
+    
+    import time
+    cursor = connection.cursor()
+    try:
+        print(f"Creating {index_type.upper()} vector index {VECTOR_INDEX_NAME} (target accuracy {target_accuracy})...")
+        start = time.perf_counter()
+        cursor.execute(ddl)
+        print(f"Vector index created in {time.perf_counter() - start:.1f}s")
+    finally:
+        cursor.close()
+    return get_vector_index_info(connection)
+
+def rebuild_vector_index(connection, **index_options) -> dict:
+    """Drop and recreate the vector index, e.g. after large catalog changes or to change its parameters."""
+    return create_vector_index(connection, replace=True, **index_options)
+
+def vector_index_options_from_env() -> dict:
+    """Vector index settings from VECTOR_INDEX_* environment variables."""
+    partitions = os.getenv('VECTOR_INDEX_PARTITIONS', '')
+    return {
+        'index_type': os.getenv('VECTOR_INDEX_TYPE', 'hnsw').lower(),
+        'target_accuracy': int(os.getenv('VECTOR_INDEX_ACCURACY', '95')),
+        'neighbors': int(os.getenv('VECTOR_INDEX_NEIGHBORS', '32')),
+        'efconstruction': int(os.getenv('VECTOR_INDEX_EFCONSTRUCTION', '200')),
+        'partitions': int(partitions) if partitions else None,
+    }
+
+# Embeddings are bound as float32 array.array values (native VECTOR binding)
+INSERT_MOVIE_SQL = """
+    INSERT INTO movie_search (id, title, search_blob, embedding, description, content_type,
+                              genre_mask, release_year, runtime, vote_average, content_hash)
+    VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9, :10, :11)
+"""
+
+# Delta sync: insert new movies and update changed ones in one array DML statement
+MERGE_MOVIE_SQL = """
+    MERGE INTO movie_search t
+    USING (
+        SELECT :1 AS id, :2 AS title, :3 AS search_blob, :4 AS embedding,
+               :5 AS description, :6 AS content_type, :7 AS genre_mask, :8 AS release_year,
+               :9 AS runtime, :10 AS vote_average, :11 AS content_hash
+        FROM dual
+    ) s
+    ON (t.id = s.id)
+    WHEN MATCHED THEN UPDATE SET
+        t.title = s.title, t.search_blob = s.search_blob, t.embedding = s.embedding,
+        t.description = s.description, t.content_type = s.content_type,
+        t.genre_mask = s.genre_mask, t.release_year = s.release_year, t.runtime = s.runtime,
+        t.vote_average = s.vote_average, t.content_hash = s.content_hash
+    WHEN NOT MATCHED THEN INSERT (id, title, search_blob, embedding, description, content_type,
+                                  genre_mask, release_year, runtime, vote_average, content_hash)
+        VALUES (s.id, s.title, s.search_blob, s.embedding, s.description, s.content_type,
+                s.genre_mask, s.release_year, s.runtime, s.vote_average, s.content_hash)
+"""
+
+DELETE_MOVIE_SQL = "DELETE FROM movie_search WHERE id = :1"
+
+def movie_content_hash(movie_id: int, title: Optional[str], search_blob: Optional[str],
+                       description: Optional[str], content_type: str, metadata: Tuple = ()) -> str:
+    """
+    Hash the stored content of a movie_search row.
+    
+    The embedding model name is part of the hash, so switching models marks
+    every row as changed. The vector itself is not hashed: it is derived from
+    search_blob and the model.
+    """
+    fields = (str(movie_id), title or '', search_blob or '', description or '', content_type, EMBEDDING_MODEL_NAME,
+              *('' if value is None else str(value) for value in metadata))
+    return hashlib.blake2b('\x1f'.join(fields).encode('utf-8'), digest_size=16).hexdigest()
+
+def get_existing_movie_ids(connection) -> set:
+    """Get the ids already stored in movie_search."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id FROM movie_search")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def prepare_movie_rows(movies_data: List[Tuple], embeddings: np.ndarray, existing_ids: Optional[set] = None) -> List[Tuple]:
+    """
+    Build insert rows for movie_search from movie tuples and their embeddings.
+    
+    Args:
+        movies_data: Movie tuples from build_movies_data
+        embeddings: Embeddings aligned with movies_data
+        existing_ids: Ids to skip (SKIP_DUPLICATES), or None
+        
+    Returns:
+        Rows matching INSERT_MOVIE_SQL (the last column is the content hash)
+    """
     all_rows_to_insert = []
-    for i, (movie_id, title, search_blob, overview) in enumerate(movies_data):
+    for i, (movie_id, title, search_blob, overview, *metadata) in enumerate(movies_data):
         # Skip if duplicate and SKIP_DUPLICATES is enabled
-        if skip_duplicates and int(movie_id) in existing_ids:
+        if existing_ids and int(movie_id) in existing_ids:
             continue
         
         # Get embedding as numpy array
@@ -429,10 +1156,8 @@ def insert_movies(connection, movies_data: List[Tuple], embeddings: np.ndarray):
         if len(embedding_vector) != 384:
             raise ValueError(f"Expected 384 dimensions, got {len(embedding_vector)}")
         
-        # Convert numpy array to list, then to string format for Oracle TO_VECTOR function
-        # Format: '[val1, val2, val3, ...]'
-        embedding_list = embedding_vector.tolist()
-        embedding_str = str(embedding_list)  # Convert list to string format '[val1, val2, ...]'
+        # Bind as a native float32 vector
+        embedding_bind = to_vector_bind(embedding_vector)
         
         # Handle overview - convert float/NaN to string
         overview_str = str(overview) if pd.notna(overview) and overview else None
@@ -449,70 +1174,374 @@ def insert_movies(connection, movies_data: List[Tuple], embeddings: np.ndarray):
         else:
             title_str = 'Unknown Title'
         
+        search_blob_str = str(search_blob)[:4000] if search_blob and pd.notna(search_blob) else None  # CLOB can be larger, but limit for safety
         all_rows_to_insert.append((
             int(movie_id),
             title_str,  # Ensure title is always a valid string
-            str(search_blob)[:4000] if search_blob and pd.notna(search_blob) else None,  # CLOB can be larger, but limit for safety
-            embedding_str,  # String format for TO_VECTOR function
+            search_blob_str,
+            embedding_bind,  # float32 array.array for the VECTOR column
             overview_str,
-            'Movie'
+            'Movie',
+            *metadata,  # genre_mask, release_year, runtime, vote_average
+            movie_content_hash(movie_id, title_str, search_blob_str, overview_str, 'Movie', tuple(metadata))
         ))
+    return all_rows_to_insert
+
+# Insert batch sizing: each batch aims for INSERT_BATCH_TARGET_SECONDS of database time
+# and at most INSERT_BATCH_MAX_BYTES of bind data
+INSERT_BATCH_TARGET_SECONDS = float(os.getenv('INSERT_BATCH_TARGET_SECONDS', '1.0'))
+INSERT_BATCH_MAX_BYTES = int(os.getenv('INSERT_BATCH_MAX_BYTES', str(16 * 1024 * 1024)))
+INSERT_BATCH_MIN_ROWS = 50
+INSERT_BATCH_MAX_ROWS = 10000
+
+def _row_payload_bytes(row: Tuple) -> int:
+    """Approximate bind size of a prepared movie row."""
+    size = 0
+    for value in row:
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, array.array):
+            size += value.itemsize * len(value)
+        else:
+            size += 8
+    return size
+
+def next_batch_size(batch_size: int, rows: int, seconds: float, payload_bytes: int,
+                    target_seconds: float = INSERT_BATCH_TARGET_SECONDS,
+                    max_bytes: int = INSERT_BATCH_MAX_BYTES) -> int:
+    """
+    Pick the next insert batch size from the last batch's timing and payload.
     
-    if len(all_rows_to_insert) == 0:
-        print("No rows to insert (all duplicates skipped).")
-        cursor.close()
-        return
+    Moves halfway toward the size that would take target_seconds at the
+    measured rate, capped so a batch stays below max_bytes of bind data.
+    """
+    if rows <= 0 or seconds <= 0:
+        return batch_size
+    desired = rows / seconds * target_seconds
+    desired = min(desired, max_bytes / max(payload_bytes / rows, 1))
+    size = int((batch_size + desired) / 2)
+    return max(INSERT_BATCH_MIN_ROWS, min(INSERT_BATCH_MAX_ROWS, size))
+
+def insert_row_batches(connection, total: int, build_batch, batch_size: int = 1000,
+                       adaptive: bool = True, overlap: bool = True) -> dict:
+    """
+    Insert movie rows with array DML, committing after each batch.
+    
+    Batches run with batcherrors=True: rows the database rejects are collected
+    and reported while the rest of the batch is inserted.
+    
+    Args:
+        connection: Database connection
+        total: Number of source items
+        build_batch: Callable (start, end) -> prepared rows for source items [start, end)
+        batch_size: Initial batch size (fixed when adaptive is False)
+        adaptive: Resize batches from measured round-trip time and payload size
+        overlap: Build the next batch in a worker thread while the current one executes
+        
+    Returns:
+        {'inserted', 'rejected': [(id, error message)], 'batches', 'seconds', 'rows_per_second'}
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
     
-    # Use executemany for efficient batch insertion
-    batch_size = 1000  # Larger batch size for executemany
+    cursor = connection.cursor()
+    builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-build') if overlap else None
     total_inserted = 0
+    rejected = []
+    batch_num = 0
+    start_time = time.perf_counter()
+    
+    def submit(start: int, end: int):
+        if builder is not None:
+            return builder.submit(build_batch, start, end)
+        return None
     
     try:
-        for i in range(0, len(all_rows_to_insert), batch_size):
-            batch = all_rows_to_insert[i:i+batch_size]
-            batch_num = i // batch_size + 1
-            total_batches = (len(all_rows_to_insert) + batch_size - 1) // batch_size
+        start = 0
+        end = min(total, batch_size)
+        pending = submit(start, end)
+        while start < total:
+            batch = pending.result() if pending is not None else build_batch(start, end)
             
-            print(f"Inserting batch {batch_num}/{total_batches} ({len(batch)} rows)...")
+            # Start building the next batch (at the current size) before executing this one
+            next_start = end
+            next_end = min(total, next_start + batch_size)
+            pending = submit(next_start, next_end) if next_start < total else None
             
-            try:
-                cursor.executemany(insert_sql, batch)
+            batch_num += 1
+            if batch:
+                batch_start = time.perf_counter()
+                cursor.executemany(INSERT_MOVIE_SQL, batch, batcherrors=True)
+                errors = cursor.getbatcherrors()
                 # Commit immediately after each batch to ensure data is saved
                 connection.commit()
+                elapsed = time.perf_counter() - batch_start
                 
-                # Report row count
-                rows_inserted = cursor.rowcount
-                total_inserted += rows_inserted
-                print(f"Batch {batch_num} completed: {rows_inserted} rows inserted (Total: {total_inserted})")
+                for error in errors:
+                    rejected.append((batch[error.offset][0], error.message))
+                inserted = len(batch) - len(errors)
+                total_inserted += inserted
+                print(f"Batch {batch_num}: {inserted}/{len(batch)} rows inserted in {elapsed * 1000:.0f} ms "
+                      f"({len(batch) / elapsed if elapsed else 0:,.0f} rows/s, {len(errors)} rejected, "
+                      f"total {total_inserted})")
                 
-            except Exception as batch_error:
-                print(f"Error inserting batch {batch_num}: {batch_error}")
-                connection.rollback()
-                # Try inserting one by one to identify problematic rows
-                print(f"Attempting individual inserts for batch {batch_num}...")
-                individual_count = 0
-                for row in batch:
-                    try:
-                        cursor.execute(insert_sql, row)
-                        individual_count += 1
-                    except Exception as row_error:
-                        print(f"  Error inserting row (ID: {row[0]}): {row_error}")
-                        continue
-                connection.commit()
-                total_inserted += individual_count
-                print(f"Batch {batch_num} completed with individual inserts: {individual_count} rows inserted (Total: {total_inserted})")
-        
-        print(f"\nAll movies inserted successfully! Total rows inserted: {total_inserted}")
-        
+                if adaptive:
+                    payload = sum(_row_payload_bytes(row) for row in batch)
+                    new_size = next_batch_size(batch_size, len(batch), elapsed, payload)
+                    if new_size != batch_size:
+                        print(f"  Batch size {batch_size} -> {new_size}")
+                        batch_size = new_size
+            
+            start, end = next_start, next_end
     except Exception as e:
         print(f"Error during batch insertion: {e}")
         connection.rollback()
         raise
+    finally:
+        if builder is not None:
+            builder.shutdown(wait=True, cancel_futures=True)
+        cursor.close()
+    
+    seconds = time.perf_counter() - start_time
+    report = {
+        'inserted': total_inserted,
+        'rejected': rejected,
+        'batches': batch_num,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(total_inserted / seconds, 1) if seconds else 0.0,
+    }
+    print(f"Inserted {total_inserted} rows in {seconds:.1f}s ({report['rows_per_second']:,.0f} rows/s), "
+          f"{len(rejected)} rejected")
+    if rejected:
+        print("Rejected rows:")
+        for movie_id, message in rejected[:20]:
+            print(f"  ID {movie_id}: {message}")
+        if len(rejected) > 20:
+            print(f"  ... and {len(rejected) - 20} more")
+    return report
+
+def insert_movie_rows(connection, all_rows_to_insert: List[Tuple], batch_size: int = 1000) -> int:
+    """
+    Insert prepared movie rows (see insert_row_batches).
+    
+    Returns:
+        Number of rows inserted
+    """
+    report = insert_row_batches(
+        connection,
+        len(all_rows_to_insert),
+        lambda start, end: all_rows_to_insert[start:end],
+        batch_size=batch_size,
+        adaptive=os.getenv('INSERT_ADAPTIVE_BATCH', 'true').lower() == 'true',
+        overlap=False,  # rows are already built
+    )
+    return report['inserted']
+
+def get_movie_content_hashes(connection) -> dict:
+    """Get {id: content_hash} for the movies stored in movie_search."""
+    cursor = connection.cursor()
+    cursor.arraysize = 5000
+    try:
+        cursor.execute("SELECT id, content_hash FROM movie_search WHERE content_type = 'Movie'")
+        return {int(movie_id): content_hash for movie_id, content_hash in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def sync_movies(connection, movies_data: List[Tuple], embeddings: np.ndarray, delete_missing: bool = True,
+                batch_size: int = 1000) -> dict:
+    """
+    Delta-sync movie_search with the source data.
+    
+    Source rows are compared with the table by content hash. New and changed
+    movies are written with one array MERGE, movies that are no longer in the
+    source are removed with one array DELETE, and unchanged rows are not
+    touched. Everything is committed in a single transaction.
+    
+    Args:
+        connection: Database connection
+        movies_data: Movie tuples from build_movies_data
+        embeddings: Embeddings aligned with movies_data
+        delete_missing: Delete stored movies that are not in movies_data
+        batch_size: Rows per executemany call
+        
+    Returns:
+        Counts of inserted, updated, deleted and unchanged movies
+    """
+    stored_hashes = get_movie_content_hashes(connection)
+    rows = prepare_movie_rows(movies_data, embeddings)
+    
+    upserts = []
+    inserted = updated = 0
+    for row in rows:
+        if row[0] not in stored_hashes:
+            inserted += 1
+        elif stored_hashes[row[0]] != row[-1]:
+            # Rows written before delta sync have no hash and are rewritten once
+            updated += 1
+        else:
+            continue
+        upserts.append(row)
+    
+    source_ids = {row[0] for row in rows}
+    deletes = [(movie_id,) for movie_id in stored_hashes if movie_id not in source_ids] if delete_missing else []
+    unchanged = len(rows) - len(upserts)
+    print(f"Delta sync: {inserted} new, {updated} changed, {len(deletes)} removed, {unchanged} unchanged")
+    
+    counts = {'inserted': inserted, 'updated': updated, 'deleted': len(deletes), 'unchanged': unchanged}
+    if not upserts and not deletes:
+        print("movie_search is already up to date.")
+        return counts
+    
+    cursor = connection.cursor()
+    try:
+        for i in range(0, len(upserts), batch_size):
+            cursor.executemany(MERGE_MOVIE_SQL, upserts[i:i + batch_size])
+        for i in range(0, len(deletes), batch_size):
+            cursor.executemany(DELETE_MOVIE_SQL, deletes[i:i + batch_size])
+        connection.commit()
+    except Exception as e:
+        print(f"Error during delta sync, rolling back: {e}")
+        connection.rollback()
+        raise
     finally:
         cursor.close()
+    
+    bump_catalog_version(connection)
+    return counts
+
+def write_catalog_snapshot(connection, path: str) -> int:
+    """
+    Write the movie_search catalog to a memory-mapped snapshot file (see catalog_snapshot.py).
+    
+    The API opens it with LOCAL_INDEX_SOURCE=snapshot instead of querying the database.
+    
+    Returns:
+        Number of rows written
+    """
+    from local_index import LocalVectorIndex
+    
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+        row = cursor.fetchone()
+        catalog_version = int(row[0]) if row else 0
+    except oracledb.DatabaseError:
+        catalog_version = 0
+    finally:
+        cursor.close()
+    
+    index = LocalVectorIndex.from_database(connection)
+    count = index.save_snapshot(path, {'catalog_version': catalog_version, 'model_name': EMBEDDING_MODEL_NAME})
+    print(f"Catalog snapshot written to {path}: {count} items, {os.path.getsize(path) / 1e6:.1f} MB, "
+          f"catalog version {catalog_version}")
+    return count
+
+# Neighbors precomputed per catalog item for GET /similar/{id}
+NEIGHBOR_COUNT = int(os.getenv('NEIGHBOR_COUNT', '20'))
+NEIGHBOR_BLOCK_SIZE = int(os.getenv('NEIGHBOR_BLOCK_SIZE', '1024'))  # rows per matrix product
+
+def write_neighbor_table(connection, path: str, snapshot_path: Optional[str] = None) -> int:
+    """
+    Precompute the top NEIGHBOR_COUNT neighbors of every catalog item (see neighbor_table.py).
+    
+    Vectors are read from the catalog snapshot when one was just written,
+    otherwise with one bulk fetch from movie_search.
+    
+    Returns:
+        Number of items in the table
+    """
+    import time
+    from local_index import LocalVectorIndex
+    from neighbor_table import NeighborTable
+    
+    if snapshot_path and os.path.exists(snapshot_path):
+        index = LocalVectorIndex.from_snapshot(snapshot_path)
+    else:
+        index = LocalVectorIndex.from_database(connection)
+    
+    start = time.perf_counter()
+    table = NeighborTable.build(index.ids, index.embeddings, top_n=NEIGHBOR_COUNT, block_size=NEIGHBOR_BLOCK_SIZE,
+                                normalized=True, metadata={'model_name': EMBEDDING_MODEL_NAME})
+    table.save(path)
+    size = sum(getattr(table, name).nbytes for name in NeighborTable._ARRAYS)
+    print(f"Neighbor table written to {path}: {len(table)} items x {table.top_n} neighbors, "
+          f"{size / 1e6:.1f} MB, built in {time.perf_counter() - start:.1f}s")
+    return len(table)
+
+def insert_movies(connection, movies_data: List[Tuple], embeddings: np.ndarray):
+    """Insert movies into the movie_search table (or delta-sync them when DELTA_SYNC is set)."""
+    if os.getenv('DELTA_SYNC', 'false').lower() == 'true':
+        print(f"Delta-syncing {len(movies_data)} movies...")
+        sync_movies(connection, movies_data, embeddings,
+                    delete_missing=os.getenv('DELTA_SYNC_DELETE', 'true').lower() == 'true')
+        return
+    
+    print(f"Inserting {len(movies_data)} movies...")
+    
+    # Check for existing IDs if SKIP_DUPLICATES is set
+    skip_duplicates = os.getenv('SKIP_DUPLICATES', 'false').lower() == 'true'
+    existing_ids = set()
+    if skip_duplicates:
+        existing_ids = get_existing_movie_ids(connection)
+        print(f"Found {len(existing_ids)} existing records. Will skip duplicates.")
+    
+    if existing_ids and all(int(movie[0]) in existing_ids for movie in movies_data):
+        print("No rows to insert (all duplicates skipped).")
+        return
+    
+    # Rows are prepared batch by batch, overlapped with inserting the previous batch
+    report = insert_row_batches(
+        connection,
+        len(movies_data),
+        lambda start, end: prepare_movie_rows(movies_data[start:end], embeddings[start:end], existing_ids),
+        batch_size=int(os.getenv('INSERT_BATCH_SIZE', '1000')),
+        adaptive=os.getenv('INSERT_ADAPTIVE_BATCH', 'true').lower() == 'true',
+        overlap=os.getenv('INSERT_OVERLAP', 'true').lower() == 'true',
+    )
+    total_inserted = report['inserted']
+    
+    print(f"\nMovies inserted! Total rows inserted: {total_inserted}, rejected: {len(report['rejected'])}")
+    if total_inserted > 0:
+        bump_catalog_version(connection)
+
+def get_existing_clip_urls(connection) -> set:
+    """URLs of the YouTube clips already stored in movie_search."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT url FROM movie_search WHERE content_type = 'YouTube Clips'")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def remove_duplicate_clips(connection) -> int:
+    """
+    Delete repeated YouTube clip rows, keeping the lowest id per URL.
+    
+    Earlier versions inserted the clips again on every delta sync.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            DELETE FROM movie_search
+            WHERE content_type = 'YouTube Clips'
+              AND id NOT IN (SELECT MIN(id) FROM movie_search WHERE content_type = 'YouTube Clips' GROUP BY url)
+        """)
+        removed = cursor.rowcount
+        connection.commit()
+    finally:
+        cursor.close()
+    if removed:
+        print(f"Removed {removed} duplicate YouTube clip rows")
+    return removed
 
 def insert_youtube_clips(connection):
-    """Insert 5 manual YouTube Clips entries."""
+    """
+    Insert the 5 manual YouTube Clips entries.
+    
+    Clips are keyed by URL: clips already stored are skipped, so re-running the
+    ingest (e.g. with DELTA_SYNC) neither duplicates them nor bumps the catalog
+    version when nothing changed.
+    """
     cursor = connection.cursor()
     
     youtube_clips = [
@@ -543,9 +1572,19 @@ def insert_youtube_clips(connection):
         }
     ]
     
+    removed = remove_duplicate_clips(connection)
+    existing_urls = get_existing_clip_urls(connection)
+    youtube_clips = [clip for clip in youtube_clips if clip['url'] not in existing_urls]
+    if not youtube_clips:
+        print("YouTube clips already present, nothing to insert.")
+        if removed:
+            bump_catalog_version(connection)
+        cursor.close()
+        return
+    
     print("Creating embeddings for YouTube clips...")
     clip_descriptions = [f"{clip['title']} {clip['description']}" for clip in youtube_clips]
-    clip_embeddings = model.encode(clip_descriptions, show_progress_bar=True)
+    clip_embeddings = get_model().encode(clip_descriptions, show_progress_bar=True)
     
     print("Inserting YouTube clips...")
     
@@ -555,7 +1594,7 @@ def insert_youtube_clips(connection):
     
     insert_sql = """
         INSERT INTO movie_search (id, title, search_blob, embedding, description, url, content_type)
-        VALUES (:1, :2, :3, TO_VECTOR(:4), :5, :6, 'YouTube Clips')
+        VALUES (:1, :2, :3, :4, :5, :6, 'YouTube Clips')
     """
     
     rows_to_insert = []
@@ -567,15 +1606,14 @@ def insert_youtube_clips(connection):
         if len(embedding_vector) != 384:
             raise ValueError(f"Expected 384 dimensions, got {len(embedding_vector)}")
         
-        # Convert numpy array to list, then to string format for Oracle TO_VECTOR function
-        embedding_list = embedding_vector.tolist()
-        embedding_str = str(embedding_list)  # Convert list to string format '[val1, val2, ...]'
+        # Bind as a native float32 vector
+        embedding_bind = to_vector_bind(embedding_vector)
         
         rows_to_insert.append((
             max_id + i + 1,  # Use sequential IDs starting from max+1
             clip['title'],
             search_blob,
-            embedding_str,  # String format for TO_VECTOR function
+            embedding_bind,  # float32 array.array for the VECTOR column
             clip['description'],
             clip['url']
         ))
@@ -591,6 +1629,7 @@ def insert_youtube_clips(connection):
         # Report row count
         rows_inserted = cursor.rowcount
         print(f"YouTube clips inserted successfully! Rows inserted: {rows_inserted}/{len(rows_to_insert)}")
+        bump_catalog_version(connection)
         
     except Exception as e:
         print(f"Error inserting YouTube clips: {e}")
@@ -599,6 +1638,152 @@ def insert_youtube_clips(connection):
     
     cursor.close()
 
+def iter_movie_chunks(chunk_size: int = 1000) -> Iterator[pd.DataFrame]:
+    """
+    Stream the movies CSV in chunks of chunk_size rows.
+    
+    Only movies that have credits are kept, matching the inner merge done by
+    load_and_merge_data(). Only the id column of the credits CSV is read, so
+    memory use does not grow with the size of the credits file.
+    """
+    credit_ids = set(pd.read_csv('db/tmdb_5000_credits.csv', usecols=['movie_id'])['movie_id'])
+    for chunk in pd.read_csv('db/tmdb_5000_movies.csv', chunksize=chunk_size):
+        chunk = chunk[chunk['id'].isin(credit_ids)].copy()
+        chunk['title'] = chunk['title'].fillna('Unknown Title')
+        yield chunk
+
+def load_checkpoint(checkpoint_file: str, chunk_size: int) -> dict:
+    """Load the ingest checkpoint, or return a fresh one if none exists."""
+    if not os.path.exists(checkpoint_file):
+        return {'chunk_size': chunk_size, 'last_committed_chunk': -1, 'rows_inserted': 0, 'clips_inserted': False}
+    with open(checkpoint_file, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('chunk_size') != chunk_size:
+        raise ValueError(
+            f"Checkpoint {checkpoint_file} was written with chunk_size={checkpoint.get('chunk_size')}, "
+            f"but chunk_size={chunk_size} was requested. Use the same chunk size or delete the checkpoint."
+        )
+    print(f"Resuming from checkpoint: chunks 0-{checkpoint['last_committed_chunk']} already committed "
+          f"({checkpoint['rows_inserted']} rows)")
+    return checkpoint
+
+def save_checkpoint(checkpoint_file: str, checkpoint: dict):
+    """Atomically write the ingest checkpoint."""
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_file, checkpoint_file)
+
+def run_streaming_ingest(connection, chunk_size: int = 1000, checkpoint_file: str = 'ingest_checkpoint.json') -> int:
+    """
+    Read, build search blobs, embed and insert movies in bounded chunks.
+    
+    Embedding chunk k+1 overlaps with inserting chunk k (the insert runs in a
+    background thread), so at most two chunks are held in memory at a time.
+    After each chunk is committed its number is recorded in checkpoint_file;
+    a restarted run skips committed chunks without re-embedding them.
+    
+    Args:
+        connection: Oracle connection (used only by the insert thread)
+        chunk_size: Movies CSV rows per chunk
+        checkpoint_file: JSON file recording the last committed chunk
+        
+    Returns:
+        Number of movie rows inserted by this run
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    checkpoint = load_checkpoint(checkpoint_file, chunk_size)
+    
+    skip_duplicates = os.getenv('SKIP_DUPLICATES', 'false').lower() == 'true'
+    existing_ids = get_existing_movie_ids(connection) if skip_duplicates else None
+    
+    def insert_chunk(chunk_num: int, movies_data: List[Tuple], embeddings: np.ndarray) -> int:
+        rows = prepare_movie_rows(movies_data, embeddings, existing_ids)
+        return insert_movie_rows(connection, rows, batch_size=chunk_size) if rows else 0
+    
+    def commit_checkpoint(chunk_num: int, inserted: int):
+        checkpoint['last_committed_chunk'] = chunk_num
+        checkpoint['rows_inserted'] += inserted
+        save_checkpoint(checkpoint_file, checkpoint)
+        print(f"Chunk {chunk_num} committed ({inserted} rows, {checkpoint['rows_inserted']} total)")
+    
+    rows_inserted = 0
+    pending = None  # (chunk_num, future) of the insert currently running
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-insert') as inserter:
+        for chunk_num, chunk in enumerate(iter_movie_chunks(chunk_size)):
+            if chunk_num <= checkpoint['last_committed_chunk']:
+                continue
+            
+            print(f"\nProcessing chunk {chunk_num} ({len(chunk)} movies)...")
+            chunk['search_blob'] = build_search_blobs(chunk)
+            movies_data = build_movies_data(chunk)
+            embeddings = create_embeddings(chunk['search_blob'].fillna('').tolist()) if movies_data else np.empty((0, 384))
+            
+            # Wait for the previous chunk before queueing this one (bounds memory to two chunks)
+            if pending is not None:
+                inserted = pending[1].result()
+                rows_inserted += inserted
+                commit_checkpoint(pending[0], inserted)
+            pending = (chunk_num, inserter.submit(insert_chunk, chunk_num, movies_data, embeddings))
+        
+        if pending is not None:
+            inserted = pending[1].result()
+            rows_inserted += inserted
+            commit_checkpoint(pending[0], inserted)
+    
+    if not checkpoint['clips_inserted']:
+        print("\nInserting YouTube clips...")
+        insert_youtube_clips(connection)
+        checkpoint['clips_inserted'] = True
+        save_checkpoint(checkpoint_file, checkpoint)
+    
+    if rows_inserted > 0:
+        bump_catalog_version(connection)
+    
+    # Ingest finished: the next run starts from the beginning
+    os.remove(checkpoint_file)
+    print(f"\nStreaming ingest completed: {rows_inserted} movie rows inserted by this run")
+    return rows_inserted
+
+def main_streaming():
+    """Streaming ingest entry point (INGEST_MODE=streaming)."""
+    print("=" * 60)
+    print("Kaggle TMDB 5000 Dataset Processing (streaming)")
+    print("=" * 60)
+    
+    chunk_size = int(os.getenv('INGEST_CHUNK_SIZE', '1000'))
+    checkpoint_file = os.getenv('INGEST_CHECKPOINT', 'ingest_checkpoint.json')
+    
+    try:
+        print("\nConnecting to Oracle database...")
+        connection = get_oracle_connection()
+        try:
+            create_movie_search_table(connection)
+            run_streaming_ingest(connection, chunk_size=chunk_size, checkpoint_file=checkpoint_file)
+            snapshot_path = os.getenv('CATALOG_SNAPSHOT', 'catalog.snapshot')
+            if snapshot_path:
+                write_catalog_snapshot(connection, snapshot_path)
+            lexical_path = os.getenv('LEXICAL_INDEX', 'lexical_index')
+            if lexical_path:
+                write_lexical_index_from_database(connection, lexical_path, load_credit_people(chunk_size=chunk_size))
+            neighbor_path = os.getenv('NEIGHBOR_TABLE', 'neighbor_table')
+            if neighbor_path:
+                write_neighbor_table(connection, neighbor_path, snapshot_path)
+        finally:
+            connection.close()
+            shutdown_embedding_pool()
+        print("\n" + "=" * 60)
+        print("Processing completed successfully!")
+        print("=" * 60)
+        
+    except Exception as e:
+        print(f"\nError during processing: {e}")
+        print(f"Progress is saved in {checkpoint_file}; run again to resume.")
+        import traceback
+        traceback.print_exc()
+        raise
+
 def main():
     """Main processing function."""
     print("=" * 60)
@@ -611,7 +1796,7 @@ def main():
         
         # Step 2: Create search_blob column
         print("\nCreating search_blob column...")
-        merged_df['search_blob'] = merged_df.apply(create_search_blob, axis=1)
+        merged_df['search_blob'] = build_search_blobs(merged_df)
         print(f"Created search_blob for {len(merged_df)} movies")
         
         # Debug: Print first 5 rows to verify titles are present
@@ -621,31 +1806,26 @@ def main():
         print(merged_df[['id', 'title']].head())
         print("=" * 60)
         
-        # Step 3: Create embeddings (or load from disk if available)
-        embeddings_file = 'embeddings.npy'
-        if os.path.exists(embeddings_file):
-            print(f"\nLoading embeddings from {embeddings_file}...")
-            embeddings = np.load(embeddings_file)
-            print(f"Loaded embeddings with shape: {embeddings.shape}")
-        else:
-            print("\nCreating embeddings...")
-            search_blobs = merged_df['search_blob'].fillna('').tolist()
-            embeddings = create_embeddings(search_blobs)
-            
-            # Save embeddings to disk for reuse
-            print(f"\nSaving embeddings to {embeddings_file} for reuse...")
-            np.save(embeddings_file, embeddings)
-            print(f"Embeddings saved successfully!")
+        # Step 3: Create embeddings, reusing stored vectors for unchanged search blobs
+        store_path = os.getenv('EMBEDDING_STORE', 'embedding_store')
+        print(f"\nSyncing embedding store {store_path}...")
+        store = EmbeddingStore(store_path, model_name=EMBEDDING_MODEL_NAME)
+        embeddings = store.sync(
+            merged_df['id'].tolist(),
+            merged_df['search_blob'].fillna('').tolist(),
+            create_embeddings,
+        )
+        shutdown_embedding_pool()
+        print(f"Embeddings ready with shape: {embeddings.shape}")
         
         # Step 4: Connect to Oracle
         print("\nConnecting to Oracle database...")
         try:
             connection = get_oracle_connection()
         except Exception as conn_error:
-            print(f"\n[WARNING] Connection failed, but embeddings are saved to {embeddings_file}")
-            print(f"You can load them later with: embeddings = np.load('{embeddings_file}')")
+            print(f"\n[WARNING] Connection failed, but embeddings are saved in {store.vectors_file}")
             print(f"\nTo retry connection, fix the connection issues and run the script again.")
-            print(f"The embeddings will be reused automatically if the file exists.")
+            print(f"Only new or changed movies will be re-embedded.")
             raise
         
         # Step 5: Create table if needed
@@ -653,24 +1833,11 @@ def main():
         
         # Step 6: Prepare data for insertion
         print("\nPreparing data for insertion...")
-        movies_data = []
-        for _, row in merged_df.iterrows():
-            # Explicitly get title - should be fixed after merge
-            title = row.get('title', '') if 'title' in row else row.get('title_x', row.get('title_y', 'Unknown Title'))
-            # Ensure title is not null/NaN
-            if pd.isna(title) or title == '':
-                title = 'Unknown Title'
-            
-            movies_data.append((
-                row['id'],
-                str(title),  # Explicitly convert to string
-                row.get('search_blob', ''),
-                row.get('overview', '')
-            ))
+        movies_data = build_movies_data(merged_df)
         
         # Debug: Print first few titles from movies_data
         print(f"\nDEBUG: Sample titles from movies_data (first 5):")
-        for i, (movie_id, title, _, _) in enumerate(movies_data[:5]):
+        for i, (movie_id, title, *_) in enumerate(movies_data[:5]):
             print(f"  ID: {movie_id}, Title: '{title}'")
         
         # Step 7: Insert movies
@@ -681,6 +1848,30 @@ def main():
         print("\nInserting YouTube clips...")
         insert_youtube_clips(connection)
         
+        # Step 9: Create the approximate vector index if requested
+        if os.getenv('VECTOR_INDEX', 'false').lower() == 'true':
+            print("\nCreating vector index...")
+            create_vector_index(connection, **vector_index_options_from_env())
+        
+        # Step 10: Write the catalog snapshot for the in-process search backends
+        snapshot_path = os.getenv('CATALOG_SNAPSHOT', 'catalog.snapshot')
+        if snapshot_path:
+            print("\nWriting catalog snapshot...")
+            write_catalog_snapshot(connection, snapshot_path)
+        
+        # Step 11: Build the keyword index for hybrid retrieval
+        lexical_path = os.getenv('LEXICAL_INDEX', 'lexical_index')
+        if lexical_path:
+            print("\nBuilding lexical index...")
+            write_lexical_index(lexical_path, merged_df['id'].astype(int).tolist(), build_lexical_texts(merged_df),
+                                metadata=build_movie_metadata(merged_df))
+        
+        # Step 12: Precompute item-to-item neighbors for "more like this"
+        neighbor_path = os.getenv('NEIGHBOR_TABLE', 'neighbor_table')
+        if neighbor_path:
+            print("\nBuilding neighbor table...")
+            write_neighbor_table(connection, neighbor_path, snapshot_path)
+        
         # Close connection
         connection.close()
         print("\n" + "=" * 60)
@@ -693,6 +1884,42 @@ def main():
         traceback.print_exc()
         raise
 
+def main_vector_index(action: str):
+    """Manage the vector index: python process_kaggle.py vector-index {create,rebuild,inspect,drop}"""
+    actions = ('create', 'rebuild', 'inspect', 'drop')
+    if action not in actions:
+        raise SystemExit(f"Usage: python process_kaggle.py vector-index {{{','.join(actions)}}}")
+    
+    connection = get_oracle_connection()
+    try:
+        if action == 'create':
+            info = create_vector_index(connection, **vector_index_options_from_env())
+        elif action == 'rebuild':
+            info = rebuild_vector_index(connection, **vector_index_options_from_env())
+        elif action == 'drop':
+            if not drop_vector_index(connection):
+                print("movie_search has no vector index.")
+            return
+        else:
+            info = get_vector_index_info(connection)
+        
+        if info is None:
+            print("movie_search has no vector index (queries use exact search).")
+            return
+        print(f"Vector index: {info['name']}")
+        print(f"  Type:   {info['subtype'] or info['type']}")
+        print(f"  Status: {info['status']}")
+        if info['ddl']:
+            print(f"  DDL:\n{info['ddl']}")
+    finally:
+        connection.close()
+
 if __name__ == "__main__":
-    main()
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'vector-index':
+        main_vector_index(sys.argv[2] if len(sys.argv) > 2 else 'inspect')
+    elif os.getenv('INGEST_MODE', 'batch').lower() == 'streaming':
+        main_streaming()
+    else:
+        main()
 
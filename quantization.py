@@ -0,0 +1,288 @@
+"""
+Compressed embeddings for in-process vector search.
+
+Two quantizers for the 384-dim vectors produced by process_kaggle.create_embeddings:
+- ScalarQuantizer: int8 per dimension (4x smaller than float32)
+- ProductQuantizer: M sub-vectors of 384/M dims, each replaced by the id of the
+  nearest of K centroids (with M=48, K=256: 48 bytes per vector, 32x smaller)
+
+QuantizedSearcher scores a query against the codes with asymmetric distances
+(the query stays full precision, only the catalog is compressed), then reranks
+the best candidates with full-precision vectors. The full-precision matrix can
+be a memory map (e.g. the embedding store), so only reranked rows are read.
+
+Scores are cosine distances (1 - dot product of normalized vectors), the same
+metric as local_index and Oracle's VECTOR_DISTANCE.
+"""
+
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+
+EMBEDDING_DIM = 384
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        return vectors / max(float(np.linalg.norm(vectors)), 1e-12)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+def _training_sample(vectors: np.ndarray, max_samples: int, seed: int) -> np.ndarray:
+    if len(vectors) <= max_samples:
+        return _normalize(vectors)
+    rows = np.random.default_rng(seed).choice(len(vectors), max_samples, replace=False)
+    return _normalize(vectors[np.sort(rows)])
+
+class ScalarQuantizer:
+    """
+    int8 scalar quantization with a per-dimension range learned from the data.
+
+    Each value x is stored as round((x - low) / scale) - 128, so a dot product
+    with a float query is codes @ (scale * q) + (low + 128 * scale) @ q.
+    """
+
+    name = "int8"
+
+    def __init__(self):
+        self.low = None
+        self.scale = None
+
+    def fit(self, vectors: np.ndarray, max_samples: int = 100000, seed: int = 0) -> "ScalarQuantizer":
+        sample = _training_sample(vectors, max_samples, seed)
+        self.low = sample.min(axis=0)
+        self.scale = np.maximum(sample.max(axis=0) - self.low, 1e-12) / 255.0
+        return self
+
+    def encode(self, vectors: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), block_size):
+            block = _normalize(vectors[start:start + block_size])
+            codes[start:start + block_size] = np.clip(np.rint((block - self.low) / self.scale), 0, 255) - 128
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) + 128.0) * self.scale + self.low
+
+    def distances(self, query: np.ndarray, codes: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Asymmetric cosine distances between a float query and all codes."""
+        query = _normalize(query)
+        weights = (self.scale * query).astype(np.float32)
+        offset = float((self.low + 128.0 * self.scale) @ query)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), block_size):
+            scores[start:start + block_size] = codes[start:start + block_size].astype(np.float32) @ weights
+        return 1.0 - (scores + offset)
+
+    def code_bytes(self, count: int) -> int:
+        return count * EMBEDDING_DIM
+
+    def codebook_bytes(self) -> int:
+        return 2 * EMBEDDING_DIM * 4
+
+class ProductQuantizer:
+    """
+    Product quantization with M sub-quantizers of K centroids each.
+
+    Args:
+        subvectors: Number of sub-vectors M (must divide 384)
+        centroids: Centroids per sub-quantizer K (at most 256, codes are uint8)
+        iterations: k-means iterations
+    """
+
+    name = "pq"
+
+    def __init__(self, subvectors: int = 48, centroids: int = 256, iterations: int = 20):
+        if EMBEDDING_DIM % subvectors:
+            raise ValueError(f"subvectors must divide {EMBEDDING_DIM}, got {subvectors}")
+        if not 1 < centroids <= 256:
+            raise ValueError(f"centroids must be between 2 and 256, got {centroids}")
+        self.subvectors = subvectors
+        self.centroids = centroids
+        self.iterations = iterations
+        self.sub_dim = EMBEDDING_DIM // subvectors
+        self.codebooks = None  # (M, K, sub_dim)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.reshape(len(vectors), self.subvectors, self.sub_dim)
+
+    @staticmethod
+    def _assign(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = (centers ** 2).sum(axis=1)[None, :] - 2.0 * points @ centers.T
+        return np.argmin(distances, axis=1)
+
+    def fit(self, vectors: np.ndarray, max_samples: int = 50000, seed: int = 0) -> "ProductQuantizer":
+        sample = _training_sample(vectors, max_samples, seed)
+        if len(sample) < self.centroids:
+            raise ValueError(f"Need at least {self.centroids} training vectors, got {len(sample)}")
+        rng = np.random.default_rng(seed)
+        parts = self._split(sample)
+        self.codebooks = np.empty((self.subvectors, self.centroids, self.sub_dim), dtype=np.float32)
+        for j in range(self.subvectors):
+            points = np.ascontiguousarray(parts[:, j, :])
+            centers = points[rng.choice(len(points), self.centroids, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = self._assign(points, centers)
+                counts = np.bincount(assignment, minlength=self.centroids)
+                sums = np.zeros_like(centers)
+                np.add.at(sums, assignment, points)
+                filled = counts > 0
+                centers[filled] = sums[filled] / counts[filled, None]
+                # Re-seed empty clusters with random points
+                empty = np.flatnonzero(~filled)
+                if len(empty):
+                    centers[empty] = points[rng.choice(len(points), len(empty), replace=False)]
+            self.codebooks[j] = centers
+        return self
+
+    def encode(self, vectors: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for start in range(0, len(vectors), block_size):
+            parts = self._split(_normalize(vectors[start:start + block_size]))
+            for j in range(self.subvectors):
+                codes[start:start + block_size, j] = self._assign(parts[:, j, :], self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.codebooks[np.arange(self.subvectors), codes]  # (n, M, sub_dim)
+        return parts.reshape(len(codes), EMBEDDING_DIM)
+
+    def distances(self, query: np.ndarray, codes: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Asymmetric cosine distances: per-subspace lookup tables of query-centroid dot products."""
+        query = _normalize(query)
+        tables = np.einsum('mkd,md->mk', self.codebooks, query.reshape(self.subvectors, self.sub_dim))
+        subspaces = np.arange(self.subvectors)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), block_size):
+            scores[start:start + block_size] = tables[subspaces, codes[start:start + block_size]].sum(axis=1)
+        return 1.0 - scores
+
+    def code_bytes(self, count: int) -> int:
+        return count * self.subvectors
+
+    def codebook_bytes(self) -> int:
+        return self.codebooks.nbytes if self.codebooks is not None else 0
+
+QUANTIZERS = {
+    'int8': ScalarQuantizer,
+    'pq': ProductQuantizer,
+}
+
+def create_quantizer(method: str, **params):
+    """Create a quantizer by name ('int8' or 'pq')."""
+    if method not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization '{method}'. Choose one of: {', '.join(QUANTIZERS)}")
+    return QUANTIZERS[method](**params)
+
+class QuantizedSearcher:
+    """
+    Top-k search over quantized codes with full-precision reranking.
+
+    Args:
+        quantizer: Fitted ScalarQuantizer or ProductQuantizer
+        codes: Encoded catalog
+        full_vectors: Full-precision catalog rows (may be a memory map); None disables reranking
+        rerank: Candidates taken from the compressed scores and rescored in full
+            precision, as a multiple of k
+    """
+
+    def __init__(self, quantizer, codes: np.ndarray, full_vectors: Optional[np.ndarray] = None, rerank: int = 10):
+        self.quantizer = quantizer
+        self.codes = codes
+        self.full_vectors = full_vectors
+        self.rerank = rerank
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, method: str = 'int8', rerank: int = 10, keep_full: bool = True,
+              **params) -> "QuantizedSearcher":
+        """Fit a quantizer on vectors, encode them and return a searcher."""
+        quantizer = create_quantizer(method, **params).fit(vectors)
+        return cls(quantizer, quantizer.encode(vectors), vectors if keep_full else None, rerank)
+
+    def search(self, query: np.ndarray, k: int = 10, candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k closest catalog rows.
+
+        Args:
+            query: Query vector
+            k: Number of results
+            candidates: Optional row positions to restrict the search to
+
+        Returns:
+            (row positions, cosine distances), closest first
+        """
+        codes = self.codes if candidates is None else self.codes[candidates]
+        if len(codes) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        distances = self.quantizer.distances(query, codes)
+        shortlist = k * self.rerank if self.full_vectors is not None and self.rerank > 1 else k
+        shortlist = min(shortlist, len(distances))
+        if shortlist < len(distances):
+            top = np.argpartition(distances, shortlist - 1)[:shortlist]
+        else:
+            top = np.arange(len(distances))
+        rows = top if candidates is None else np.asarray(candidates)[top]
+
+        if self.full_vectors is not None and self.rerank > 1:
+            # Rerank the shortlist with exact distances (reads only these rows from a memory map)
+            order = np.argsort(rows)
+            rows, top = rows[order], top[order]
+            distances = 1.0 - _normalize(np.asarray(self.full_vectors[rows])) @ _normalize(query)
+            best = np.argsort(distances, kind='stable')[:k]
+            return rows[best], distances[best].astype(np.float32)
+
+        distances = distances[top]
+        best = np.argsort(distances, kind='stable')[:k]
+        return rows[best], distances[best]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Resident size of the codes and codebooks compared with a float32 matrix."""
+        count = len(self.codes)
+        compressed = self.quantizer.code_bytes(count) + self.quantizer.codebook_bytes()
+        return {'float32': count * EMBEDDING_DIM * 4, 'compressed': compressed,
+                'saved': count * EMBEDDING_DIM * 4 - compressed}
+
+def recall_at_k(vectors: np.ndarray, queries: np.ndarray, searcher: QuantizedSearcher, k: int = 10) -> float:
+    """Mean fraction of the exact float32 top-k that the searcher returns."""
+    vectors = _normalize(vectors)
+    hits = 0
+    for query in _normalize(queries):
+        exact = np.argpartition(1.0 - vectors @ query, k - 1)[:k]
+        found, _ = searcher.search(query, k)
+        hits += len(set(exact.tolist()) & set(found.tolist()))
+    return hits / (len(queries) * k)
+
+def evaluate_quantization(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                          methods: Sequence[Tuple[str, dict]] = (('int8', {}), ('pq', {})),
+                          rerank: int = 10) -> list:
+    """
+    Report memory and recall@k of each quantizer, with and without reranking.
+
+    Returns:
+        One dict per method with method, params, bytes per vector, memory saved,
+        recall@k (compressed only and reranked) and milliseconds per reranked query
+    """
+    import time
+
+    report = []
+    for method, params in methods:
+        searcher = QuantizedSearcher.build(vectors, method, rerank=rerank, **params)
+        memory = searcher.memory_bytes()
+        start = time.perf_counter()
+        for query in queries:
+            searcher.search(query, k)
+        query_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+        reranked = recall_at_k(vectors, queries, searcher, k)
+        searcher.rerank = 1
+        compressed_only = recall_at_k(vectors, queries, searcher, k)
+        report.append({
+            'method': method,
+            'params': params,
+            'bytes_per_vector': searcher.quantizer.code_bytes(1),
+            'memory_bytes': memory['compressed'],
+            'float32_bytes': memory['float32'],
+            'memory_saved_pct': round(100.0 * memory['saved'] / memory['float32'], 1) if memory['float32'] else 0.0,
+            'recall': round(compressed_only, 4),
+            'recall_reranked': round(reranked, 4),
+            'ms_per_query': round(query_ms, 3),
+        })
+    return report
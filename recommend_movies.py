@@ -3,160 +3,1050 @@ Movie Recommendation System using Oracle 26ai Vector Search
 
 This script:
 1. Takes a user prompt/query
-2. Generates an embedding for the prompt using Hugging Face Inference API (all-MiniLM-L6-v2)
+2. Generates an embedding for the prompt (all-MiniLM-L6-v2) with the configured embedder
 3. Performs vector similarity search in Oracle 26ai
 4. Returns top movie recommendations
 
-Uses Hugging Face Inference API instead of local PyTorch model to reduce Docker image size.
+By default the Hugging Face Inference API is used instead of a local PyTorch model to
+reduce Docker image size; set EMBEDDING_BACKEND=onnx to embed in-process on CPU.
 """
 
+import asyncio
 import oracledb
 import os
 import sys
+import threading
+import time
 import numpy as np
-import requests
 from typing import List, Dict, Optional
 
 # Import connection and config functions from process_kaggle
 sys.path.insert(0, os.path.dirname(__file__))
-from process_kaggle import get_oracle_connection, load_config
+from process_kaggle import (
+    get_oracle_connection,
+    create_oracle_pool,
+    create_oracle_pool_async,
+    get_connection_params,
+    get_connection_strategy_name,
+    get_vector_index_info,
+    load_config,
+    to_vector_bind,
+)
+from embedders import EMBEDDING_DIM, get_embedder
+from embedding_cache import create_embedding_cache_from_env
+from local_index import load_local_index, read_catalog_version
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from search_filters import SearchFilters
+from reranking import get_cross_encoder, parse_stages, rerank as rerank_candidates
+from neighbor_table import NeighborTable
 
-# Hugging Face API configuration
-HF_API_URL = "https://api-inference.huggingface.co/pipeline/feature-extraction/sentence-transformers/all-MiniLM-L6-v2"
-HF_API_TOKEN = os.getenv('HUGGINGFACE_API_KEY', '')  # Optional, but recommended for higher rate limits
+# Search backend: 'oracle' (VECTOR_DISTANCE in the database), 'local' (in-process
+# brute-force index) or 'hnsw' (in-process approximate index, see vector_index.py)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'oracle').lower()
+LOCAL_SEARCH_BACKENDS = ('local', 'hnsw')
 
-def generate_embedding_via_api(text: str) -> np.ndarray:
+# HNSW settings (SEARCH_BACKEND=hnsw); the graph is saved to HNSW_INDEX_PATH and reused
+HNSW_INDEX_PATH = os.getenv('HNSW_INDEX_PATH', 'hnsw_index')
+HNSW_M = int(os.getenv('HNSW_M', '16'))
+HNSW_EF_CONSTRUCTION = int(os.getenv('HNSW_EF_CONSTRUCTION', '200'))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '64'))
+
+# Opt-in quantized scans for the local backends: '' (float32), 'int8' or 'pq' (see
+# quantization.py); LOCAL_INDEX_RERANK x top_k candidates are rescored in full precision
+LOCAL_INDEX_QUANTIZATION = os.getenv('LOCAL_INDEX_QUANTIZATION', '').lower()
+LOCAL_INDEX_RERANK = int(os.getenv('LOCAL_INDEX_RERANK', '10'))
+LOCAL_INDEX_PQ_SUBVECTORS = int(os.getenv('LOCAL_INDEX_PQ_SUBVECTORS', '48'))
+
+_local_index = None
+_local_index_lock = threading.Lock()
+
+# Retrieval mode: 'vector' (embedding similarity only) or 'hybrid' (BM25 keyword
+# matches from lexical_index.py fused with the vector ranking by reciprocal rank)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'vector').lower()
+RETRIEVAL_MODES = ('vector', 'hybrid')
+LEXICAL_INDEX_PATH = os.getenv('LEXICAL_INDEX', 'lexical_index')
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '50'))  # results taken from each ranking
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+
+_lexical_index = None
+_lexical_index_missing = False
+_lexical_index_lock = threading.Lock()
+
+# Second-stage reranking (see reranking.py): RERANK lists the default stages
+# ('mmr', 'cross_encoder', both comma-separated, or empty for none). The first
+# stage then fetches RERANK_CANDIDATES results, and the rerank stages must finish
+# within RERANK_BUDGET_MS or the first-stage order is returned.
+RERANK = os.getenv('RERANK', '')
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '50'))
+RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', '150'))
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.7'))  # 1 = relevance only, 0 = diversity only
+
+# Item-to-item neighbors precomputed by process_kaggle (see neighbor_table.py)
+NEIGHBOR_TABLE_PATH = os.getenv('NEIGHBOR_TABLE', 'neighbor_table')
+
+_neighbor_table = None
+_neighbor_table_lock = threading.Lock()
+
+# Number of queries combined into one SQL statement by search_oracle_batch
+ORACLE_BATCH_QUERY_CHUNK = int(os.getenv('ORACLE_BATCH_QUERY_CHUNK', '50'))
+
+# Connection pool configuration (pool is created once at API startup)
+ORACLE_POOL_MIN = int(os.getenv('ORACLE_POOL_MIN', '1'))
+ORACLE_POOL_MAX = int(os.getenv('ORACLE_POOL_MAX', '4'))
+ORACLE_POOL_INCREMENT = int(os.getenv('ORACLE_POOL_INCREMENT', '1'))
+ORACLE_POOL_PING_INTERVAL = int(os.getenv('ORACLE_POOL_PING_INTERVAL', '60'))  # seconds idle before a health ping
+ORACLE_POOL_WAIT_TIMEOUT = int(os.getenv('ORACLE_POOL_WAIT_TIMEOUT', '10000'))  # ms to wait for a free connection
+
+_pool = None
+_pool_lock = threading.Lock()
+# Acquire counters, updated from every request thread (separate from _pool_lock,
+# which is held while the pool is created or closed)
+_pool_stats_lock = threading.Lock()
+_pool_stats = {
+    'acquires': 0,
+    'acquire_errors': 0,
+    'total_wait_ms': 0.0,
+    'max_wait_ms': 0.0,
+}
+
+def init_connection_pool():
+    """
+    Create the process-wide Oracle connection pool.
+    
+    Safe to call more than once; the pool is only created the first time.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+        print(f"Creating Oracle connection pool (min={ORACLE_POOL_MIN}, max={ORACLE_POOL_MAX}, "
+              f"increment={ORACLE_POOL_INCREMENT})...")
+        _pool = create_oracle_pool(
+            min=ORACLE_POOL_MIN,
+            max=ORACLE_POOL_MAX,
+            increment=ORACLE_POOL_INCREMENT,
+            ping_interval=ORACLE_POOL_PING_INTERVAL,
+            getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+            wait_timeout=ORACLE_POOL_WAIT_TIMEOUT,
+        )
+        print("Oracle connection pool ready")
+        return _pool
+
+def close_connection_pool():
+    """Drain and close the process-wide connection pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            return
+        print("Closing Oracle connection pool...")
+        try:
+            _pool.close(force=True)
+        finally:
+            _pool = None
+
+def acquire_connection():
+    """
+    Acquire a database connection.
+    
+    Uses the connection pool when it has been initialized, otherwise falls back
+    to opening a standalone connection (e.g. when run as a script).
     """
-    Generate embedding using Hugging Face Inference API.
+    if _pool is None:
+        return get_oracle_connection()
+    
+    start = time.perf_counter()
+    try:
+        connection = _pool.acquire()
+    except Exception:
+        with _pool_stats_lock:
+            _pool_stats['acquire_errors'] += 1
+        raise
+    wait_ms = (time.perf_counter() - start) * 1000
+    with _pool_stats_lock:
+        _pool_stats['acquires'] += 1
+        _pool_stats['total_wait_ms'] += wait_ms
+        _pool_stats['max_wait_ms'] = max(_pool_stats['max_wait_ms'], wait_ms)
+    return connection
+
+def release_connection(connection):
+    """Return a connection to the pool, or close it if it is a standalone connection."""
+    if _pool is not None:
+        try:
+            _pool.release(connection)
+            return
+        except oracledb.Error:
+            # Connection did not come from the current pool (e.g. pool was recreated)
+            pass
+    connection.close()
+
+def _async_pool_stats() -> Optional[Dict]:
+    """Size of the asyncio connection pool, or None when it is not in use."""
+    if _async_pool is None:
+        return None
+    return {'open': _async_pool.opened, 'busy': _async_pool.busy, 'max': _async_pool.max}
+
+def get_pool_stats(check_db: bool = False) -> Dict:
+    """
+    Get connection pool statistics for health reporting.
+    
+    Args:
+        check_db: If True, also acquire a connection and ping the database
+        
+    Returns:
+        Dictionary with pool size, busy connections and acquire wait times
+    """
+    if _pool is None:
+        return {'enabled': False, 'async_pool': _async_pool_stats()}
+    
+    with _pool_stats_lock:
+        counters = dict(_pool_stats)
+    acquires = counters['acquires']
+    stats = {
+        'enabled': True,
+        'connection_method': get_connection_strategy_name(),
+        'min': _pool.min,
+        'max': _pool.max,
+        'open': _pool.opened,
+        'busy': _pool.busy,
+        'acquires': acquires,
+        'acquire_errors': counters['acquire_errors'],
+        'avg_wait_ms': round(counters['total_wait_ms'] / acquires, 3) if acquires else 0.0,
+        'max_wait_ms': round(counters['max_wait_ms'], 3),
+        'async_pool': _async_pool_stats(),
+    }
+    
+    if check_db:
+        try:
+            connection = acquire_connection()
+            try:
+                connection.ping()
+            finally:
+                release_connection(connection)
+            stats['db_reachable'] = True
+        except Exception as e:
+            stats['db_reachable'] = False
+            stats['db_error'] = str(e)[:200]
+    
+    return stats
+
+# Texts sent to the embedder per call when embedding batches
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+
+# Prompt embedding cache (see embedding_cache.py); None when EMBEDDING_CACHE_SIZE=0.
+# Entries are scoped to the configured embedder, so switching models never reuses old vectors.
+_embedding_cache = create_embedding_cache_from_env(get_embedder().identity)
+
+# Catalog version (bumped by process_kaggle on insert), re-checked at most every N seconds.
+# A failed check is also remembered for that long, so an unreachable database is not retried per request.
+CATALOG_VERSION_CHECK_SECONDS = float(os.getenv('CATALOG_VERSION_CHECK_SECONDS', '30'))
+_catalog_version = None
+_catalog_version_checked_at = None
+_catalog_version_refreshing = False
+_catalog_version_lock = threading.Lock()
+
+def get_catalog_version() -> Optional[int]:
+    """
+    Get the current catalog version, or None while it is unknown.
+    
+    With the local backends this is the version of the loaded index (from the
+    snapshot header, or read when the index was loaded from the database), so
+    no database round trip is needed. With Oracle it is read from the
+    catalog_version table and cached for CATALOG_VERSION_CHECK_SECONDS; 0 if
+    the table does not exist yet. A failed read is logged, the previous value
+    is kept, and the next attempt waits for the same interval. One thread
+    reads at a time without holding the lock, so other requests get the
+    previous value instead of queueing behind the database.
+    """
+    global _catalog_version, _catalog_version_checked_at, _catalog_version_refreshing
+    if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+        version = get_local_index().catalog_version
+        return 0 if version is None else version
+    
+    with _catalog_version_lock:
+        fresh = (_catalog_version_checked_at is not None
+                 and time.monotonic() - _catalog_version_checked_at < CATALOG_VERSION_CHECK_SECONDS)
+        if fresh or _catalog_version_refreshing:
+            return _catalog_version
+        _catalog_version_refreshing = True
+    
+    try:
+        connection = acquire_connection()
+        try:
+            version = read_catalog_version(connection)
+        finally:
+            release_connection(connection)
+    except Exception as e:
+        print(f"WARNING: Could not read the catalog version, retrying in {CATALOG_VERSION_CHECK_SECONDS:.0f}s: {e}")
+        version = _catalog_version
+    with _catalog_version_lock:
+        _catalog_version = version
+        _catalog_version_checked_at = time.monotonic()
+        _catalog_version_refreshing = False
+    return version
+
+def generate_embedding(text: str) -> np.ndarray:
+    """
+    Generate embedding using the configured embedding backend (see embedders.py).
+    Repeated prompts are served from the embedding cache.
     Returns 384-dimensional vector (same as all-MiniLM-L6-v2 model).
     """
-    headers = {
-        "Content-Type": "application/json",
+    if _embedding_cache is not None:
+        cached = _embedding_cache.get(text)
+        if cached is not None:
+            return cached
+    
+    embedding = get_embedder().embed_one(text)
+    
+    if _embedding_cache is not None:
+        _embedding_cache.put(text, embedding)
+    return embedding
+
+def generate_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Generate embeddings for many texts with batched embedder calls.
+    
+    Cached prompts are taken from the embedding cache; the rest are embedded
+    in chunks of EMBEDDING_BATCH_SIZE.
+    
+    Returns:
+        float32 array of shape (len(texts), 384)
+    """
+    embeddings = np.empty((len(texts), 384), dtype=np.float32)
+    missing = {}  # text -> positions still needing an embedding (duplicates embedded once)
+    for i, text in enumerate(texts):
+        cached = _embedding_cache.get(text) if _embedding_cache is not None else None
+        if cached is not None:
+            embeddings[i] = cached
+        else:
+            missing.setdefault(text, []).append(i)
+    
+    embedder = get_embedder()
+    missing_texts = list(missing)
+    for start in range(0, len(missing_texts), EMBEDDING_BATCH_SIZE):
+        chunk = missing_texts[start:start + EMBEDDING_BATCH_SIZE]
+        vectors = embedder.embed(chunk)
+        for text, vector in zip(chunk, vectors):
+            embeddings[missing[text]] = vector
+            if _embedding_cache is not None:
+                _embedding_cache.put(text, vector)
+    
+    return embeddings
+
+def get_embedding_cache_stats() -> Dict:
+    """Embedding cache statistics for health reporting."""
+    if _embedding_cache is None:
+        return {'enabled': False}
+    return _embedding_cache.stats()
+
+def warmup_embedder():
+    """Load the configured embedding model ahead of the first request."""
+    embedder = get_embedder()
+    start = time.perf_counter()
+    embedder.warmup()
+    print(f"Embedding backend '{embedder.name}' ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+# Descriptions are returned truncated to 500 characters. 'substr' truncates them in the
+# database (DBMS_LOB.SUBSTR returns a VARCHAR2, fetched inline with the row); 'inline'
+# fetches the whole CLOB as a string (oracledb.defaults.fetch_lobs = False). Neither
+# needs a LOB read round trip per row.
+DESCRIPTION_FETCH = os.getenv('DESCRIPTION_FETCH', 'substr').lower()
+DESCRIPTION_MAX_CHARS = 500
+
+if DESCRIPTION_FETCH == 'inline':
+    oracledb.defaults.fetch_lobs = False
+
+# Result fields: 'full' (title, description, url, content_type) or 'ids' (id and score only)
+RESULT_FIELDS = ('full', 'ids')
+
+def _select_columns(ids_only: bool = False) -> str:
+    """Columns selected before the similarity score in search queries."""
+    if ids_only:
+        return "id"
+    if DESCRIPTION_FETCH == 'inline':
+        description = "description"
+    else:
+        description = f"DBMS_LOB.SUBSTR(description, {DESCRIPTION_MAX_CHARS}, 1) AS description"
+    return f"id, title, {description}, content_type, url"
+
+def _prepare_search_cursor(cursor, top_k: int):
+    """Fetch all top_k rows with the execute round trip."""
+    cursor.prefetchrows = top_k + 1  # one extra row lets the driver see the end of the result set
+    cursor.arraysize = top_k + 1
+
+def _ids_and_scores(movies: List[Dict]) -> List[Dict]:
+    """Reduce result dictionaries to id and similarity score."""
+    return [{'id': movie['id'], 'similarity_score': movie['similarity_score']} for movie in movies]
+
+def _row_to_result(row, ids_only: bool = False) -> Dict:
+    """Convert a search row to a result dictionary."""
+    if ids_only:
+        movie_id, similarity_score = row
+        return {'id': movie_id, 'similarity_score': float(similarity_score) if similarity_score else 0.0}
+    return _row_to_movie(row)
+
+def _row_to_movie(row) -> Dict:
+    """Convert a (id, title, description, content_type, url, score) row to a movie dictionary."""
+    movie_id, title, description, content_type_val, url, similarity_score = row
+    
+    # Handle CLOB description
+    if hasattr(description, 'read'):
+        description_str = description.read()
+    else:
+        description_str = str(description) if description else ""
+    
+    return {
+        'id': movie_id,
+        'title': str(title) if title else "Unknown",
+        'description': description_str[:DESCRIPTION_MAX_CHARS] if description_str else "",  # Truncate long descriptions
+        'content_type': str(content_type_val) if content_type_val else "Movie",
+        'url': str(url) if url else None,
+        'similarity_score': float(similarity_score) if similarity_score else 0.0
     }
-    if HF_API_TOKEN:
-        headers["Authorization"] = f"Bearer {HF_API_TOKEN}"
+
+# Approximate search: 'auto' adds FETCH APPROX when movie_search has a vector index
+# (see process_kaggle.create_vector_index); 'exact' and 'approx' force one form
+VECTOR_SEARCH_MODE = os.getenv('VECTOR_SEARCH_MODE', 'auto').lower()
+VECTOR_TARGET_ACCURACY = int(os.getenv('VECTOR_TARGET_ACCURACY', '0'))  # 0 uses the index's own target
+VECTOR_INDEX_CHECK_SECONDS = float(os.getenv('VECTOR_INDEX_CHECK_SECONDS', '300'))
+_vector_index_present = None
+_vector_index_checked_at = 0.0
+_vector_index_lock = threading.Lock()
+
+def _vector_index_state_is_fresh() -> bool:
+    return (_vector_index_present is not None
+            and time.monotonic() - _vector_index_checked_at < VECTOR_INDEX_CHECK_SECONDS)
+
+def use_approximate_search() -> bool:
+    """
+    Whether Oracle searches should use approximate (vector index) syntax.
+    
+    In 'auto' mode the presence of the index is cached for VECTOR_INDEX_CHECK_SECONDS.
+    """
+    global _vector_index_present, _vector_index_checked_at
+    if VECTOR_SEARCH_MODE != 'auto':
+        return VECTOR_SEARCH_MODE == 'approx'
+    if _vector_index_state_is_fresh():
+        return _vector_index_present
     
+    with _vector_index_lock:
+        if _vector_index_state_is_fresh():
+            return _vector_index_present
+        connection = acquire_connection()
+        try:
+            info = get_vector_index_info(connection)
+        finally:
+            release_connection(connection)
+        present = info is not None and info['status'] in ('VALID', None)
+        if present != _vector_index_present:
+            print(f"Vector index {'found' if present else 'not found'}: using "
+                  f"{'approximate' if present else 'exact'} search")
+        _vector_index_present = present
+        _vector_index_checked_at = time.monotonic()
+        return present
+
+async def use_approximate_search_async() -> bool:
+    """Async version of use_approximate_search(); only touches the database when the cached state is stale."""
+    if VECTOR_SEARCH_MODE != 'auto' or _vector_index_state_is_fresh():
+        return use_approximate_search()
+    return await asyncio.to_thread(use_approximate_search)
+
+def _fetch_clause(top_k_bind: str, approximate: bool, target_accuracy: Optional[int] = None) -> str:
+    """FETCH FIRST clause, in its approximate form when a vector index should be used."""
+    if not approximate:
+        return f"FETCH FIRST {top_k_bind} ROWS ONLY"
+    accuracy = VECTOR_TARGET_ACCURACY if target_accuracy is None else target_accuracy
+    clause = f"FETCH APPROX FIRST {top_k_bind} ROWS ONLY"
+    if accuracy:
+        clause += f" WITH TARGET ACCURACY {int(accuracy)}"
+    return clause
+
+def _where_clause(binds: Dict, content_type: Optional[str], filters: Optional[SearchFilters] = None) -> str:
+    """WHERE conditions for the content_type and metadata filters; bind values are added to binds."""
+    if content_type:
+        binds['content_type'] = content_type
+        where = "content_type = :content_type"
+    else:
+        where = "content_type IN ('Movie', 'YouTube Clips')"
+    if filters:
+        where += filters.sql(binds)
+    return where
+
+def _build_search_query(embedding: np.ndarray, top_k: int, content_type: Optional[str],
+                        approximate: bool = False, target_accuracy: Optional[int] = None,
+                        ids_only: bool = False, filters: Optional[SearchFilters] = None):
+    """Build the VECTOR_DISTANCE top-k query and its bind values."""
+    binds = {'q': to_vector_bind(embedding), 'top_k': top_k}
+    query = f"""
+        SELECT {_select_columns(ids_only)},
+               VECTOR_DISTANCE(embedding, :q) as similarity_score
+        FROM movie_search
+        WHERE {_where_clause(binds, content_type, filters)}
+        ORDER BY similarity_score ASC
+        {_fetch_clause(':top_k', approximate, target_accuracy)}
+    """
+    return query, binds
+
+def search_oracle(embedding: np.ndarray, top_k: int = 10, content_type: Optional[str] = None,
+                  ids_only: bool = False, filters: Optional[SearchFilters] = None) -> List[Dict]:
+    """
+    Find the movies closest to an embedding with VECTOR_DISTANCE in Oracle 26ai.
+    
+    The whole result (with truncated descriptions) comes back in one round trip.
+    
+    Args:
+        embedding: 384-dimensional prompt embedding
+        top_k: Number of recommendations to return
+        content_type: Filter by content type ('Movie' or 'YouTube Clips'), None for all
+        ids_only: Return only ids and similarity scores
+        filters: Optional metadata filters, applied in the WHERE clause
+        
+    Returns:
+        List of movie dictionaries with similarity scores
+    """
+    query, params = _build_search_query(embedding, top_k, content_type, approximate=use_approximate_search(),
+                                        ids_only=ids_only, filters=filters)
+    connection = None
     try:
-        response = requests.post(
-            HF_API_URL,
-            headers=headers,
-            json={"inputs": text},
-            timeout=30
-        )
+        # Get database connection
+        connection = acquire_connection()
+        cursor = connection.cursor()
+        _prepare_search_cursor(cursor, top_k)
+        cursor.execute(query, params)
         
-        if response.status_code == 503:
-            # Model is loading, wait and retry once
-            import time
-            time.sleep(5)
-            response = requests.post(
-                HF_API_URL,
-                headers=headers,
-                json={"inputs": text},
-                timeout=30
-            )
+        results = cursor.fetchall()
         
-        response.raise_for_status()
-        embedding = np.array(response.json())
+        # Convert results to list of dictionaries
+        movies = [_row_to_result(row, ids_only) for row in results]
         
-        # Ensure it's 1D array of 384 dimensions
-        if embedding.ndim > 1:
-            embedding = embedding.flatten()
+        cursor.close()
+        return movies
         
-        if len(embedding) != 384:
-            raise ValueError(f"Expected 384 dimensions, got {len(embedding)}")
+    except Exception:
+        if connection:
+            connection.rollback()
+        raise
+    finally:
+        if connection:
+            release_connection(connection)
+
+def search_oracle_batch(embeddings: np.ndarray, top_k: int = 10, content_type: Optional[str] = None,
+                        ids_only: bool = False, filters: Optional[SearchFilters] = None) -> List[List[Dict]]:
+    """
+    Run many vector searches in Oracle with few round trips.
+    
+    Up to ORACLE_BATCH_QUERY_CHUNK queries are combined into one statement as a
+    UNION ALL of per-query top-k subqueries, each tagged with its query number.
+    
+    Args:
+        embeddings: Array of shape (n_queries, 384)
+        top_k: Number of recommendations per query
+        content_type: Filter by content type ('Movie' or 'YouTube Clips'), None for all
+        ids_only: Return only ids and similarity scores
+        filters: Optional metadata filters (shared by all queries)
         
-        return embedding
+    Returns:
+        One result list per query, in the same order as embeddings
+    """
+    results = [[] for _ in range(len(embeddings))]
+    if len(embeddings) == 0:
+        return results
+    
+    fetch_clause = _fetch_clause(':top_k', use_approximate_search())
+    columns = _select_columns(ids_only)
+    connection = acquire_connection()
+    try:
+        cursor = connection.cursor()
+        _prepare_search_cursor(cursor, top_k * ORACLE_BATCH_QUERY_CHUNK)
+        for start in range(0, len(embeddings), ORACLE_BATCH_QUERY_CHUNK):
+            chunk = embeddings[start:start + ORACLE_BATCH_QUERY_CHUNK]
+            binds = {'top_k': top_k}
+            where = _where_clause(binds, content_type, filters)
+            
+            # query_num is the position within the chunk, so every full chunk has
+            # the same statement text and reuses one cached cursor/parse
+            subqueries = []
+            for offset, embedding in enumerate(chunk):
+                binds[f'q{offset}'] = to_vector_bind(embedding)
+                subqueries.append(f"""
+                    SELECT {offset} AS query_num, r.* FROM (
+                        SELECT {columns},
+                               VECTOR_DISTANCE(embedding, :q{offset}) as similarity_score
+                        FROM movie_search
+                        WHERE {where}
+                        ORDER BY similarity_score ASC
+                        {fetch_clause}
+                    ) r""")
+            
+            cursor.execute(" UNION ALL ".join(subqueries), binds)
+            for row in cursor.fetchall():
+                results[start + row[0]].append(_row_to_result(row[1:], ids_only))
+        cursor.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        release_connection(connection)
+    
+    # UNION ALL does not preserve per-query ordering
+    for movies in results:
+        movies.sort(key=lambda movie: movie['similarity_score'])
+    return results
+
+def _load_local_index():
+    """Load the in-process vector index from LOCAL_INDEX_SOURCE (see get_local_index)."""
+    source = os.getenv('LOCAL_INDEX_SOURCE', 'database')
+    if source == 'database':
+        connection = acquire_connection()
+        try:
+            index = load_local_index(source, connection)
+        finally:
+            release_connection(connection)
+    else:
+        index = load_local_index(source)
+    if LOCAL_INDEX_QUANTIZATION:
+        params = {'subvectors': LOCAL_INDEX_PQ_SUBVECTORS} if LOCAL_INDEX_QUANTIZATION == 'pq' else {}
+        start = time.perf_counter()
+        index.quantize(LOCAL_INDEX_QUANTIZATION, rerank=LOCAL_INDEX_RERANK, **params)
+        print(f"Quantized local index ({LOCAL_INDEX_QUANTIZATION}) in {time.perf_counter() - start:.1f}s")
+    if SEARCH_BACKEND == 'hnsw':
+        from vector_index import HNSWVectorIndex
+        index = HNSWVectorIndex.from_local_index(
+            index,
+            path=HNSW_INDEX_PATH or None,
+            m=HNSW_M,
+            ef_construction=HNSW_EF_CONSTRUCTION,
+            ef_search=HNSW_EF_SEARCH,
+        )
+    return index
+
+def get_local_index():
+    """
+    Get the in-process vector index, loading it on first use.
+    
+    The source is chosen by LOCAL_INDEX_SOURCE (see local_index.py). With
+    LOCAL_INDEX_QUANTIZATION set, scans use quantized codes; with
+    SEARCH_BACKEND=hnsw the index is wrapped in an HNSW graph (see vector_index.py).
+    """
+    global _local_index
+    if _local_index is not None:
+        return _local_index
+    with _local_index_lock:
+        if _local_index is None:
+            _local_index = _load_local_index()
+        return _local_index
+
+def get_lexical_index() -> Optional[BM25Index]:
+    """
+    Get the BM25 index for hybrid retrieval, loading it on first use.
+    
+    Returns None (hybrid requests then use vector search only) when
+    process_kaggle has not written the index to LEXICAL_INDEX.
+    """
+    global _lexical_index, _lexical_index_missing
+    if _lexical_index is not None or _lexical_index_missing:
+        return _lexical_index
+    with _lexical_index_lock:
+        if _lexical_index is None and not _lexical_index_missing:
+            if not os.path.exists(os.path.join(LEXICAL_INDEX_PATH, 'meta.json')):
+                print(f"WARNING: No lexical index at {LEXICAL_INDEX_PATH}; hybrid retrieval uses vector search only. "
+                      f"Run process_kaggle.py to build it.")
+                _lexical_index_missing = True
+            else:
+                start = time.perf_counter()
+                _lexical_index = BM25Index.load(LEXICAL_INDEX_PATH)
+                print(f"Loaded lexical index with {len(_lexical_index)} documents "
+                      f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return _lexical_index
+
+def get_neighbor_table() -> Optional[NeighborTable]:
+    """
+    Get the precomputed neighbor table, loading it on first use.
+    
+    Returns None when process_kaggle has not written it to NEIGHBOR_TABLE
+    (checked again on the next call, so a table written later is picked up).
+    """
+    global _neighbor_table
+    if _neighbor_table is not None:
+        return _neighbor_table
+    with _neighbor_table_lock:
+        if _neighbor_table is None and os.path.exists(os.path.join(NEIGHBOR_TABLE_PATH, 'meta.json')):
+            _neighbor_table = NeighborTable.load(NEIGHBOR_TABLE_PATH)
+            print(f"Loaded neighbor table with {len(_neighbor_table)} items x {_neighbor_table.top_n} neighbors")
+        return _neighbor_table
+
+def reload_neighbor_table() -> Optional[NeighborTable]:
+    """
+    Load the neighbor table again (e.g. after a new ingest).
+    
+    The new table replaces the loaded one only once it has loaded; if loading
+    fails the exception propagates and the previous table stays in use.
+    """
+    global _neighbor_table
+    if _neighbor_table is None:
+        return get_neighbor_table()
+    table = NeighborTable.load(NEIGHBOR_TABLE_PATH)
+    with _neighbor_table_lock:
+        _neighbor_table = table
+    print(f"Reloaded neighbor table with {len(table)} items x {table.top_n} neighbors")
+    return table
+
+def _resolve_mode(mode: Optional[str]) -> str:
+    mode = (mode or RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'. Choose one of: {', '.join(RETRIEVAL_MODES)}")
+    return mode
+
+def _lexical_candidates(prompt: str, content_type: Optional[str],
+                        filters: Optional[SearchFilters] = None) -> Optional[List[int]]:
+    """Ids of the best BM25 matches for a prompt (within the filters), or None without a lexical index."""
+    index = get_lexical_index()
+    if index is None:
+        return None
+    ids, _ = index.search(prompt, HYBRID_CANDIDATES, content_type, filters=filters)
+    return ids.tolist()
+
+def fuse_rankings(vector_results: List[Dict], lexical_ids: List[int], results_by_id: Dict[int, Dict],
+                  top_k: int) -> List[Dict]:
+    """
+    Combine the vector ranking and the BM25 ranking with reciprocal-rank fusion.
+    
+    Args:
+        vector_results: Vector search results, best first
+        lexical_ids: BM25 result ids, best first
+        results_by_id: Result dictionary of every id that may be returned; BM25
+            ids without one (e.g. missing from the vector index) are dropped
+            before ranking
+        top_k: Number of results to return
         
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Hugging Face API error: {e}")
+    Returns:
+        Up to top_k result dictionaries in fused order; similarity_score stays
+        the cosine distance to the prompt
+    """
+    lexical_ids = [movie_id for movie_id in lexical_ids if movie_id in results_by_id]
+    fused = reciprocal_rank_fusion([[movie['id'] for movie in vector_results], lexical_ids], k=HYBRID_RRF_K)
+    return [results_by_id[movie_id] for movie_id, _ in fused][:top_k]
+
+def search_local_hybrid(index, embedding: np.ndarray, prompt: str, top_k: int = 10,
+                        content_type: Optional[str] = None, filters: Optional[SearchFilters] = None) -> List[Dict]:
+    """Hybrid search against the in-process index."""
+    vector_results = index.search(embedding, max(top_k, HYBRID_CANDIDATES), content_type, filters)
+    lexical_ids = _lexical_candidates(prompt, content_type, filters)
+    if not lexical_ids:
+        return vector_results[:top_k]
+    results_by_id = {movie['id']: movie for movie in vector_results}
+    missing = [movie_id for movie_id in lexical_ids if movie_id not in results_by_id]
+    for movie in index.score_ids(embedding, missing, filters):
+        results_by_id[movie['id']] = movie
+    return fuse_rankings(vector_results, lexical_ids, results_by_id, top_k)
+
+def _build_hybrid_query(embedding: np.ndarray, candidates: int, content_type: Optional[str],
+                        lexical_ids: List[int], approximate: bool = False, ids_only: bool = False,
+                        filters: Optional[SearchFilters] = None):
+    """
+    Build one statement returning the vector top candidates plus the BM25 matches.
+    
+    Rows start with a flag that is 1 for vector results and 0 for the keyword
+    matches, which are scored against the prompt by id. Metadata filters
+    apply to both parts.
+    """
+    columns = _select_columns(ids_only)
+    binds = {'q': to_vector_bind(embedding), 'n': candidates}
+    where = _where_clause(binds, content_type, filters)
+    query = f"""
+        SELECT 1 AS vector_hit, v.* FROM (
+            SELECT {columns},
+                   VECTOR_DISTANCE(embedding, :q) as similarity_score
+            FROM movie_search
+            WHERE {where}
+            ORDER BY similarity_score ASC
+            {_fetch_clause(':n', approximate)}
+        ) v"""
+    if lexical_ids:
+        placeholders = ', '.join(f':l{i}' for i in range(len(lexical_ids)))
+        binds.update({f'l{i}': movie_id for i, movie_id in enumerate(lexical_ids)})
+        query += f"""
+        UNION ALL
+        SELECT 0, {columns}, VECTOR_DISTANCE(embedding, :q)
+        FROM movie_search
+        WHERE id IN ({placeholders}){filters.sql(binds) if filters else ''}"""
+    return query, binds
+
+def _fuse_hybrid_rows(rows, lexical_ids: List[int], top_k: int, ids_only: bool = False) -> List[Dict]:
+    results_by_id = {}
+    vector_results = []
+    for row in rows:
+        result = _row_to_result(row[1:], ids_only)
+        results_by_id.setdefault(result['id'], result)
+        if row[0] == 1:
+            vector_results.append(result)
+    # UNION ALL does not preserve the subquery order
+    vector_results.sort(key=lambda movie: movie['similarity_score'])
+    return fuse_rankings(vector_results, lexical_ids, results_by_id, top_k)
 
-def generate_prompt_embedding(prompt: str) -> str:
+def search_oracle_hybrid(embedding: np.ndarray, prompt: str, top_k: int = 10, content_type: Optional[str] = None,
+                         ids_only: bool = False, filters: Optional[SearchFilters] = None) -> List[Dict]:
     """
-    Generate embedding for user prompt and convert to Oracle VECTOR format.
+    Hybrid search in Oracle: vector candidates and BM25 matches in one round trip.
+    """
+    lexical_ids = _lexical_candidates(prompt, content_type, filters)
+    if not lexical_ids:
+        return search_oracle(embedding, top_k, content_type, ids_only=ids_only, filters=filters)
+    candidates = max(top_k, HYBRID_CANDIDATES)
+    query, binds = _build_hybrid_query(embedding, candidates, content_type, lexical_ids,
+                                       approximate=use_approximate_search(), ids_only=ids_only, filters=filters)
+    connection = acquire_connection()
+    try:
+        cursor = connection.cursor()
+        _prepare_search_cursor(cursor, candidates + len(lexical_ids))
+        cursor.execute(query, binds)
+        rows = cursor.fetchall()
+        cursor.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        release_connection(connection)
+    return _fuse_hybrid_rows(rows, lexical_ids, top_k, ids_only)
+
+def get_item_vectors(ids: List[int]) -> np.ndarray:
+    """
+    Stored embeddings of catalog ids, shape (len(ids), 384); zeros for unknown ids.
+    
+    Read from the local index with the local backends, otherwise with one query.
+    """
+    if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+        return get_local_index().vectors(ids)
+    vectors = np.zeros((len(ids), EMBEDDING_DIM), dtype=np.float32)
+    if not ids:
+        return vectors
+    positions = {int(movie_id): i for i, movie_id in enumerate(ids)}
+    binds = {f'i{i}': int(movie_id) for i, movie_id in enumerate(ids)}
+    connection = acquire_connection()
+    try:
+        cursor = connection.cursor()
+        _prepare_search_cursor(cursor, len(ids))
+        cursor.execute(f"SELECT id, embedding FROM movie_search WHERE id IN ({', '.join(':' + name for name in binds)})",
+                       binds)
+        for movie_id, embedding in cursor.fetchall():
+            vectors[positions[int(movie_id)]] = np.asarray(embedding, dtype=np.float32)
+        cursor.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        release_connection(connection)
+    return vectors
+
+def _movies_by_id(ids: List[int]) -> Dict[int, Dict]:
+    """Result dictionaries (without similarity score) of catalog ids, read with one query."""
+    if not ids:
+        return {}
+    binds = {f'i{i}': int(movie_id) for i, movie_id in enumerate(ids)}
+    connection = acquire_connection()
+    try:
+        cursor = connection.cursor()
+        _prepare_search_cursor(cursor, len(ids))
+        cursor.execute(f"SELECT {_select_columns()}, NULL FROM movie_search "
+                       f"WHERE id IN ({', '.join(':' + name for name in binds)})", binds)
+        movies = {}
+        for row in cursor.fetchall():
+            movie = _row_to_result(row)
+            movies[movie['id']] = movie
+        cursor.close()
+        return movies
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        release_connection(connection)
+
+def similar_movies(movie_id: int, top_k: int = 10, content_type: Optional[str] = None,
+                   ids_only: bool = False) -> Optional[List[Dict]]:
+    """
+    Catalog items most similar to a given item, from the precomputed neighbor table.
+    
+    The neighbors are a direct lookup (no embedding or search). Details come
+    from the local index with the local backends, otherwise from one
+    primary-key query; ids_only needs neither.
     
     Args:
-        prompt: User's mood/query string
+        movie_id: Catalog id
+        top_k: Number of results (at most the table's NEIGHBOR_COUNT)
+        content_type: Keep only neighbors of this content type (filters the stored neighbors)
+        ids_only: Return only ids and similarity scores
         
     Returns:
-        String representation of embedding vector for Oracle TO_VECTOR() function
+        List of movie dictionaries with similarity scores (cosine distance), or
+        None if movie_id is not in the table
+        
+    Raises:
+        RuntimeError: If the neighbor table has not been built
     """
-    embedding = generate_embedding_via_api(prompt)
-    embedding_list = embedding.tolist()
-    return str(embedding_list)
+    table = get_neighbor_table()
+    if table is None:
+        raise RuntimeError(f"No neighbor table at {NEIGHBOR_TABLE_PATH}. Run process_kaggle.py to build it.")
+    found = table.similar(movie_id, None if content_type else top_k)
+    if found is None:
+        return None
+    neighbor_ids, distances = found[0].tolist(), found[1].tolist()
+    if ids_only and not content_type:
+        return [{'id': i, 'similarity_score': d} for i, d in zip(neighbor_ids, distances)]
+    
+    if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+        movies = get_local_index().items(neighbor_ids)
+    else:
+        movies = _movies_by_id(neighbor_ids)
+    results = []
+    for i, distance in zip(neighbor_ids, distances):
+        movie = movies.get(i)
+        if movie is None or (content_type and movie['content_type'] != content_type):
+            continue
+        results.append({**movie, 'similarity_score': distance})
+        if len(results) == top_k:
+            break
+    return _ids_and_scores(results) if ids_only else results
+
+def _resolve_rerank(rerank) -> tuple:
+    """Rerank stages of a request; None uses the RERANK setting."""
+    return parse_stages(RERANK if rerank is None else rerank)
 
-def search_similar_movies(prompt: str, top_k: int = 10, content_type: Optional[str] = None) -> List[Dict]:
+def _first_stage_request(top_k: int, ids_only: bool, stages: tuple):
+    """(top_k, ids_only) for the first stage: over-fetch when reranking; the cross-encoder needs text."""
+    if not stages:
+        return top_k, ids_only
+    return max(top_k, RERANK_CANDIDATES), ids_only and 'cross_encoder' not in stages
+
+def _rerank(prompt: str, embedding: np.ndarray, movies: List[Dict], top_k: int, stages: tuple,
+            timings: Dict) -> List[Dict]:
+    movies, rerank_timings = rerank_candidates(prompt, embedding, movies, top_k, stages, RERANK_BUDGET_MS,
+                                               vectors=get_item_vectors, mmr_lambda=MMR_LAMBDA)
+    timings.update(rerank_timings)
+    return movies
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def init_search_backend():
+    """Prepare the configured search backend ahead of the first request."""
+    if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+        get_local_index()
+    else:
+        use_approximate_search()
+    if RETRIEVAL_MODE == 'hybrid':
+        get_lexical_index()
+    get_neighbor_table()
+    if 'cross_encoder' in _resolve_rerank(None):
+        try:
+            get_cross_encoder().warmup()
+        except Exception:
+            pass  # logged once by the cross-encoder, which then disables the cross_encoder stage
+
+def reload_local_index():
     """
-    Search for similar movies using vector similarity in Oracle 26ai.
+    Load the local index again (e.g. after a new ingest).
+    
+    The new index replaces the loaded one only once it has loaded; if loading
+    fails the exception propagates and the previous index stays in use.
+    """
+    global _local_index
+    index = _load_local_index()
+    with _local_index_lock:
+        _local_index = index
+    return index
+
+def preload_for_workers():
+    """
+    Load shared state once in the parent process of a pre-forked server.
+    
+    Model weights and the local index are inherited by every forked worker
+    (copy-on-write, or the same page cache for memory-mapped files) instead of
+    being loaded N times. Database pools and inference thread pools are not
+    fork-safe and are created per worker by the API lifespan.
+    """
+    start = time.perf_counter()
+    get_embedder().preload()
+    if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+        get_local_index()
+    if RETRIEVAL_MODE == 'hybrid':
+        get_lexical_index()
+    if 'cross_encoder' in _resolve_rerank(None):
+        try:
+            get_cross_encoder().preload()
+        except Exception:
+            pass  # logged once; forked workers inherit the disabled cross-encoder
+    get_neighbor_table()
+    print(f"Preloaded shared resources in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def init_worker(threads: int):
+    """Per-worker setup after fork: limit inference threads to this worker's share of cores."""
+    get_embedder().configure_threads(threads)
+    get_cross_encoder().configure_threads(threads)
+
+def search_similar_movies(prompt: str, top_k: int = 10, content_type: Optional[str] = None,
+                          ids_only: bool = False, mode: Optional[str] = None,
+                          filters: Optional[SearchFilters] = None, rerank=None,
+                          timings: Optional[Dict] = None) -> List[Dict]:
+    """
+    Search for similar movies using vector similarity.
+    
+    Uses Oracle 26ai VECTOR_DISTANCE by default, or the in-process index when
+    SEARCH_BACKEND=local. Both return the same ordering and scores.
+    SEARCH_BACKEND=hnsw uses an approximate in-process HNSW graph.
     
     Args:
         prompt: User's mood/query string
         top_k: Number of recommendations to return
         content_type: Filter by content type ('Movie' or 'YouTube Clips'), None for all
+        ids_only: Return only ids and similarity scores
+        mode: 'vector' or 'hybrid' (vector plus BM25 keyword ranking); defaults to RETRIEVAL_MODE
+        filters: Optional metadata filters (genres, year, runtime, rating), applied
+            inside the top-k search
+        rerank: Rerank stages ('mmr', 'cross_encoder', a comma-separated list or
+            'none'); defaults to RERANK. Reranking over-fetches RERANK_CANDIDATES
+            first-stage results and reorders them (see reranking.py)
+        timings: Optional dictionary filled with per-stage milliseconds
         
     Returns:
         List of movie dictionaries with similarity scores
     """
-    connection = None
+    mode = _resolve_mode(mode)
+    stages = _resolve_rerank(rerank)
+    timings = {} if timings is None else timings
+    top_k_requested, ids_only_requested = top_k, ids_only
+    top_k, ids_only = _first_stage_request(top_k, ids_only, stages)
     try:
         print(f"Starting search for: '{prompt}' (top_k={top_k}, content_type={content_type})")
-        # Get database connection
-        connection = get_oracle_connection()
-        cursor = connection.cursor()
         
-        # Generate embedding for the prompt
+        # Generate embedding for the prompt before taking a connection from the pool,
+        # so the connection is not held while waiting on the embedding API
         print(f"Generating embedding for prompt: '{prompt[:50]}...'")
         try:
-            prompt_embedding_str = generate_prompt_embedding(prompt)
+            stage_start = time.perf_counter()
+            embedding = generate_embedding(prompt)
+            timings['embedding_ms'] = _elapsed_ms(stage_start)
             print("Embedding generated successfully")
         except Exception as e:
             print(f"ERROR generating embedding: {e}")
             raise Exception(f"Failed to generate embedding: {e}")
         
-        # Build SQL query with optional content_type filter
-        if content_type:
-            query = f"""
-                SELECT id, title, description, content_type, url,
-                       VECTOR_DISTANCE(embedding, TO_VECTOR(:1)) as similarity_score
-                FROM movie_search
-                WHERE content_type = :2
-                ORDER BY similarity_score ASC
-                FETCH FIRST :3 ROWS ONLY
-            """
-            cursor.execute(query, (prompt_embedding_str, content_type, top_k))
+        stage_start = time.perf_counter()
+        if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+            index = get_local_index()
+            if mode == 'hybrid':
+                movies = search_local_hybrid(index, embedding, prompt, top_k, content_type, filters)
+            else:
+                movies = index.search(embedding, top_k, content_type, filters)
+        elif mode == 'hybrid':
+            movies = search_oracle_hybrid(embedding, prompt, top_k, content_type, ids_only=ids_only, filters=filters)
         else:
-            query = """
-                SELECT id, title, description, content_type, url,
-                       VECTOR_DISTANCE(embedding, TO_VECTOR(:1)) as similarity_score
-                FROM movie_search
-                WHERE content_type IN ('Movie', 'YouTube Clips')
-                ORDER BY similarity_score ASC
-                FETCH FIRST :2 ROWS ONLY
-            """
-            cursor.execute(query, (prompt_embedding_str, top_k))
-        
-        results = cursor.fetchall()
+            movies = search_oracle(embedding, top_k, content_type, ids_only=ids_only, filters=filters)
+        timings['search_ms'] = _elapsed_ms(stage_start)
         
-        # Convert results to list of dictionaries
-        movies = []
-        for row in results:
-            movie_id, title, description, content_type_val, url, similarity_score = row
-            
-            # Handle CLOB description
-            if hasattr(description, 'read'):
-                description_str = description.read()
-            else:
-                description_str = str(description) if description else ""
-            
-            movies.append({
-                'id': movie_id,
-                'title': str(title) if title else "Unknown",
-                'description': description_str[:500] if description_str else "",  # Truncate long descriptions
-                'content_type': str(content_type_val) if content_type_val else "Movie",
-                'url': str(url) if url else None,
-                'similarity_score': float(similarity_score) if similarity_score else 0.0
-            })
+        if stages:
+            movies = _rerank(prompt, embedding, movies, top_k_requested, stages, timings)
+        if ids_only_requested:
+            movies = _ids_and_scores(movies)
         
-        cursor.close()
         print(f"Found {len(movies)} movies")
         return movies
         
@@ -164,14 +1054,12 @@ def search_similar_movies(prompt: str, top_k: int = 10, content_type: Optional[s
         print(f"ERROR searching movies: {e}")
         import traceback
         traceback.print_exc()
-        if connection:
-            connection.rollback()
         raise
-    finally:
-        if connection:
-            connection.close()
 
-def recommend_movies(prompt: str, top_k: int = 10, content_type: Optional[str] = None) -> List[Dict]:
+def recommend_movies(prompt: str, top_k: int = 10, content_type: Optional[str] = None,
+                     ids_only: bool = False, mode: Optional[str] = None,
+                     filters: Optional[SearchFilters] = None, rerank=None,
+                     timings: Optional[Dict] = None) -> List[Dict]:
     """
     Main function to get movie recommendations based on user prompt.
     
@@ -179,15 +1067,330 @@ def recommend_movies(prompt: str, top_k: int = 10, content_type: Optional[str] =
         prompt: User's mood/query (e.g., "sci-fi movie with space exploration")
         top_k: Number of recommendations (default: 10)
         content_type: Filter by 'Movie' or 'YouTube Clips' (default: None for all)
+        ids_only: Return only ids and similarity scores
+        mode: 'vector' or 'hybrid' retrieval; defaults to RETRIEVAL_MODE
+        filters: Optional metadata filters (see search_filters.SearchFilters)
+        rerank: Rerank stages ('mmr', 'cross_encoder', both or 'none'); defaults to RERANK
+        timings: Optional dictionary filled with per-stage milliseconds
         
     Returns:
         List of recommended movies with metadata
     """
     print(f"Getting recommendations for: '{prompt}'")
-    recommendations = search_similar_movies(prompt, top_k, content_type)
+    recommendations = search_similar_movies(prompt, top_k, content_type, ids_only=ids_only, mode=mode,
+                                            filters=filters, rerank=rerank, timings=timings)
     print(f"Found {len(recommendations)} recommendations")
     return recommendations
 
+# ---------------------------------------------------------------------------
+# Async request path (used by the FastAPI service)
+# ---------------------------------------------------------------------------
+
+# Use oracledb's asyncio pool for /recommend; when disabled or unavailable the
+# synchronous search runs in a worker thread instead
+ORACLE_ASYNC_POOL = os.getenv('ORACLE_ASYNC_POOL', 'true').lower() == 'true'
+
+_async_pool = None
+
+class StageLimiter:
+    """
+    Bounds the concurrency and run time of one stage of the async request path.
+    
+    Args:
+        name: Stage name used in error messages
+        concurrency: Maximum number of requests in this stage at once
+        timeout: Seconds before the stage is abandoned with a TimeoutError
+    """
+    
+    def __init__(self, name: str, concurrency: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._semaphore = None
+    
+    async def run(self, awaitable):
+        """Await awaitable inside this stage's concurrency and time limits."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                return await asyncio.wait_for(awaitable, self.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{self.name} stage timed out after {self.timeout}s")
+
+embedding_stage = StageLimiter(
+    'embedding',
+    concurrency=int(os.getenv('EMBEDDING_CONCURRENCY', '8')),
+    timeout=float(os.getenv('EMBEDDING_TIMEOUT', '30')),
+)
+search_stage = StageLimiter(
+    'search',
+    concurrency=int(os.getenv('SEARCH_CONCURRENCY', str(ORACLE_POOL_MAX))),
+    timeout=float(os.getenv('SEARCH_TIMEOUT', '15')),
+)
+rerank_stage = StageLimiter(
+    'rerank',
+    concurrency=int(os.getenv('RERANK_CONCURRENCY', '4')),
+    timeout=RERANK_BUDGET_MS / 1000,
+)
+
+async def init_async_connection_pool():
+    """Create the asyncio Oracle connection pool (if ORACLE_ASYNC_POOL is enabled)."""
+    global _async_pool
+    if not ORACLE_ASYNC_POOL or SEARCH_BACKEND != 'oracle' or _async_pool is not None:
+        return _async_pool
+    print(f"Creating async Oracle connection pool (min={ORACLE_POOL_MIN}, max={ORACLE_POOL_MAX})...")
+    # Resolving the connection method may probe the database, so keep it off the event loop
+    await asyncio.to_thread(get_connection_params)
+    _async_pool = await create_oracle_pool_async(
+        min=ORACLE_POOL_MIN,
+        max=ORACLE_POOL_MAX,
+        increment=ORACLE_POOL_INCREMENT,
+        ping_interval=ORACLE_POOL_PING_INTERVAL,
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+        wait_timeout=ORACLE_POOL_WAIT_TIMEOUT,
+    )
+    print("Async Oracle connection pool ready")
+    return _async_pool
+
+async def close_async_connection_pool():
+    """Close the asyncio connection pool and the embedder's async clients."""
+    global _async_pool
+    if _async_pool is not None:
+        print("Closing async Oracle connection pool...")
+        try:
+            await _async_pool.close(force=True)
+        finally:
+            _async_pool = None
+    await get_embedder().aclose()
+
+async def generate_embedding_async(text: str) -> np.ndarray:
+    """
+    Async version of generate_embedding() using the embedder's non-blocking API.
+    
+    Only the in-memory tier of the embedding cache runs on the event loop. The
+    SQLite tier (EMBEDDING_CACHE_PATH) is read in a worker thread and written
+    behind, so a file locked by another worker never blocks the loop.
+    """
+    cache = _embedding_cache
+    if cache is not None:
+        if cache.has_disk:
+            cached = cache.get_memory(text)
+            if cached is None:
+                cached = await asyncio.to_thread(cache.get, text)
+        else:
+            cached = cache.get(text)
+        if cached is not None:
+            return cached
+    
+    embedding = await get_embedder().aembed_one(text)
+    
+    if cache is not None:
+        cache.put(text, embedding, disk=False)
+        if cache.has_disk:
+            asyncio.get_running_loop().run_in_executor(None, cache.put_disk, text, embedding)
+    return embedding
+
+async def search_oracle_async(embedding: np.ndarray, top_k: int = 10, content_type: Optional[str] = None,
+                              ids_only: bool = False, filters: Optional[SearchFilters] = None) -> List[Dict]:
+    """Async version of search_oracle() using the asyncio connection pool."""
+    approximate = await use_approximate_search_async()
+    query, params = _build_search_query(embedding, top_k, content_type, approximate=approximate,
+                                        ids_only=ids_only, filters=filters)
+    connection = await _async_pool.acquire()
+    try:
+        cursor = connection.cursor()
+        _prepare_search_cursor(cursor, top_k)
+        await cursor.execute(query, params)
+        rows = await cursor.fetchall()
+        movies = [_row_to_result(row, ids_only) for row in rows]
+        cursor.close()
+        return movies
+    except Exception:
+        await connection.rollback()
+        raise
+    finally:
+        await _async_pool.release(connection)
+
+async def search_oracle_hybrid_async(embedding: np.ndarray, prompt: str, top_k: int = 10,
+                                     content_type: Optional[str] = None, ids_only: bool = False,
+                                     filters: Optional[SearchFilters] = None) -> List[Dict]:
+    """Async version of search_oracle_hybrid() using the asyncio connection pool."""
+    lexical_ids = _lexical_candidates(prompt, content_type, filters)
+    if not lexical_ids:
+        return await search_oracle_async(embedding, top_k, content_type, ids_only, filters)
+    candidates = max(top_k, HYBRID_CANDIDATES)
+    approximate = await use_approximate_search_async()
+    query, binds = _build_hybrid_query(embedding, candidates, content_type, lexical_ids,
+                                       approximate=approximate, ids_only=ids_only, filters=filters)
+    connection = await _async_pool.acquire()
+    try:
+        cursor = connection.cursor()
+        _prepare_search_cursor(cursor, candidates + len(lexical_ids))
+        await cursor.execute(query, binds)
+        rows = await cursor.fetchall()
+        cursor.close()
+    except Exception:
+        await connection.rollback()
+        raise
+    finally:
+        await _async_pool.release(connection)
+    return _fuse_hybrid_rows(rows, lexical_ids, top_k, ids_only)
+
+async def search_similar_movies_async(prompt: str, top_k: int = 10, content_type: Optional[str] = None,
+                                      ids_only: bool = False, mode: Optional[str] = None,
+                                      filters: Optional[SearchFilters] = None, rerank=None,
+                                      timings: Optional[Dict] = None) -> List[Dict]:
+    """
+    Async version of search_similar_movies() that never blocks the event loop.
+    
+    Embedding uses the embedder's async API; Oracle search uses the asyncio pool
+    when available. Blocking work (local index search, reranking, or the sync
+    Oracle path as a fallback) runs in worker threads. Each stage has its own
+    concurrency limit and timeout; the rerank stage falls back to the
+    first-stage order when it does not finish within RERANK_BUDGET_MS.
+    """
+    mode = _resolve_mode(mode)
+    stages = _resolve_rerank(rerank)
+    timings = {} if timings is None else timings
+    top_k_requested, ids_only_requested = top_k, ids_only
+    top_k, ids_only = _first_stage_request(top_k, ids_only, stages)
+    try:
+        print(f"Starting search for: '{prompt}' (top_k={top_k}, content_type={content_type})")
+        try:
+            stage_start = time.perf_counter()
+            embedding = await embedding_stage.run(generate_embedding_async(prompt))
+            timings['embedding_ms'] = _elapsed_ms(stage_start)
+        except Exception as e:
+            print(f"ERROR generating embedding: {e}")
+            raise Exception(f"Failed to generate embedding: {e}")
+        
+        if mode == 'hybrid':
+            await asyncio.to_thread(get_lexical_index)  # loads from disk on first use
+        
+        stage_start = time.perf_counter()
+        if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+            index = await asyncio.to_thread(get_local_index)
+            if mode == 'hybrid':
+                search = asyncio.to_thread(search_local_hybrid, index, embedding, prompt, top_k, content_type, filters)
+            else:
+                search = asyncio.to_thread(index.search, embedding, top_k, content_type, filters)
+            movies = await search_stage.run(search)
+        elif mode == 'hybrid':
+            if _async_pool is not None:
+                search = search_oracle_hybrid_async(embedding, prompt, top_k, content_type, ids_only, filters)
+            else:
+                search = asyncio.to_thread(search_oracle_hybrid, embedding, prompt, top_k, content_type,
+                                           ids_only, filters)
+            movies = await search_stage.run(search)
+        elif _async_pool is not None:
+            movies = await search_stage.run(search_oracle_async(embedding, top_k, content_type, ids_only, filters))
+        else:
+            movies = await search_stage.run(asyncio.to_thread(search_oracle, embedding, top_k, content_type,
+                                                              ids_only, filters))
+        timings['search_ms'] = _elapsed_ms(stage_start)
+        
+        if stages:
+            movies = await _rerank_async(prompt, embedding, movies, top_k_requested, stages, timings)
+        if ids_only_requested:
+            movies = _ids_and_scores(movies)
+        
+        print(f"Found {len(movies)} movies")
+        return movies
+        
+    except Exception as e:
+        print(f"ERROR searching movies: {e}")
+        raise
+
+async def _rerank_async(prompt: str, embedding: np.ndarray, movies: List[Dict], top_k: int, stages: tuple,
+                        timings: Dict) -> List[Dict]:
+    """Rerank in a worker thread; past the budget the first-stage order is returned without waiting."""
+    start = time.perf_counter()
+    stage_timings = {}  # the thread may still write to it after a timeout
+    try:
+        # The outer limit also covers waiting for a free rerank slot
+        reranked = await asyncio.wait_for(
+            rerank_stage.run(asyncio.to_thread(_rerank, prompt, embedding, movies, top_k, stages, stage_timings)),
+            RERANK_BUDGET_MS / 1000,
+        )
+    except (TimeoutError, asyncio.TimeoutError):
+        print(f"WARNING: Rerank exceeded its {RERANK_BUDGET_MS:.0f} ms budget; using first-stage order")
+        timings.update(rerank_candidates=len(movies), rerank_ms=_elapsed_ms(start), rerank_fallback=True)
+        return movies[:top_k]
+    timings.update(stage_timings)
+    return reranked
+
+async def recommend_movies_async(prompt: str, top_k: int = 10, content_type: Optional[str] = None,
+                                 ids_only: bool = False, mode: Optional[str] = None,
+                                 filters: Optional[SearchFilters] = None, rerank=None,
+                                 timings: Optional[Dict] = None) -> List[Dict]:
+    """Async version of recommend_movies()."""
+    recommendations = await search_similar_movies_async(prompt, top_k, content_type, ids_only=ids_only, mode=mode,
+                                                        filters=filters, rerank=rerank, timings=timings)
+    print(f"Found {len(recommendations)} recommendations")
+    return recommendations
+
+def recommend_movies_batch(prompts: List[str], top_k: int = 10, content_type: Optional[str] = None,
+                           ids_only: bool = False, filters: Optional[SearchFilters] = None) -> List[Dict]:
+    """
+    Get recommendations for many prompts at once.
+    
+    All prompts are embedded with batched embedder calls and searched with one
+    multi-query search, so throughput is much higher than calling
+    recommend_movies() once per prompt.
+    
+    Args:
+        prompts: List of user moods/queries
+        top_k: Number of recommendations per prompt
+        content_type: Filter by 'Movie' or 'YouTube Clips' (default: None for all)
+        ids_only: Return only ids and similarity scores
+        filters: Optional metadata filters (shared by all prompts)
+        
+    Returns:
+        One dictionary per prompt with 'prompt', 'recommendations' and 'error'
+        (None on success), in the same order as prompts
+    """
+    print(f"Getting batch recommendations for {len(prompts)} prompts")
+    items = [{'prompt': prompt, 'recommendations': [], 'error': None} for prompt in prompts]
+    
+    valid = []
+    for i, prompt in enumerate(prompts):
+        if not prompt or not prompt.strip():
+            items[i]['error'] = "Prompt cannot be empty"
+        else:
+            valid.append(i)
+    if not valid:
+        return items
+    
+    try:
+        embeddings = generate_embeddings([prompts[i] for i in valid])
+    except Exception as e:
+        print(f"ERROR generating batch embeddings: {e}")
+        for i in valid:
+            items[i]['error'] = f"Failed to generate embedding: {e}"
+        return items
+    
+    try:
+        if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+            results = get_local_index().search_batch(embeddings, top_k, content_type, filters=filters)
+            if ids_only:
+                results = [_ids_and_scores(movies) for movies in results]
+        else:
+            results = search_oracle_batch(embeddings, top_k, content_type, ids_only=ids_only, filters=filters)
+    except Exception as e:
+        print(f"ERROR in batch search: {e}")
+        for i in valid:
+            items[i]['error'] = f"Search failed: {e}"
+        return items
+    
+    for i, movies in zip(valid, results):
+        items[i]['recommendations'] = movies
+        if not movies:
+            items[i]['error'] = "No recommendations found"
+    
+    print(f"Batch completed: {sum(1 for item in items if item['error'] is None)}/{len(items)} prompts succeeded")
+    return items
+
 if __name__ == "__main__":
     # Test the recommendation system
     test_prompt = "sci-fi movie with space exploration"
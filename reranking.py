@@ -0,0 +1,327 @@
+"""
+Second-stage reranking of recommendation candidates.
+
+The first stage (vector or hybrid search) over-fetches candidates. Up to two
+rerank stages then reorder them and keep the top k:
+- cross_encoder: scores (prompt, title + description) pairs with a small
+  cross-encoder (ms-marco-MiniLM-L6-v2, ONNX Runtime on CPU). It reads prompt
+  and text together, so it ranks relevance better than embedding distance.
+- mmr: maximal marginal relevance. It picks items one at a time, trading
+  relevance against similarity to the items already picked. This uses the
+  stored embeddings, so near-duplicates such as sequels stop crowding the
+  top k.
+
+rerank() runs the requested stages within a time budget. When the budget runs
+out it returns the first-stage order instead, so reranking never makes a
+request fail or exceed its deadline by more than one cross-encoder batch.
+Loading the cross-encoder is not part of the budget: it is loaded at startup,
+or in the background on first use, and requests skip the cross_encoder stage
+until it is ready. A failed load is remembered and disables the stage.
+"""
+
+import os
+import threading
+import time
+import traceback
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+RERANK_STAGES = ('cross_encoder', 'mmr')  # order in which requested stages run
+
+# Cross-encoder configuration (RERANK_ONNX_MODEL / RERANK_TOKENIZER can point to
+# local files; otherwise they are downloaded once from the Hugging Face Hub)
+RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L6-v2')
+RERANK_ONNX_MODEL = os.getenv('RERANK_ONNX_MODEL', '')
+RERANK_ONNX_FILE = os.getenv('RERANK_ONNX_FILE', 'onnx/model.onnx')
+RERANK_TOKENIZER = os.getenv('RERANK_TOKENIZER', '')
+RERANK_MAX_LENGTH = int(os.getenv('RERANK_MAX_LENGTH', '256'))
+RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', '16'))  # pairs per inference call (deadline checked between)
+
+class DeadlineExceeded(Exception):
+    """The rerank time budget ran out."""
+
+def parse_stages(value: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """
+    Rerank stages from a comma-separated string or a list ('none' or '' for none).
+
+    Returns the stages in execution order. Raises ValueError for unknown stages.
+    """
+    if value is None:
+        return ()
+    names = value.split(',') if isinstance(value, str) else value
+    stages = {name.strip().lower().replace('-', '_') for name in names} - {'', 'none'}
+    unknown = stages - set(RERANK_STAGES)
+    if unknown:
+        raise ValueError(f"Unknown rerank stage '{sorted(unknown)[0]}'. Choose from: {', '.join(RERANK_STAGES)}, none")
+    return tuple(stage for stage in RERANK_STAGES if stage in stages)
+
+def mmr(query: np.ndarray, vectors: np.ndarray, top_k: int, lambda_: float = 0.7,
+        relevance: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Maximal marginal relevance selection.
+
+    Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * max similarity to the picked items.
+    The pairwise similarity matrix is computed once with one matrix product,
+    so each step is a vectorized update over the candidates.
+
+    Args:
+        query: Query vector
+        vectors: Candidate vectors, shape (n, dim)
+        top_k: Number of candidates to pick
+        lambda_: 1 ranks by relevance only, 0 by diversity only
+        relevance: Relevance of each candidate in [0, 1]; defaults to the
+            cosine similarity to the query
+
+    Returns:
+        Positions of the picked candidates, in pick order
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    if relevance is None:
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        relevance = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    similarity = vectors @ vectors.T
+
+    count = min(top_k, len(vectors))
+    picked = np.empty(count, dtype=np.int64)
+    available = np.ones(len(vectors), dtype=bool)
+    redundancy = np.zeros(len(vectors), dtype=np.float32)  # max similarity to picked items
+    for step in range(count):
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked[step] = best
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
+
+class CrossEncoderReranker:
+    """
+    Scores (query, text) pairs in-process with an ONNX cross-encoder on CPU.
+
+    Like the ONNX embedder, the session is created per process (after a
+    pre-forked worker starts), and preload() only downloads the model files.
+    If loading fails, the error is logged once and remembered: later calls
+    raise without retrying, and ready() returns False.
+    """
+
+    def __init__(self, model_path: str = RERANK_ONNX_MODEL, tokenizer_path: str = RERANK_TOKENIZER,
+                 threads: int = 0):
+        self.model_path = model_path
+        self.tokenizer_path = tokenizer_path
+        self.threads = threads
+        self._session = None
+        self._tokenizer = None
+        self._input_names = ()
+        self._lock = threading.Lock()
+        self._load_error = None
+        self._loader = None
+        self._loader_lock = threading.Lock()  # separate from _lock, which load() holds while downloading
+
+    def _check_available(self):
+        if self._load_error is not None:
+            raise RuntimeError(f"Cross-encoder is disabled: {self._load_error}")
+
+    def _failed(self, error: Exception):
+        self._load_error = error
+        print(f"ERROR: Could not load the cross-encoder, disabling cross_encoder reranking: {error}")
+
+    def load(self):
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            self._check_available()
+            try:
+                self._load()
+            except Exception as e:
+                self._failed(e)
+                raise
+
+    def _load(self):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError("onnxruntime and tokenizers are required for cross-encoder reranking. "
+                              "Install them with: pip install onnxruntime tokenizers")
+
+        model_path, tokenizer_path = self._resolve_files()
+        print(f"Loading cross-encoder from {model_path}...")
+        tokenizer = Tokenizer.from_file(tokenizer_path)
+        tokenizer.enable_truncation(max_length=RERANK_MAX_LENGTH)
+        tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        self._input_names = tuple(i.name for i in session.get_inputs())
+        self._tokenizer = tokenizer
+        self._session = session
+
+    def _resolve_files(self):
+        """Local model and tokenizer paths, downloading them from the Hub if not configured."""
+        if not self.model_path or not self.tokenizer_path:
+            try:
+                from huggingface_hub import hf_hub_download
+            except ImportError:
+                raise ImportError("Set RERANK_ONNX_MODEL and RERANK_TOKENIZER, or install huggingface_hub "
+                                  "to download them: pip install huggingface_hub")
+            self.model_path = self.model_path or hf_hub_download(RERANK_MODEL, RERANK_ONNX_FILE)
+            self.tokenizer_path = self.tokenizer_path or hf_hub_download(RERANK_MODEL, "tokenizer.json")
+        return self.model_path, self.tokenizer_path
+
+    def ready(self) -> bool:
+        """
+        True if the model is loaded. Otherwise starts loading it in a background
+        thread (once) and returns False, so a request never waits for the load.
+        """
+        if self._session is not None:
+            return True
+        with self._loader_lock:
+            if self._load_error is None and self._loader is None:
+                self._loader = threading.Thread(target=self._load_in_background, name='cross-encoder-load',
+                                                daemon=True)
+                self._loader.start()
+        return False
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception:
+            pass  # logged and remembered by load()
+
+    def preload(self):
+        with self._lock:
+            self._check_available()
+            try:
+                self._resolve_files()
+            except Exception as e:
+                self._failed(e)
+                raise
+
+    def configure_threads(self, threads: int):
+        if self.threads <= 0 and self._session is None:
+            self.threads = threads
+
+    def warmup(self):
+        self.load()
+        self.score("warmup", ["warmup"])
+
+    def score(self, query: str, texts: Sequence[str], deadline: Optional[float] = None) -> np.ndarray:
+        """
+        Relevance logits of texts for query (higher is better).
+
+        Pairs are scored in batches of RERANK_BATCH_SIZE. DeadlineExceeded is
+        raised between batches once time.perf_counter() passes deadline.
+        """
+        self.load()
+        if deadline is not None and time.perf_counter() > deadline:
+            raise DeadlineExceeded()
+        scores = np.empty(len(texts), dtype=np.float32)
+        for start in range(0, len(texts), RERANK_BATCH_SIZE):
+            if deadline is not None and time.perf_counter() > deadline:
+                raise DeadlineExceeded()
+            encodings = self._tokenizer.encode_batch([(query, text) for text in texts[start:start + RERANK_BATCH_SIZE]])
+            feeds = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            }
+            if 'token_type_ids' in self._input_names:
+                feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            logits = self._session.run(None, feeds)[0]
+            scores[start:start + len(encodings)] = np.asarray(logits, dtype=np.float32).reshape(len(encodings), -1)[:, 0]
+        return scores
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+def get_cross_encoder() -> CrossEncoderReranker:
+    """Get the process-wide cross-encoder."""
+    global _cross_encoder
+    if _cross_encoder is None:
+        with _cross_encoder_lock:
+            if _cross_encoder is None:
+                _cross_encoder = CrossEncoderReranker()
+    return _cross_encoder
+
+def _milliseconds(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def rerank(prompt: str, query: np.ndarray, candidates: List[Dict], top_k: int, stages: Sequence[str],
+           budget_ms: float, vectors=None, mmr_lambda: float = 0.7,
+           cross_encoder: Optional[CrossEncoderReranker] = None) -> Tuple[List[Dict], Dict]:
+    """
+    Rerank first-stage candidates.
+
+    Args:
+        prompt: User prompt (for the cross-encoder)
+        query: Prompt embedding (for MMR)
+        candidates: First-stage results, best first
+        top_k: Number of results to return
+        stages: Stages from parse_stages()
+        budget_ms: Time budget; when exceeded, the first-stage order is returned
+        vectors: Callable returning the embeddings of candidate ids, shape
+            (len(ids), dim) (needed for MMR)
+        mmr_lambda: MMR relevance/diversity trade-off
+        cross_encoder: Cross-encoder to use; defaults to get_cross_encoder()
+
+    Returns:
+        (results, timings): up to top_k results, and per-stage milliseconds
+        ('<stage>_ms', 'rerank_ms') plus 'rerank_fallback' (True when the
+        first-stage order was returned) and 'cross_encoder_skipped' (True when
+        the cross-encoder was not loaded yet or is disabled)
+    """
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000
+    timings = {'rerank_candidates': len(candidates)}
+    if 'cross_encoder' in stages:
+        cross_encoder = cross_encoder or get_cross_encoder()
+        if not cross_encoder.ready():
+            stages = tuple(stage for stage in stages if stage != 'cross_encoder')
+            timings['cross_encoder_skipped'] = True
+            if not stages:
+                timings.update(rerank_ms=_milliseconds(start), rerank_fallback=True)
+                return candidates[:top_k], timings
+    if not stages or len(candidates) <= 1:
+        timings.update(rerank_ms=0.0, rerank_fallback=False)
+        return candidates[:top_k], timings
+
+    order = np.arange(len(candidates))
+    relevance = None
+    try:
+        if 'cross_encoder' in stages:
+            stage_start = time.perf_counter()
+            texts = [f"{movie.get('title') or ''}. {movie.get('description') or ''}" for movie in candidates]
+            scores = cross_encoder.score(prompt, texts, deadline)
+            order = np.argsort(-scores, kind='stable')
+            # Squash logits to [0, 1] so they can serve as MMR relevance
+            relevance = 1.0 / (1.0 + np.exp(-scores[order]))
+            timings['cross_encoder_ms'] = _milliseconds(stage_start)
+        if 'mmr' in stages:
+            if time.perf_counter() > deadline:
+                raise DeadlineExceeded()
+            stage_start = time.perf_counter()
+            ids = [candidates[i]['id'] for i in order]
+            picked = mmr(query, vectors(ids), top_k, mmr_lambda, relevance)
+            order = order[picked]
+            timings['mmr_ms'] = _milliseconds(stage_start)
+        if time.perf_counter() > deadline:
+            raise DeadlineExceeded()
+    except DeadlineExceeded:
+        print(f"WARNING: Rerank exceeded its {budget_ms:.0f} ms budget; using first-stage order")
+        timings.update(rerank_ms=_milliseconds(start), rerank_fallback=True)
+        return candidates[:top_k], timings
+    except Exception as e:
+        # Unexpected errors (not the budget) are logged with a traceback so a broken stage is noticed
+        print(f"ERROR: Rerank failed, using first-stage order: {e}")
+        traceback.print_exc()
+        timings.update(rerank_ms=_milliseconds(start), rerank_fallback=True, rerank_error=str(e))
+        return candidates[:top_k], timings
+
+    timings.update(rerank_ms=_milliseconds(start), rerank_fallback=False)
+    return [candidates[i] for i in order[:top_k]], timings
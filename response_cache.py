@@ -0,0 +1,205 @@
+"""
+Response-level cache for recommendation requests.
+
+Identical (prompt, top_k, content_type) requests are answered from memory,
+skipping both the embedding call and the database search. Entries expire
+after a TTL and are dropped whenever the catalog version changes (the version
+is bumped by process_kaggle after every insert).
+
+Concurrent identical requests are coalesced ("single-flight"): the first
+caller computes the result and the others wait for it, so a burst of 100
+identical prompts triggers a single backend search.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from embedding_cache import normalize_prompt
+
+_MISS = object()
+
+def make_request_key(prompt: str, top_k: int, content_type: Optional[str], **extra) -> Tuple:
+    """Build a cache key from a normalized recommendation request."""
+    return (normalize_prompt(prompt), int(top_k), content_type or None) + tuple(sorted(extra.items()))
+
+class ResponseCache:
+    """
+    Thread-safe TTL + LRU cache with single-flight request coalescing.
+
+    Args:
+        max_entries: Maximum number of cached responses
+        ttl_seconds: Seconds a response stays valid
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (created_at, value)
+        self._in_flight = {}  # key -> concurrent.futures.Future (threads)
+        self._async_in_flight = {}  # key -> asyncio.Future (event loop)
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def set_version(self, version):
+        """Set the current catalog version, clearing the cache when it changes."""
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    print(f"Catalog version changed ({self._version} -> {version}), clearing response cache")
+                self._entries.clear()
+                self._version = version
+
+    def _lookup(self, key: Hashable):
+        """Return a fresh cached value or _MISS. Caller must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            created_at, value = entry
+            if time.monotonic() - created_at <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        return _MISS
+
+    def _store(self, key: Hashable, value, version, cacheable: Callable):
+        """Store a computed value. Caller must hold the lock."""
+        # Do not store results computed against a catalog version that has since changed
+        if cacheable(value) and version == self._version:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable, cacheable: Callable = bool):
+        """
+        Return the cached value for key, computing it once if missing.
+
+        Args:
+            key: Request key (see make_request_key)
+            compute: Zero-argument callable producing the value
+            cacheable: Predicate deciding whether a computed value is stored
+
+        Returns:
+            Cached or freshly computed value
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISS:
+                return value
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+            version = self._version
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._store(key, value, version, cacheable)
+        future.set_result(value)
+        return value
+
+    async def aget_or_compute(self, key: Hashable, compute: Callable[[], Awaitable], cacheable: Callable = bool):
+        """
+        Async version of get_or_compute() for use from an event loop.
+
+        Args:
+            key: Request key (see make_request_key)
+            compute: Zero-argument coroutine function producing the value
+            cacheable: Predicate deciding whether a computed value is stored
+
+        Returns:
+            Cached or freshly computed value
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISS:
+                return value
+
+            future = self._async_in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = asyncio.get_running_loop().create_future()
+                # Mark the exception as retrieved even if no other request is waiting
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._async_in_flight[key] = future
+                leader = True
+            version = self._version
+
+        if not leader:
+            # Shield so a disconnecting follower does not cancel the shared computation
+            return await asyncio.shield(future)
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            with self._lock:
+                self._async_in_flight.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._async_in_flight.pop(key, None)
+            self._store(key, value, version, cacheable)
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': True,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'catalog_version': self._version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+def create_response_cache_from_env() -> Optional[ResponseCache]:
+    """Create the response cache from environment settings, or None if disabled."""
+    max_entries = int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+    if max_entries <= 0:
+        return None
+    return ResponseCache(
+        max_entries=max_entries,
+        ttl_seconds=float(os.getenv('RESPONSE_CACHE_TTL', '300')),
+    )
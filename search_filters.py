@@ -0,0 +1,140 @@
+"""
+Metadata filters for recommendation searches.
+
+process_kaggle stores four typed metadata columns per movie:
+- genre_mask: bitset of TMDB genres (bit i = GENRES[i])
+- release_year, runtime (minutes) and vote_average (0-10)
+
+SearchFilters turns request filters into SQL predicates for the Oracle search
+and into boolean row masks for the in-process indexes, so filtering happens
+inside the top-k search instead of on its results. Rows without a value
+(e.g. YouTube clips) never match a filter on that column, as with SQL NULLs.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+# TMDB genre names; the position is the bit in genre_mask (do not reorder)
+GENRES = (
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+    'Fantasy', 'Foreign', 'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction',
+    'TV Movie', 'Thriller', 'War', 'Western',
+)
+_GENRE_BITS = {name.lower(): 1 << bit for bit, name in enumerate(GENRES)}
+
+# Metadata arrays of the in-process indexes; missing values are 0 (genres) or NaN
+METADATA_COLUMNS = {
+    'genre_mask': np.uint32,
+    'release_year': np.float32,
+    'runtime': np.float32,
+    'vote_average': np.float32,
+}
+
+def genre_mask(names: Iterable[str]) -> int:
+    """Bitset of genre names. Raises ValueError for unknown genres."""
+    mask = 0
+    for name in names:
+        bit = _GENRE_BITS.get(str(name).strip().lower())
+        if bit is None:
+            raise ValueError(f"Unknown genre '{name}'. Choose from: {', '.join(GENRES)}")
+        mask |= bit
+    return mask
+
+def genre_names(mask: int) -> List[str]:
+    """Genre names of a bitset."""
+    return [name for bit, name in enumerate(GENRES) if mask & (1 << bit)]
+
+def genre_mask_from_json(value) -> int:
+    """Bitset of a TMDB genres JSON list (unknown genres are ignored)."""
+    if pd.isna(value) or value == '':
+        return 0
+    try:
+        items = json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return 0
+    mask = 0
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict):
+            mask |= _GENRE_BITS.get(str(item.get('name', '')).lower(), 0)
+    return mask
+
+def empty_metadata(count: int) -> Dict[str, np.ndarray]:
+    """Metadata arrays with no values (matching no filter)."""
+    return {
+        name: np.zeros(count, dtype=dtype) if name == 'genre_mask' else np.full(count, np.nan, dtype=dtype)
+        for name, dtype in METADATA_COLUMNS.items()
+    }
+
+def metadata_from_rows(rows) -> Dict[str, np.ndarray]:
+    """Metadata arrays from (genre_mask, release_year, runtime, vote_average) rows; None is missing."""
+    values = np.array(rows, dtype=np.float64).reshape(-1, len(METADATA_COLUMNS))
+    values[:, 0] = np.nan_to_num(values[:, 0])  # no genres
+    return dict(zip(METADATA_COLUMNS, values.T))
+
+class SearchFilters:
+    """
+    Metadata filters of one search. All given conditions must hold; genres
+    match when the movie has any of them.
+
+    Args:
+        genres: Genre names (see GENRES)
+        year_min, year_max: Release year range (inclusive)
+        runtime_min, runtime_max: Runtime range in minutes (inclusive)
+        min_rating: Minimum TMDB vote average
+    """
+
+    def __init__(self, genres: Optional[Iterable[str]] = None, year_min: Optional[int] = None,
+                 year_max: Optional[int] = None, runtime_min: Optional[int] = None,
+                 runtime_max: Optional[int] = None, min_rating: Optional[float] = None):
+        self.genre_mask = genre_mask(genres or ())
+        self.genres = genre_names(self.genre_mask)
+        self.ranges = {
+            # column: (min, max)
+            'release_year': (year_min, year_max),
+            'runtime': (runtime_min, runtime_max),
+            'vote_average': (min_rating, None),
+        }
+        for column, (low, high) in self.ranges.items():
+            if low is not None and high is not None and low > high:
+                raise ValueError(f"Empty {column} range: minimum {low} is greater than maximum {high}")
+
+    def __bool__(self) -> bool:
+        return bool(self.genre_mask) or any(bound is not None for bounds in self.ranges.values() for bound in bounds)
+
+    def key(self) -> tuple:
+        """Hashable representation for cache keys."""
+        return (tuple(self.genres),) + tuple(self.ranges.values())
+
+    def sql(self, binds: Dict) -> str:
+        """
+        SQL predicates (' AND ...' or '') over the movie_search metadata columns.
+        Bind values are added to binds with f_ names.
+        """
+        predicates = []
+        if self.genre_mask:
+            binds['f_genres'] = self.genre_mask
+            predicates.append("BITAND(genre_mask, :f_genres) > 0")
+        for column, (low, high) in self.ranges.items():
+            if low is not None:
+                binds[f'f_{column}_min'] = low
+                predicates.append(f"{column} >= :f_{column}_min")
+            if high is not None:
+                binds[f'f_{column}_max'] = high
+                predicates.append(f"{column} <= :f_{column}_max")
+        return ''.join(f" AND {predicate}" for predicate in predicates)
+
+    def mask(self, metadata: Dict[str, np.ndarray]) -> np.ndarray:
+        """Boolean mask over index rows from metadata arrays (see METADATA_COLUMNS)."""
+        count = len(metadata['genre_mask'])
+        mask = np.ones(count, dtype=bool)
+        if self.genre_mask:
+            mask &= (metadata['genre_mask'] & np.uint32(self.genre_mask)) != 0
+        for column, (low, high) in self.ranges.items():
+            values = metadata[column]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return mask
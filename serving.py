@@ -0,0 +1,126 @@
+"""
+Multi-worker serving for the recommendation API.
+
+With API_WORKERS > 1 the API runs under gunicorn with uvicorn workers in a
+pre-fork model: the parent process imports the app and loads the embedding
+model weights and the local vector index once (recommend_movies.preload_for_workers),
+then forks the workers, which share that memory instead of loading N copies.
+Each worker then creates its own database pools and warms up its own
+inference thread pool, limited to its share of the CPU cores.
+
+Signals sent to the parent process:
+- HUP: graceful reload. The local index and the neighbor table are reloaded
+  in the parent (picking up a new catalog snapshot), new workers are forked,
+  and old workers finish their in-flight requests before exiting.
+- TERM: graceful shutdown (INT/QUIT: immediate).
+- TTIN / TTOU: add or remove one worker.
+
+Without gunicorn (e.g. on Windows) uvicorn's own multi-process mode is used.
+Its workers are spawned rather than forked, so only memory-mapped sources
+(the catalog snapshot, HNSW graph files) are shared between them.
+"""
+
+import os
+from typing import Optional
+
+API_WORKERS = os.getenv('API_WORKERS', '1')
+API_PRELOAD = os.getenv('API_PRELOAD', 'true').lower() == 'true'
+API_WORKER_TIMEOUT = int(os.getenv('API_WORKER_TIMEOUT', '120'))  # seconds before a stuck worker is restarted
+API_GRACEFUL_TIMEOUT = int(os.getenv('API_GRACEFUL_TIMEOUT', '30'))  # seconds to finish requests on reload/stop
+API_KEEPALIVE = int(os.getenv('API_KEEPALIVE', '5'))
+API_MAX_REQUESTS = int(os.getenv('API_MAX_REQUESTS', '0'))  # recycle workers after N requests (0 = never)
+
+def worker_count(value: Optional[str] = None) -> int:
+    """Number of workers from API_WORKERS: a number or 'auto' (one per CPU core)."""
+    value = (value or API_WORKERS).strip().lower()
+    if value == 'auto':
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+def threads_per_worker(workers: int) -> int:
+    """Inference threads per worker: EMBEDDING_THREADS if set, else an even share of the cores."""
+    configured = int(os.getenv('EMBEDDING_THREADS', '0'))
+    if configured > 0:
+        return configured
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def _post_fork(server, worker):
+    from recommend_movies import init_worker
+    init_worker(threads_per_worker(server.cfg.workers))
+
+def _on_reload(server):
+    # Runs in the parent before new workers are forked, so they inherit the fresh index
+    from recommend_movies import SEARCH_BACKEND, LOCAL_SEARCH_BACKENDS, reload_local_index, reload_neighbor_table
+    if not server.cfg.preload_app:
+        return
+    if SEARCH_BACKEND in LOCAL_SEARCH_BACKENDS:
+        try:
+            reload_local_index()
+        except Exception as e:
+            print(f"WARNING: Could not reload local index, keeping the previous one: {e}")
+    try:
+        reload_neighbor_table()
+    except Exception as e:
+        print(f"WARNING: Could not reload neighbor table, keeping the previous one: {e}")
+
+def run_gunicorn(app_path: str, host: str, port: int, workers: int):
+    """Serve app_path with gunicorn and pre-forked uvicorn workers."""
+    from gunicorn.app.base import BaseApplication
+    from importlib import import_module
+
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+        'preload_app': API_PRELOAD,
+        'timeout': API_WORKER_TIMEOUT,
+        'graceful_timeout': API_GRACEFUL_TIMEOUT,
+        'keepalive': API_KEEPALIVE,
+        'max_requests': API_MAX_REQUESTS,
+        'max_requests_jitter': API_MAX_REQUESTS // 10,
+        'post_fork': _post_fork,
+        'on_reload': _on_reload,
+        'loglevel': 'info',
+    }
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            module_name, app_name = app_path.split(':')
+            app = getattr(import_module(module_name), app_name)
+            if self.cfg.preload_app:
+                from recommend_movies import preload_for_workers
+                try:
+                    preload_for_workers()
+                except Exception as e:
+                    # Workers load what they need themselves
+                    print(f"WARNING: Could not preload shared resources: {e}")
+            return app
+
+    print(f"Starting {workers} workers (preload={API_PRELOAD}, "
+          f"{threads_per_worker(workers)} inference threads each)")
+    Application().run()
+
+def run(app_path: str = 'movie_recommendation_api:app', host: str = '0.0.0.0', port: int = 8000,
+        workers: Optional[int] = None):
+    """Serve the API with the configured number of workers."""
+    import uvicorn
+
+    workers = workers or worker_count()
+    if workers == 1:
+        uvicorn.run(app_path, host=host, port=port, reload=False, log_level="info")
+        return
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("gunicorn is not installed; using uvicorn worker processes (no shared preload)")
+        # Spawned workers read the thread limit from the environment at import
+        os.environ.setdefault('EMBEDDING_THREADS', str(threads_per_worker(workers)))
+        uvicorn.run(app_path, host=host, port=port, workers=workers,
+                    timeout_graceful_shutdown=API_GRACEFUL_TIMEOUT, log_level="info")
+        return
+    run_gunicorn(app_path, host, port, workers)
@@ -0,0 +1,487 @@
+"""
+Approximate nearest-neighbor search with a pure NumPy HNSW graph.
+
+HNSWIndex implements Hierarchical Navigable Small World graphs (Malkov &
+Yashunin) over cosine distance, the same metric as local_index and Oracle's
+VECTOR_DISTANCE. Queries visit O(log n) nodes, so latency stays flat as the
+catalog grows from thousands to millions of items, where a brute-force scan
+grows linearly.
+
+The graph is stored in compact arrays rather than Python objects:
+- vectors: (n, dim) float32, L2-normalized
+- links0: (n, 2*M) int32 layer-0 neighbors, padded with -1
+- upper_links: (n_upper, MAX_LEVELS, M) int32 neighbors on layers >= 1, only
+  for the ~1/M nodes that reach layer 1 (upper_slot maps node -> row)
+- levels, labels (external ids) and a deleted flag per node
+
+Deletes are tombstones: the node keeps routing searches but is never
+returned. Indexes are saved as .npy files and loaded back as memory maps.
+
+HNSWVectorIndex wraps the graph as a drop-in replacement for
+local_index.LocalVectorIndex (SEARCH_BACKEND=hnsw in recommend_movies).
+"""
+
+import heapq
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from catalog_snapshot import resolve_directory, write_directory
+from local_index import LocalVectorIndex
+from search_filters import SearchFilters
+
+EMBEDDING_DIM = 384
+MAX_LEVELS = 16
+
+class HNSWIndex:
+    """
+    HNSW graph over cosine distance with incremental add and delete.
+
+    Args:
+        dim: Vector dimension
+        m: Neighbors per node on layers >= 1 (layer 0 keeps 2 * m)
+        ef_construction: Candidate list size while inserting
+        ef_search: Default candidate list size while searching
+        capacity: Initial number of node slots (grows as needed)
+        seed: Seed for level assignment
+    """
+
+    _ARRAYS = ('vectors', 'levels', 'labels', 'deleted', 'links0', 'upper_slot', 'upper_links')
+
+    def __init__(self, dim: int = EMBEDDING_DIM, m: int = 16, ef_construction: int = 200, ef_search: int = 64,
+                 capacity: int = 1024, seed: int = 0):
+        self.dim = dim
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1.0 / np.log(max(m, 2))
+        self._rng = np.random.default_rng(seed)
+
+        self.count = 0  # node slots in use, including deleted nodes
+        self.n_upper = 0
+        self.entry_point = -1
+        self.max_level = -1
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.levels = np.zeros(capacity, dtype=np.int8)
+        self.labels = np.full(capacity, -1, dtype=np.int64)
+        self.deleted = np.zeros(capacity, dtype=bool)
+        self.links0 = np.full((capacity, self.m0), -1, dtype=np.int32)
+        self.upper_slot = np.full(capacity, -1, dtype=np.int32)
+        self.upper_links = np.full((max(capacity // m, 16), MAX_LEVELS, m), -1, dtype=np.int32)
+        self._label_to_node = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._label_to_node)
+
+    def __contains__(self, label) -> bool:
+        return int(label) in self._label_to_node
+
+    # Storage
+
+    def _ensure_writable(self):
+        """Copy memory-mapped (read-only) arrays into memory before the first modification."""
+        for name in self._ARRAYS:
+            array = getattr(self, name)
+            if not array.flags.writeable:
+                setattr(self, name, np.array(array))
+
+    def _grow(self, capacity: int):
+        def resized(array, rows, fill):
+            grown = np.full((rows,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.vectors = resized(self.vectors, capacity, 0)
+        self.levels = resized(self.levels, capacity, 0)
+        self.labels = resized(self.labels, capacity, -1)
+        self.deleted = resized(self.deleted, capacity, False)
+        self.links0 = resized(self.links0, capacity, -1)
+        self.upper_slot = resized(self.upper_slot, capacity, -1)
+
+    def _neighbors(self, node: int, level: int) -> np.ndarray:
+        row = self.links0[node] if level == 0 else self.upper_links[self.upper_slot[node], level - 1]
+        return row[row >= 0]
+
+    def _set_neighbors(self, node: int, level: int, neighbors: Sequence[int]):
+        row = self.links0[node] if level == 0 else self.upper_links[self.upper_slot[node], level - 1]
+        row[:] = -1
+        row[:len(neighbors)] = neighbors
+
+    def _distances(self, query: np.ndarray, nodes) -> np.ndarray:
+        return 1.0 - self.vectors[nodes] @ query
+
+    # Graph search
+
+    def _greedy_search(self, query: np.ndarray, entry: int, level: int) -> int:
+        """Move to the closest neighbor until no neighbor is closer (upper layers)."""
+        best = entry
+        best_distance = float(self._distances(query, [entry])[0])
+        changed = True
+        while changed:
+            changed = False
+            neighbors = self._neighbors(best, level)
+            if len(neighbors) == 0:
+                break
+            distances = self._distances(query, neighbors)
+            i = int(np.argmin(distances))
+            if distances[i] < best_distance:
+                best, best_distance = int(neighbors[i]), float(distances[i])
+                changed = True
+        return best
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int, level: int,
+                      valid: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """
+        Beam search on one layer.
+
+        Every node is traversed, but only nodes allowed by valid (a bool array
+        over node slots) are collected as results.
+
+        Returns:
+            Up to ef (distance, node) pairs, closest first
+        """
+        visited = set(entry_points)
+        distances = self._distances(query, entry_points).tolist()
+        candidates = list(zip(distances, entry_points))
+        heapq.heapify(candidates)
+        results = []  # max-heap of (-distance, node)
+        for distance, node in candidates:
+            if valid is None or valid[node]:
+                heapq.heappush(results, (-distance, node))
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if len(results) >= ef and distance > -results[0][0]:
+                break
+            new_nodes = [n for n in self._neighbors(node, level).tolist() if n not in visited]
+            if not new_nodes:
+                continue
+            visited.update(new_nodes)
+            for new_distance, new_node in zip(self._distances(query, new_nodes).tolist(), new_nodes):
+                if len(results) < ef or new_distance < -results[0][0]:
+                    heapq.heappush(candidates, (new_distance, new_node))
+                    if valid is None or valid[new_node]:
+                        heapq.heappush(results, (-new_distance, new_node))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+        return sorted((-d, n) for d, n in results)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], m: int) -> List[int]:
+        """
+        Neighbor selection heuristic: keep a candidate only if it is closer to
+        the base node than to every neighbor already kept, then fill up with
+        the closest pruned candidates.
+        """
+        if len(candidates) <= m:
+            return [node for _, node in candidates]
+        nodes = np.array([node for _, node in candidates], dtype=np.int64)
+        distances = np.array([distance for distance, _ in candidates], dtype=np.float32)
+        vectors = self.vectors[nodes]
+        # blocked[i][j]: candidate j is closer to candidate i than the base node is
+        blocked = ((1.0 - vectors @ vectors.T) < distances[:, None]).tolist()
+        selected, pruned = [], []
+        for i in range(len(nodes)):
+            if len(selected) >= m:
+                break
+            row = blocked[i]
+            if any(row[j] for j in selected):
+                pruned.append(i)
+            else:
+                selected.append(i)
+        selected.extend(pruned[:m - len(selected)])
+        return nodes[selected].tolist()
+
+    # Updates
+
+    def add(self, labels: Sequence[int], vectors: np.ndarray):
+        """
+        Insert vectors under the given labels (external ids).
+
+        Adding a label that is already present replaces its vector.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        labels = [int(label) for label in labels]
+        if len(labels) != len(vectors):
+            raise ValueError(f"Got {len(labels)} labels for {len(vectors)} vectors")
+
+        with self._lock:
+            self._ensure_writable()
+            for label, vector in zip(labels, vectors):
+                if label in self._label_to_node:
+                    self._delete_label(label)
+                self._insert(label, vector)
+
+    def _insert(self, label: int, vector: np.ndarray):
+        if self.count == len(self.vectors):
+            self._grow(max(2 * len(self.vectors), 1024))
+        node = self.count
+        self.count += 1
+        level = min(int(-np.log(1.0 - self._rng.random()) * self._level_mult), MAX_LEVELS)
+        self.vectors[node] = vector
+        self.levels[node] = level
+        self.labels[node] = label
+        self._label_to_node[label] = node
+        if level > 0:
+            if self.n_upper == len(self.upper_links):
+                grown = np.full((2 * len(self.upper_links),) + self.upper_links.shape[1:], -1, dtype=np.int32)
+                grown[:self.n_upper] = self.upper_links[:self.n_upper]
+                self.upper_links = grown
+            self.upper_slot[node] = self.n_upper
+            self.n_upper += 1
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        entry = self.entry_point
+        for layer in range(self.max_level, level, -1):
+            entry = self._greedy_search(vector, entry, layer)
+
+        entry_points = [entry]
+        for layer in range(min(level, self.max_level), -1, -1):
+            candidates = self._search_layer(vector, entry_points, self.ef_construction, layer)
+            max_links = self.m0 if layer == 0 else self.m
+            neighbors = self._select_neighbors(candidates, self.m)
+            self._set_neighbors(node, layer, neighbors)
+            for neighbor in neighbors:
+                links = self._neighbors(neighbor, layer).tolist()
+                if len(links) < max_links:
+                    links.append(node)
+                else:
+                    distances = self._distances(self.vectors[neighbor], links + [node]).tolist()
+                    if distances[-1] >= max(distances[:-1]):
+                        # Farther than every existing link: the list stays as it is
+                        continue
+                    links = self._select_neighbors(sorted(zip(distances, links + [node])), max_links)
+                self._set_neighbors(neighbor, layer, links)
+            entry_points = [n for _, n in candidates]
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def delete(self, labels: Sequence[int]):
+        """Remove labels from search results (tombstones; the nodes keep routing queries)."""
+        with self._lock:
+            self._ensure_writable()
+            for label in labels:
+                self._delete_label(int(label))
+
+    def _delete_label(self, label: int):
+        node = self._label_to_node.pop(label, None)
+        if node is not None:
+            self.deleted[node] = True
+
+    # Queries
+
+    def label_mask(self, labels: Sequence[int]) -> np.ndarray:
+        """Bool array over node slots selecting the given labels (for search(mask=...))."""
+        return np.isin(self.labels[:self.count], np.asarray(labels, dtype=np.int64))
+
+    def search(self, query: np.ndarray, k: int = 10, ef: Optional[int] = None,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k approximate nearest neighbors of a query vector.
+
+        Args:
+            query: Query vector
+            k: Number of neighbors
+            ef: Candidate list size (>= k); higher is more accurate and slower
+            mask: Optional bool array from label_mask() restricting the results
+
+        Returns:
+            (labels, cosine distances), closest first
+        """
+        if self.entry_point < 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        valid = ~self.deleted[:self.count]
+        if mask is not None:
+            valid = valid & mask[:self.count]
+
+        entry = self.entry_point
+        for layer in range(self.max_level, 0, -1):
+            entry = self._greedy_search(query, entry, layer)
+        found = self._search_layer(query, [entry], max(ef or self.ef_search, k), 0, valid)[:k]
+        nodes = np.array([node for _, node in found], dtype=np.int64)
+        return self.labels[nodes], np.array([distance for distance, _ in found], dtype=np.float32)
+
+    # Persistence
+
+    def save(self, path: str):
+        """Save the index to a directory of .npy files (replacing any previous version atomically)."""
+        write_directory(path, self._write)
+
+    def _write(self, directory: str):
+        used = {'upper_links': self.n_upper}
+        for name in self._ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name)[:used.get(name, self.count)])
+        meta = {
+            'dim': self.dim, 'm': self.m, 'ef_construction': self.ef_construction, 'ef_search': self.ef_search,
+            'count': self.count, 'n_upper': self.n_upper,
+            'entry_point': self.entry_point, 'max_level': self.max_level,
+        }
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "HNSWIndex":
+        """
+        Load an index saved with save().
+
+        With mmap=True the arrays are memory-mapped read-only (shared between
+        processes through the page cache); they are copied into memory on the
+        first add() or delete().
+        """
+        path = resolve_directory(path)
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        index = cls(dim=meta['dim'], m=meta['m'], ef_construction=meta['ef_construction'],
+                    ef_search=meta['ef_search'], capacity=1)
+        for name in cls._ARRAYS:
+            setattr(index, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None))
+        index.count = meta['count']
+        index.n_upper = meta['n_upper']
+        index.entry_point = meta['entry_point']
+        index.max_level = meta['max_level']
+        live = np.flatnonzero(~index.deleted[:index.count])
+        index._label_to_node = dict(zip(index.labels[live].tolist(), live.tolist()))
+        if len(index.upper_links) == 0:
+            index.upper_links = np.full((16, MAX_LEVELS, index.m), -1, dtype=np.int32)
+        return index
+
+class HNSWVectorIndex(LocalVectorIndex):
+    """
+    LocalVectorIndex that answers queries from an HNSW graph instead of a full scan.
+
+    Filters that leave at most exact_threshold rows (e.g. content_type='YouTube
+    Clips', or selective metadata filters) are answered exactly, since a tiny
+    scan is faster and more accurate than a filtered graph walk (it uses the
+    quantized codes if LocalVectorIndex.quantize() was called). Broader
+    metadata filters restrict the graph walk's results to matching nodes.
+    """
+
+    def __init__(self, *args, graph: Optional[HNSWIndex] = None, exact_threshold: int = 2048, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exact_threshold = exact_threshold
+        self._row_of_label = {}
+        self._graph_masks = {}
+        if graph is not None:
+            self.attach_graph(graph)
+
+    def attach_graph(self, graph: HNSWIndex):
+        """Use graph for searches. Its labels must be this index's catalog ids."""
+        self.graph = graph
+        self._row_of_label = dict(zip(self.ids.tolist(), range(len(self.ids))))
+        # Index row of every node slot (-1 for nodes not in this catalog), so a row mask
+        # becomes a node mask with one gather instead of an id lookup per query
+        labels = graph.labels[:graph.count]
+        self._node_rows = np.full(len(labels), -1, dtype=np.int64)
+        if len(self.ids):
+            by_id = np.argsort(self.ids, kind='stable')
+            positions = np.minimum(np.searchsorted(self.ids, labels, sorter=by_id), len(self.ids) - 1)
+            found = self.ids[by_id[positions]] == labels
+            self._node_rows[found] = by_id[positions[found]]
+        self._graph_masks = {key: self._rows_to_nodes(rows) for key, rows in self._masks.items()}
+
+    def _rows_to_nodes(self, rows: np.ndarray) -> np.ndarray:
+        """Bool array over node slots selecting the nodes of the given index rows."""
+        row_mask = np.zeros(len(self.ids) + 1, dtype=bool)  # last entry stays False for node_rows == -1
+        row_mask[rows] = True
+        return row_mask[self._node_rows]
+
+    def sync_graph(self, graph: HNSWIndex) -> Tuple[int, int]:
+        """
+        Bring a (saved) graph in line with this catalog: delete ids that are gone
+        or whose vector changed, add ids that are missing.
+
+        Returns:
+            (added, deleted) counts
+        """
+        ids = self.ids.tolist()
+        current = set(ids)
+        stale = [label for label in graph._label_to_node if label not in current]
+
+        rows = [row for row, label in enumerate(ids) if label in graph]
+        if rows:
+            nodes = [graph._label_to_node[ids[row]] for row in rows]
+            changed = np.abs(graph.vectors[nodes] - self.embeddings[rows]).max(axis=1) > 1e-5
+            stale.extend(ids[row] for row in np.asarray(rows)[changed].tolist())
+        if stale:
+            graph.delete(stale)
+        missing = [row for row, label in enumerate(ids) if label not in graph]
+        if missing:
+            graph.add(self.ids[missing], self.embeddings[missing])
+        return len(missing), len(stale)
+
+    def _graph_mask(self, rows: np.ndarray, content_type: Optional[str],
+                    filters: Optional[SearchFilters]) -> Optional[np.ndarray]:
+        if filters:
+            return self._rows_to_nodes(rows)
+        return self._graph_masks.get(content_type)
+
+    def search(self, query: np.ndarray, top_k: int = 10, content_type: Optional[str] = None,
+               filters: Optional[SearchFilters] = None) -> List[Dict]:
+        rows = self._candidate_rows(content_type, filters)
+        if len(rows) <= self.exact_threshold or top_k <= 0:
+            return super().search(query, top_k, content_type, filters)
+        labels, distances = self.graph.search(query, top_k, mask=self._graph_mask(rows, content_type, filters))
+        return [self._result(self._row_of_label[int(label)], distance) for label, distance in zip(labels, distances)]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 10, content_type: Optional[str] = None,
+                     block_size: int = 256, filters: Optional[SearchFilters] = None) -> List[List[Dict]]:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        rows = self._candidate_rows(content_type, filters)
+        if len(rows) <= self.exact_threshold:
+            return super().search_batch(queries, top_k, content_type, block_size, filters)
+        mask = self._graph_mask(rows, content_type, filters)
+        results = []
+        for query in queries:
+            labels, distances = self.graph.search(query, top_k, mask=mask)
+            results.append([self._result(self._row_of_label[int(label)], distance)
+                            for label, distance in zip(labels, distances)])
+        return results
+
+    @classmethod
+    def from_local_index(cls, index: LocalVectorIndex, path: Optional[str] = None, m: int = 16,
+                         ef_construction: int = 200, ef_search: int = 64,
+                         exact_threshold: int = 2048) -> "HNSWVectorIndex":
+        """
+        Wrap a loaded LocalVectorIndex with an HNSW graph.
+
+        If path holds a saved graph it is loaded and updated incrementally;
+        otherwise the graph is built from scratch. The result is saved to path.
+        """
+        import time
+
+        hnsw_index = cls.__new__(cls)
+        hnsw_index.__dict__.update(index.__dict__)
+        hnsw_index.exact_threshold = exact_threshold
+
+        start = time.perf_counter()
+        if path and os.path.exists(os.path.join(path, 'meta.json')):
+            graph = HNSWIndex.load(path)
+            graph.ef_search = ef_search
+            added, deleted = hnsw_index.sync_graph(graph)
+            print(f"Loaded HNSW graph from {path} ({added} added, {deleted} deleted)")
+            changed = added or deleted
+        else:
+            graph = HNSWIndex(dim=EMBEDDING_DIM, m=m, ef_construction=ef_construction, ef_search=ef_search,
+                              capacity=max(len(index), 1))
+            print(f"Building HNSW graph for {len(index)} items...")
+            graph.add(index.ids, index.embeddings)
+            changed = True
+        print(f"HNSW graph ready in {time.perf_counter() - start:.1f}s")
+
+        if path and changed:
+            graph.save(path)
+        hnsw_index.attach_graph(graph)
+        return hnsw_index